@@ -0,0 +1,390 @@
+"""
+End-to-end performance benchmarks for the PyLiveView tracer.
+
+Every workload is a small synthetic project written to a temp dir and
+measured three ways, each in its own fresh interpreter with an empty
+compile cache (ie: the first trace of a file, not an edit of it):
+
+    plain       The script executed untraced (`runpy`), timed in-process.
+    traced      `pyliveview.main` on the script, timed in-process.
+    subprocess  `python pyliveview.py script.py`, timed from the outside,
+                ie: exactly what the extension pays for on every edit.
+
+Usage:
+
+    $ python benchmark.py                      # default sizes
+    $ python benchmark.py --quick              # smallest sizes only
+    $ python benchmark.py --full               # includes the 1e7 loops
+    $ python benchmark.py --save base.json     # record a baseline
+    $ python benchmark.py --baseline base.json # fail on regressions
+
+A regression is any traced/subprocess timing that got slower than the
+baseline by more than `--threshold` (a ratio, default 1.25).
+"""
+
+import argparse
+import json
+import os
+import platform
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PYLIVEVIEW = os.path.join(HERE, "pyliveview.py")
+
+MODES = ("plain", "traced", "subprocess")
+
+
+###################
+#
+# Workloads. Each builder returns {relative path: source}, the
+# entry point is always `main.py`.
+
+
+def loop_workload(n):
+    return {
+        "main.py": (
+            "total = 0\n"
+            "for i in range({n}):\n"
+            "    total += i * 2 % 7\n"
+            "total\n"
+        ).format(n=n)
+    }
+
+
+def recursion_workload(n):
+    return {
+        "main.py": (
+            "import sys\n"
+            "sys.setrecursionlimit({limit})\n"
+            "def depth(n):\n"
+            "    if n == 0:\n"
+            "        return 0\n"
+            "    return 1 + depth(n - 1)\n"
+            "result = depth({n})\n"
+            "result\n"
+        ).format(n=n, limit=n + 100)
+    }
+
+
+def stdlib_workload(n):
+    return {
+        "main.py": (
+            "import json, re\n"
+            "pattern = re.compile(r'(\\d+)-(\\w+)')\n"
+            "found = 0\n"
+            "for i in range({n}):\n"
+            "    doc = json.loads(json.dumps({{'id': i, 'tag': '%d-x' % i}}))\n"
+            "    found += bool(pattern.match(doc['tag']))\n"
+            "found\n"
+        ).format(n=n)
+    }
+
+
+def containers_workload(n):
+    return {
+        "main.py": (
+            "data = {{i: [i] * 10 for i in range({n})}}\n"
+            "keys = sorted(data)\n"
+            "size = len(data)  # ?\n"
+            "size\n"
+        ).format(n=n)
+    }
+
+
+def macros_workload(n):
+    # Macros deepcopy the whole namespace, so keep a non-trivial global around.
+    lines = ["table = list(range(1000))"]
+    lines += ["v{0} = table[{1}] * 2  # ?".format(i, i % 1000) for i in range(n)]
+    return {"main.py": "\n".join(lines) + "\n"}
+
+
+def print_workload(n):
+    return {"main.py": "for i in range({n}):\n    print(i)\n".format(n=n)}
+
+
+def imports_workload(n):
+    files = {
+        "pkg/__init__.py": "",
+        "main.py": "".join("from pkg import mod{0}\n".format(i) for i in range(n))
+        + "total = sum(m.value for m in [{}])\ntotal\n".format(
+            ", ".join("mod{0}".format(i) for i in range(n))
+        ),
+    }
+    for i in range(n):
+        files["pkg/mod{0}.py".format(i)] = (
+            "def helper(x):\n    return x + {0}\n\nvalue = helper({0})\n".format(i)
+        )
+    return files
+
+
+# name -> (builder, {preset: sizes})
+WORKLOADS = {
+    "loop": (
+        loop_workload,
+        {"quick": [100000], "default": [100000, 1000000], "full": [100000, 1000000, 10000000]},
+    ),
+    "recursion": (
+        recursion_workload,
+        {"quick": [500], "default": [500, 5000], "full": [500, 5000, 20000]},
+    ),
+    "stdlib": (
+        stdlib_workload,
+        {"quick": [2000], "default": [2000, 20000], "full": [2000, 20000, 200000]},
+    ),
+    "containers": (
+        containers_workload,
+        {"quick": [10000], "default": [10000, 100000], "full": [10000, 100000, 1000000]},
+    ),
+    "macros": (
+        macros_workload,
+        {"quick": [50], "default": [50, 500], "full": [50, 500, 2000]},
+    ),
+    "print": (
+        print_workload,
+        {"quick": [1000], "default": [1000, 10000], "full": [1000, 10000, 100000]},
+    ),
+    "imports": (
+        imports_workload,
+        {"quick": [20], "default": [20, 200], "full": [20, 200, 1000]},
+    ),
+}
+
+
+###################
+#
+# Measurement
+
+
+def write_project(files, root):
+    for relative, source in files.items():
+        path = os.path.join(root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(source)
+    return os.path.join(root, "main.py")
+
+
+def peak_rss_kb(rusage):
+    if rusage is None:
+        return None
+    # Linux reports kilobytes, macOS reports bytes.
+    if sys.platform == "darwin":
+        return rusage.ru_maxrss // 1024
+    return rusage.ru_maxrss
+
+
+def run_child(command, cwd, timeout, env=None):
+    """
+    Runs `command` and returns (wall seconds, stdout bytes, rusage). The
+    child's stdout goes to a file so a chatty workload can't fill a pipe.
+    """
+    with tempfile.TemporaryFile() as out:
+        started = time.perf_counter()
+        proc = subprocess.Popen(
+            command,
+            cwd=cwd,
+            stdout=out,
+            stderr=subprocess.DEVNULL,
+            env=dict(os.environ, PYTHONIOENCODING="utf8", **(env or {})),
+        )
+        rusage = None
+        if resource is not None and hasattr(os, "wait4"):
+            # wait4 blocks, so a timer enforces the timeout for us.
+            killer = threading.Timer(timeout, proc.kill)
+            killer.start()
+            try:
+                _, status, rusage = os.wait4(proc.pid, 0)
+            finally:
+                killer.cancel()
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            proc.wait(timeout=timeout)
+        elapsed = time.perf_counter() - started
+        out.seek(0)
+        stdout = out.read()
+    if proc.returncode != 0:
+        raise RuntimeError("{} exited with {}".format(command, proc.returncode))
+    return elapsed, stdout, rusage
+
+
+def measure(mode, script, timeout):
+    """
+    One measurement of `script` in the given mode. Returns a dict with
+    `seconds`, `output_bytes` and `peak_rss_kb`. The compile cache starts
+    out empty, otherwise repeats would only measure cache hits.
+    """
+    cwd = os.path.dirname(script)
+    if mode == "subprocess":
+        command = [sys.executable, PYLIVEVIEW, script]
+    else:
+        command = [sys.executable, os.path.abspath(__file__), "--child", mode, script]
+    with tempfile.TemporaryDirectory(prefix="plv-cache-") as cache:
+        elapsed, stdout, rusage = run_child(
+            command, cwd, timeout, {"PYLIVEVIEW_CACHE_DIR": cache}
+        )
+    if mode == "subprocess":
+        seconds, output_bytes = elapsed, len(stdout)
+    else:
+        # The child reports on its last line, after anything the workload printed.
+        report = json.loads(stdout.decode("utf8").rstrip().rsplit("\n", 1)[-1])
+        seconds, output_bytes = report["seconds"], report["output_bytes"]
+    return {
+        "seconds": seconds,
+        "output_bytes": output_bytes,
+        "peak_rss_kb": peak_rss_kb(rusage),
+    }
+
+
+def child(mode, script):
+    """
+    Entry point of the measuring child process (see `measure`).
+    """
+    sys.path.insert(0, HERE)
+    if mode == "traced":
+        import pyliveview
+
+        # main(test=True) removes the file it traced, so trace a copy.
+        copy = os.path.join(os.path.dirname(script), "_traced_main.py")
+        shutil.copyfile(script, copy)
+        started = time.perf_counter()
+        result = pyliveview.main(copy, test=True)
+        seconds = time.perf_counter() - started
+        output_bytes = len(result.encode("utf8"))
+    else:
+        sys.path.insert(0, os.path.dirname(script))
+        started = time.perf_counter()
+        runpy.run_path(script, run_name="__main__")
+        seconds = time.perf_counter() - started
+        output_bytes = 0
+    sys.stdout.write("\n" + json.dumps({"seconds": seconds, "output_bytes": output_bytes}) + "\n")
+    return 0
+
+
+def run_benchmarks(preset="default", only=None, repeat=3, timeout=600, log=print):
+    """
+    Runs every selected workload and returns the results keyed by
+    `"<workload>[<size>]"`. The fastest of `repeat` runs is kept.
+    """
+    results = {}
+    for name, (builder, presets) in WORKLOADS.items():
+        if only and name not in only:
+            continue
+        for size in presets[preset]:
+            key = "{}[{}]".format(name, size)
+            root = tempfile.mkdtemp(prefix="plv-bench-")
+            try:
+                script = write_project(builder(size), root)
+                entry = {}
+                for mode in MODES:
+                    runs = [measure(mode, script, timeout) for _ in range(repeat)]
+                    entry[mode] = min(runs, key=lambda r: r["seconds"])
+                entry["slowdown"] = entry["traced"]["seconds"] / max(
+                    entry["plain"]["seconds"], 1e-9
+                )
+                results[key] = entry
+                log(format_entry(key, entry))
+            finally:
+                shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def format_entry(key, entry):
+    return "{:<22} plain {:>9.4f}s  traced {:>9.4f}s  subprocess {:>9.4f}s  x{:<8.1f} rss {:>8} KB  out {:>10} B".format(
+        key,
+        entry["plain"]["seconds"],
+        entry["traced"]["seconds"],
+        entry["subprocess"]["seconds"],
+        entry["slowdown"],
+        entry["subprocess"]["peak_rss_kb"] or "?",
+        entry["subprocess"]["output_bytes"],
+    )
+
+
+###################
+#
+# Baselines
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def save_baseline(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold=1.25, modes=("traced", "subprocess")):
+    """
+    Returns a list of (key, mode, baseline seconds, current seconds) for
+    every measurement that is more than `threshold` times slower than
+    the baseline. Workloads missing from either side are ignored.
+    """
+    regressions = []
+    for key, entry in results.items():
+        previous = baseline.get("results", {}).get(key)
+        if previous is None:
+            continue
+        for mode in modes:
+            before = previous[mode]["seconds"]
+            after = entry[mode]["seconds"]
+            if after > before * threshold:
+                regressions.append((key, mode, before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--quick", dest="preset", action="store_const", const="quick")
+    group.add_argument("--full", dest="preset", action="store_const", const="full")
+    parser.set_defaults(preset="default")
+    parser.add_argument("--only", nargs="+", choices=sorted(WORKLOADS), help="Workloads to run.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (fastest wins).")
+    parser.add_argument("--timeout", type=float, default=600, help="Per-run timeout in seconds.")
+    parser.add_argument("--save", metavar="PATH", help="Write the results as a JSON baseline.")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare against a JSON baseline.")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Allowed slowdown ratio.")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "SCRIPT"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        return child(*args.child)
+
+    results = run_benchmarks(args.preset, args.only, args.repeat, args.timeout)
+
+    if args.save:
+        save_baseline(args.save, results)
+    if args.baseline:
+        regressions = compare(results, load_baseline(args.baseline), args.threshold)
+        for key, mode, before, after in regressions:
+            print("REGRESSION: {} ({}) {:.4f}s -> {:.4f}s".format(key, mode, before, after))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -133,6 +133,8 @@ def _prepare_config(*args, **kwargs):
             'pid_alignment',
             'repr_limit',
             'repr_func',
+            'buffer_size',
+            'flush_interval',
         ):
             continue
 
@@ -328,6 +330,8 @@ def Backlog(*conditions, **kwargs):
         action (ColorStreamAction): A ColorStreamAction to display the stored events when an event matching the ``condition`` is found.
         filter (callable): Optional :class:`~hunter.predicates.Query` object or a callable that returns True/False to filter the stored
             events with.
+        deferred (bool): With ``vars=True``, only render the variables of the events that get displayed.
+        repr_budget (int): Maximum total length of the variable reprs rendered for each deferred event.
         **kwargs: Arguments that are passed to :func:`hunter.Q`. Any kwarg that starts with "depth" or "calls" will be included `predicate`.
 
     See Also:
@@ -339,6 +343,8 @@ def Backlog(*conditions, **kwargs):
     stack = kwargs.pop('stack', 10)
     strip = kwargs.pop('strip', True)
     vars = kwargs.pop('vars', False)
+    # Only passed along when given, the Cython Backlog doesn't take them.
+    deferral = {key: kwargs.pop(key) for key in ('deferred', 'repr_budget') if key in kwargs}
     if not conditions and not kwargs:
         raise TypeError(
             "Backlog needs at least 1 condition (it doesn't have any effect without one besides making everything incredibly slow)."
@@ -351,6 +357,7 @@ def Backlog(*conditions, **kwargs):
         strip=strip,
         action=action,
         filter=filter,
+        **deferral,
     )
 
 
@@ -1,11 +1,17 @@
 # ruff: noqa: B008
+import atexit
 import collections
 import opcode
 import os
 import threading
+import weakref
 from collections import defaultdict
+from hashlib import blake2b
 from itertools import islice
+from operator import itemgetter
 from os import getpid
+from string import Formatter
+from time import monotonic
 from typing import ClassVar
 
 from . import config
@@ -38,6 +44,25 @@ __all__ = [
 BUILTIN_REPR_FUNCS = {'repr': repr, 'safe_repr': safe_repr}
 
 
+def compile_template(format_str, colors):
+    """
+    Substitutes the color placeholders of ``format_str`` once, leaving the positional and other named fields in place.
+    Returns ``None`` if a color placeholder uses a conversion (the caller should format the slow way).
+    """
+    parts = []
+    for literal, field, spec, conversion in Formatter().parse(format_str):
+        parts.append(literal.replace('{', '{{').replace('}', '}}'))
+        if field is None:
+            continue
+        if field in colors:
+            if conversion:
+                return None
+            parts.append(format(colors[field], spec).replace('{', '{{').replace('}', '}}'))
+        else:
+            parts.append('{%s%s%s}' % (field, f'!{conversion}' if conversion else '', f':{spec}' if spec else ''))  # noqa: UP031
+    return ''.join(parts)
+
+
 class Action:
     def __call__(self, event):
         raise NotImplementedError
@@ -103,12 +128,19 @@ class Manhole(Action):
 class ColorStreamAction(Action):
     """
     Baseclass for your custom action. Just implement your own ``__call__``.
+
+    Output is written straight to the stream unless ``buffer_size`` (characters) is set. Buffered output is flushed once
+    it outgrows ``buffer_size`` or ``flush_interval`` seconds after the previous flush, on :meth:`cleanup`, when a tracer
+    stops and at exit.
     """
 
     _stream_cache: ClassVar = {}
     _stream = None
     _tty = None
     _repr_func = None
+    _buffer = ()
+    # Actions define __eq__ (so they're unhashable), keyed by id instead.
+    _buffered_actions: ClassVar = weakref.WeakValueDictionary()
 
     OTHER_COLORS = OTHER_COLORS
     EVENT_COLORS = CODE_COLORS
@@ -123,6 +155,8 @@ class ColorStreamAction(Action):
         pid_alignment=config.Default('pid_alignment', 9),
         repr_limit=config.Default('repr_limit', 1024),
         repr_func=config.Default('repr_func', 'safe_repr'),
+        buffer_size=config.Default('buffer_size', 0),
+        flush_interval=config.Default('flush_interval', 0.5),
     ):
         self.force_colors = config.resolve(force_colors)
         self.force_pid = config.resolve(force_pid)
@@ -137,6 +171,14 @@ class ColorStreamAction(Action):
         self.repr_func = config.resolve(repr_func)
         self.seen_threads = set()
         self.seen_pid = getpid()
+        self.buffer_size = config.resolve(buffer_size)
+        self.flush_interval = config.resolve(flush_interval)
+        if self.buffer_size:
+            self._buffer = []
+            self._buffered = 0
+            self._buffer_lock = threading.Lock()
+            self._flushed_at = monotonic()
+            self._buffered_actions[id(self)] = self
 
     def __eq__(self, other):
         return (
@@ -189,6 +231,8 @@ class ColorStreamAction(Action):
             self._stream = value
             self.event_colors = dict.fromkeys(self.EVENT_COLORS, '')
             self.other_colors = dict.fromkeys(self.OTHER_COLORS, '')
+        # Output templates depend on the color mode.
+        self._templates = {}
 
     @property
     def repr_func(self):
@@ -341,10 +385,57 @@ class ColorStreamAction(Action):
 
         Returns: string
         """
-        self.stream.write(format_str.format(*args, **dict(self.other_colors, **kwargs)))
+        template = self._templates.get(format_str, MISSING)
+        if template is MISSING:
+            template = self._templates[format_str] = compile_template(format_str, self.other_colors)
+        if template is None or (kwargs and not self.other_colors.keys().isdisjoint(kwargs)):
+            self.write(format_str.format(*args, **dict(self.other_colors, **kwargs)))
+        else:
+            self.write(template.format(*args, **kwargs))
+
+    def write(self, text):
+        """
+        Writes ``text`` to ``self.stream``. If ``buffer_size`` is set the text is buffered instead and the buffer is flushed
+        when it grows past ``buffer_size`` characters or ``flush_interval`` seconds passed since the last flush.
+        """
+        if not self.buffer_size:
+            self.stream.write(text)
+            return
+        with self._buffer_lock:
+            self._buffer.append(text)
+            self._buffered += len(text)
+            if self._buffered >= self.buffer_size or monotonic() - self._flushed_at >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        """
+        Writes out anything buffered.
+        """
+        if self._buffer:
+            with self._buffer_lock:
+                self._flush()
+
+    def _flush(self):
+        text = ''.join(self._buffer)
+        self._buffer.clear()
+        self._buffered = 0
+        self._flushed_at = monotonic()
+        if text:
+            self.stream.write(text)
+
+    @classmethod
+    def flush_all(cls):
+        """
+        Flushes every action that buffers its output. Called when a :class:`~hunter.tracer.Tracer` stops and at exit.
+        """
+        for action in list(cls._buffered_actions.values()):
+            action.flush()
 
     def cleanup(self):
-        pass
+        self.flush()
+
+
+atexit.register(ColorStreamAction.flush_all)
 
 
 class CodePrinter(ColorStreamAction):
@@ -633,10 +724,14 @@ class VarsSnooper(ColorStreamAction):
     """
     A PySnooper-inspired action, similar to :class:`~hunter.actions.VarsPrinter`, but only show variable changes.
 
+    Changes are detected with a fixed-size digest of each variable's repr. Small immutable values (numbers, ``None``,
+    short strings) that are still the same object aren't even repr'd again. Only a short preview of the previous repr is
+    kept, for the ``old => new`` display.
+
     .. warning:: Should be considered experimental. Use judiciously.
 
-        * It stores reprs for all seen variables, therefore it can use lots of memory.
-        * Will leak memory if you filter the return events (eg: ``~Q(kind="return")``).
+        * Stores a digest and a preview for all seen variables of the last ``max_scopes`` scopes.
+        * Filtering the return events (eg: ``~Q(kind="return")``) keeps scopes around until they're evicted.
         * Not thoroughly tested. May misbehave on code with closures/nonlocal variables.
 
     Args:
@@ -646,11 +741,28 @@ class VarsSnooper(ColorStreamAction):
         repr_limit (bool): Limit length of ``repr()`` output. Default: ``512``.
         repr_func (string or callable): Function to use instead of ``repr``.
             If string must be one of 'repr' or 'safe_repr'. Default: ``'safe_repr'``.
+        max_scopes (int): Number of scopes (code objects) to track, least recently used ones are evicted. Default: ``1000``.
+        preview_limit (int): Length of the previous repr kept for display. Default: ``64``.
     """
 
-    def __init__(self, **options):
+    #: Values of these types are immutable, if a variable still holds the exact same object it didn't change.
+    IDENTITY_TYPES = (int, float, complex, bool, type(None), str, bytes)
+
+    def __init__(self, max_scopes=1000, preview_limit=64, **options):
         super().__init__(**options)
-        self.stored_reprs = defaultdict(dict)
+        self.max_scopes = max_scopes
+        self.preview_limit = preview_limit
+        self.stored_reprs = collections.OrderedDict()
+
+    def preview(self, value_repr):
+        """
+        Trims a repr to ``self.preview_limit`` the same way :meth:`try_repr` trims to ``self.repr_limit``.
+        """
+        limit = self.preview_limit
+        if len(value_repr) > limit:
+            cutoff = limit // 2
+            return '{} {CONT}[...]{RESET} {}'.format(value_repr[:cutoff], value_repr[-cutoff:], **self.other_colors)
+        return value_repr
 
     def __call__(self, event):
         """
@@ -663,13 +775,31 @@ class VarsSnooper(ColorStreamAction):
         filename_prefix = self.filename_prefix(event)
         empty_filename_prefix = self.filename_prefix()
 
-        current_reprs = {name: self.try_str(value) if event.detached else self.try_repr(value) for name, value in event.locals.items()}
         scope_key = event.code or event.function
-        scope = self.stored_reprs[scope_key]
-        for name, current_repr in sorted(current_reprs.items()):
-            previous_repr = scope.get(name)
-            if previous_repr is None:
-                scope[name] = current_repr
+        stored_reprs = self.stored_reprs
+        scope = stored_reprs.get(scope_key)
+        if scope is None:
+            scope = stored_reprs[scope_key] = {}
+            if len(stored_reprs) > self.max_scopes:
+                stored_reprs.popitem(last=False)
+        else:
+            stored_reprs.move_to_end(scope_key)
+
+        identity_types = self.IDENTITY_TYPES
+        repr_limit = self.repr_limit
+        for name, value in sorted(event.locals.items(), key=itemgetter(0)):
+            # Entries are (the value if it can be checked by identity, digest of the repr, preview of the repr).
+            previous = scope.get(name)
+            if type(value) in identity_types and (type(value) not in (str, bytes) or len(value) <= repr_limit):
+                if previous is not None and previous[0] is value:
+                    continue
+                token = value
+            else:
+                token = MISSING
+            current_repr = self.try_str(value) if event.detached else self.try_repr(value)
+            digest = blake2b(current_repr.encode('utf-8', 'backslashreplace'), digest_size=16).digest()
+            if previous is None:
+                scope[name] = token, digest, self.preview(current_repr)
                 if first:
                     self.output(
                         '{}{}{}{KIND}{:9} {VARS}[{VARS-NAME}{} {VARS}:= {RESET}{}{VARS}]{RESET}\n',
@@ -691,8 +821,8 @@ class VarsSnooper(ColorStreamAction):
                         name,
                         current_repr,
                     )
-            elif previous_repr != current_repr:
-                scope[name] = current_repr
+            elif previous[1] != digest:
+                scope[name] = token, digest, self.preview(current_repr)
                 if first:
                     self.output(
                         '{}{}{}{KIND}{:9} {VARS}[{VARS-NAME}{} {VARS}: {RESET}{}{VARS} => {RESET}{}{VARS}]{RESET}\n',
@@ -701,7 +831,7 @@ class VarsSnooper(ColorStreamAction):
                         filename_prefix,
                         event.kind,
                         name,
-                        previous_repr,
+                        previous[2],
                         current_repr,
                     )
                     first = False
@@ -713,12 +843,15 @@ class VarsSnooper(ColorStreamAction):
                         empty_filename_prefix,
                         '...',
                         name,
-                        previous_repr,
+                        previous[2],
                         current_repr,
                     )
+            elif token is not previous[0]:
+                # Same repr, different object: remember it so the next event can skip the repr.
+                scope[name] = token, digest, previous[2]
         if event.kind == 'return':
-            if scope_key in self.stored_reprs:
-                del self.stored_reprs[scope_key]
+            if scope_key in stored_reprs:
+                del stored_reprs[scope_key]
 
 
 RETURN_OPCODES = (opcode.opmap['RETURN_VALUE'],)
@@ -749,6 +882,9 @@ class ErrorSnooper(CodePrinter):
         max_depth (int): Increase if you want to drill into subsequent calls after an exception is raised. If you increase this you might
             want to also increase ``max_events`` since subsequent calls may have so many events you won't get to see the return event.
             Default: ``0`` (doesn't drill into any calls).
+        deferred (bool): Record cheap references to the variables (see :meth:`hunter.event.Event.defer`) and only ``repr`` them for
+            the events that get displayed. Mutated values will show their state at display time. Default: ``False``.
+        repr_budget (int): Maximum total length of the variable reprs rendered for each deferred event. Default: ``None`` (unlimited).
 
         stream (file-like): Stream to write to. Default: ``sys.stderr``.
         filename_alignment (int): Default size for the filename column (files are right-aligned). Default: ``40``.
@@ -765,20 +901,22 @@ class ErrorSnooper(CodePrinter):
         self.backlog = collections.deque(maxlen=self.max_backlog)
         self.max_events = kwargs.pop('max_events', 50)
         self.max_depth = kwargs.pop('max_depth', 0)
+        self.deferred = kwargs.pop('deferred', False)
+        self.repr_budget = kwargs.pop('repr_budget', None)
         self.origin = None
         self.events = None
         super().__init__(*args, **kwargs)
 
     def __call__(self, event):
         if self.max_backlog:
-            detached_event = event.detach(self.try_repr)
+            detached_event = self.detach(event)
             self.backlog.append(detached_event)
         else:
             detached_event = None
 
         if event.kind == 'exception':  # something interesting happened ;)
             if detached_event is None:
-                detached_event = event.detach(self.try_repr)
+                detached_event = self.detach(event)
             if self.origin:
                 self.events.append(detached_event)
                 if self.origin.depth > event.depth:
@@ -789,7 +927,7 @@ class ErrorSnooper(CodePrinter):
         elif self.origin:
             if event.kind == 'return':
                 if detached_event is None:
-                    detached_event = event.detach(self.try_repr)
+                    detached_event = self.detach(event)
                 self.events.append(detached_event)
                 if event.depth == self.origin.depth - 1:  # stop if the same function returned (depth is -1)
                     if event.instruction in RETURN_OPCODES:
@@ -807,18 +945,21 @@ class ErrorSnooper(CodePrinter):
                 self.output('{BRIGHT}{fore(BLACK)}{} too many lines{RESET}\n', '-' * 46)
             else:
                 if detached_event is None:
-                    detached_event = event.detach(self.try_repr)
+                    detached_event = self.detach(event)
                 self.events.append(detached_event)
 
+    def detach(self, event):
+        return event.defer() if self.deferred else event.detach(self.try_repr)
+
     def dump_events(self):
         self.output(
             '{BRIGHT}{fore(BLUE)}{} tracing {fore(YELLOW)}{}{fore(BLUE)} on {fore(RED)}{}{RESET}\n',
             '>' * 46,
             self.origin.function,
-            self.origin.arg,
+            self.origin.resolve(self.try_repr, self.repr_budget).arg,
         )
         for event in self.events:
-            super().__call__(event)
+            super().__call__(event.resolve(self.try_repr, self.repr_budget))
         self.origin = None
         self.events = None
 
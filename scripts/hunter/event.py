@@ -1,4 +1,5 @@
 import linecache
+import weakref
 from functools import partial
 from os.path import basename
 from os.path import exists
@@ -16,7 +17,140 @@ from .util import get_func_in_mro
 from .util import get_main_thread
 from .util import if_same_code
 
-__all__ = ('Event',)
+__all__ = ('Event', 'FastEvent')
+
+# Marks a lazy FastEvent slot that wasn't computed yet (None is a valid value for some of them).
+UNSET = object()
+
+
+# Normalized filenames keyed by ``co_filename`` and stdlib flags keyed by ``(filename, module)``. Neither changes for a
+# given code object, so events only pay for a dict lookup after the first one.
+FILENAMES = {}
+STDLIB = {}
+
+
+def frame_filename(frame):
+    """
+    Normalized path of the module the frame runs in (see :attr:`Event.filename`).
+    """
+    co_filename = frame.f_code.co_filename
+    filename = FILENAMES.get(co_filename)
+    if filename is not None:
+        return filename
+    filename = co_filename
+    if not filename:
+        # Depends on the globals, not the code - don't cache it.
+        return frame.f_globals.get('__file__') or '?'
+    if filename.endswith(('.pyc', '.pyo')):
+        filename = filename[:-1]
+    elif filename.endswith('$py.class'):  # Jython
+        filename = filename[:-9] + '.py'
+    elif filename.endswith(('.so', '.pyd')):
+        basename = CYTHON_SUFFIX_RE.sub('', filename)
+        for ext in ('.pyx', '.py'):
+            cyfilename = basename + ext
+            if exists(cyfilename):
+                filename = cyfilename
+                break
+    FILENAMES[co_filename] = filename
+    return filename
+
+
+def is_stdlib(filename, module):
+    """
+    Classifies a module as stdlib or not (see :attr:`Event.stdlib`).
+    """
+    key = filename, module
+    stdlib = STDLIB.get(key)
+    if stdlib is not None:
+        return stdlib
+    if 'pkg_resources' in module.split('.'):
+        # skip this over-vendored module
+        stdlib = True
+    elif filename == '<string>' and (module.startswith('namedtuple_') or module == 'site'):
+        # skip namedtuple exec garbage
+        stdlib = True
+    elif filename.startswith(SITE_PACKAGES_PATHS):
+        # if it's in site-packages then its definitely not stdlib
+        stdlib = False
+    elif filename.startswith(SYS_PREFIX_PATHS):
+        stdlib = True
+    else:
+        stdlib = False
+    STDLIB[key] = stdlib
+    return stdlib
+
+
+# filename -> (the ``linecache`` lines it was built from, the same lines with surrounding whitespace stripped). linecache
+# hands out a new list whenever it (re)loads a file, eg: after ``linecache.checkcache`` saw a new mtime or size, so an
+# identity check against its current entry is all the invalidation needed.
+LINE_TABLES = {}
+
+# code -> {(filename, lineno): source} for the tokenize-based definition extraction in :attr:`Event.fullsource`.
+DEFINITIONS = weakref.WeakKeyDictionary()
+
+
+def line_table(filename, module_globals):
+    """
+    Returns a ``(lines, stripped lines)`` pair for the given file, built once per version of the file.
+    """
+    table = LINE_TABLES.get(filename)
+    if table is not None:
+        entry = linecache.cache.get(filename, ())
+        if len(entry) > 2 and entry[2] is table[0]:
+            return table
+    lines = linecache.getlines(filename, module_globals)
+    table = LINE_TABLES[filename] = lines, [line.strip() for line in lines]
+    return table
+
+
+def line_source(filename, lineno, module_globals):
+    """
+    Source for a single line (see :attr:`Event.source`).
+    """
+    if filename.endswith(('.so', '.pyd')):
+        return f'??? NO SOURCE: not reading binary {splitext(basename(filename))[1]} file'
+    try:
+        lines = line_table(filename, module_globals)[0]
+        if 1 <= lineno <= len(lines):
+            return lines[lineno - 1]
+        return ''
+    except Exception as exc:
+        return f'??? NO SOURCE: {exc!r}'
+
+
+def definition_source(code, filename, lineno, module_globals):
+    """
+    Source of the ``def``/``class``/``lambda`` statement starting at ``lineno`` (decorators included), or ``None`` if
+    there isn't one. Memoized per code object.
+    """
+    sources = DEFINITIONS.get(code)
+    if sources is None:
+        sources = DEFINITIONS[code] = {}
+    key = filename, lineno
+    if key in sources:
+        return sources[key]
+    source = None
+    lines = []
+    try:
+        for _, token, _, _, _ in generate_tokens(
+            partial(
+                next,
+                yield_lines(
+                    filename,
+                    module_globals,
+                    lineno - 1,
+                    lines.append,
+                ),
+            )
+        ):
+            if token in ('def', 'class', 'lambda'):
+                source = ''.join(lines)
+                break
+    except TokenError:
+        pass
+    sources[key] = source
+    return source
 
 
 class Event:
@@ -40,6 +174,7 @@ class Event:
     depth = None
     calls = None
     builtin = None
+    deferred = False
 
     def __init__(
         self,
@@ -166,6 +301,52 @@ class Event:
 
         return event
 
+    def defer(self):
+        """
+        A cheap alternative to :meth:`detach` for events that will most likely be discarded without being displayed.
+
+        Static fields are detached as usual but no ``repr`` is done: ``arg`` is kept by reference, ``locals`` as a
+        shallow copy and ``globals`` as a reference to the module's dict. Call :meth:`resolve` before displaying the event.
+
+        .. warning:: Mutable values may change between the time of the event and the call to :meth:`resolve`.
+        """
+        event = self.detach()
+        event.__dict__['arg'] = self.arg
+        event.__dict__['locals'] = dict(self.locals)
+        event.__dict__['globals'] = self.globals
+        event.deferred = True
+        return event
+
+    def resolve(self, value_filter, budget=None):
+        """
+        Finishes a :meth:`defer`-ed event: returns a copy with ``value_filter`` applied to ``arg``, ``locals`` and
+        ``globals``, like :meth:`detach` would have done. Events that weren't deferred are returned as-is.
+
+        Args:
+            value_filter: Callable that takes one argument: ``value`` and returns a string.
+            budget (int): Optional limit on the total length of the strings produced for this event. Once it's spent
+                the remaining values are shown as ``'...'``.
+        """
+        if not self.deferred:
+            return self
+
+        spent = 0
+
+        def render(value):
+            nonlocal spent
+            if budget is not None and spent >= budget:
+                return '...'
+            text = value_filter(value)
+            spent += len(text)
+            return text
+
+        event = self.clone()
+        event.__dict__['arg'] = render(self.arg)
+        event.__dict__['locals'] = {key: render(value) for key, value in self.locals.items()}
+        event.__dict__['globals'] = {key: render(value) for key, value in self.globals.items()}
+        event.deferred = False
+        return event
+
     def clone(self):
         event = Event.__new__(Event)
         event.__dict__ = dict(self.__dict__)
@@ -313,23 +494,7 @@ class Event:
         #     return '<builtin>'
         # if self.builtin:
         #     return '<builtin>'
-        filename = self.frame.f_code.co_filename
-        if not filename:
-            filename = self.frame.f_globals.get('__file__')
-        if not filename:
-            filename = '?'
-        if filename.endswith(('.pyc', '.pyo')):
-            filename = filename[:-1]
-        elif filename.endswith('$py.class'):  # Jython
-            filename = filename[:-9] + '.py'
-        elif filename.endswith(('.so', '.pyd')):
-            basename = CYTHON_SUFFIX_RE.sub('', filename)
-            for ext in ('.pyx', '.py'):
-                cyfilename = basename + ext
-                if exists(cyfilename):
-                    filename = cyfilename
-                    break
-        return filename
+        return frame_filename(self.frame)
 
     @cached_property
     def lineno(self):
@@ -354,20 +519,7 @@ class Event:
 
         :type: bool
         """
-        module_parts = self.module.split('.')
-        if 'pkg_resources' in module_parts:
-            # skip this over-vendored module
-            return True
-        elif self.filename == '<string>' and (self.module.startswith('namedtuple_') or self.module == 'site'):
-            # skip namedtuple exec garbage
-            return True
-        elif self.filename.startswith(SITE_PACKAGES_PATHS):
-            # if it's in site-packages then its definitely not stdlib
-            return False
-        elif self.filename.startswith(SYS_PREFIX_PATHS):
-            return True
-        else:
-            return False
+        return is_stdlib(self.filename, self.module)
 
     @cached_property
     def fullsource(self):
@@ -380,25 +532,11 @@ class Event:
         """
         try:
             if self.kind == 'call' and self.code.co_name != '<module>':
-                lines = []
-                try:
-                    for _, token, _, _, _ in generate_tokens(
-                        partial(
-                            next,
-                            yield_lines(
-                                self.filename,
-                                self.frame.f_globals,
-                                self.lineno - 1,
-                                lines.append,
-                            ),
-                        )
-                    ):
-                        if token in ('def', 'class', 'lambda'):
-                            return ''.join(lines)
-                except TokenError:
-                    pass
-
-            return linecache.getline(self.filename, self.lineno, self.frame.f_globals)
+                source = definition_source(self.code, self.filename, self.lineno, self.frame.f_globals)
+                if source is not None:
+                    return source
+
+            return line_source(self.filename, self.lineno, self.frame.f_globals)
         except Exception as exc:
             return f'??? NO SOURCE: {exc!r}'
 
@@ -411,12 +549,140 @@ class Event:
 
         :type: str
         """
-        if self.filename.endswith(('.so', '.pyd')):
-            return f'??? NO SOURCE: not reading binary {splitext(basename(self.filename))[1]} file'
-        try:
-            return linecache.getline(self.filename, self.lineno, self.frame.f_globals)
-        except Exception as exc:
-            return f'??? NO SOURCE: {exc!r}'
+        return line_source(self.filename, self.lineno, self.frame.f_globals)
+
+    __getitem__ = object.__getattribute__
+
+
+class FastEvent:
+    """
+    A lightweight :class:`Event` for the hot path. Uses ``__slots__`` instead of a per-instance dict and only provides
+    a subset of the fields (see :attr:`FIELDS`): ``frame``, ``kind``, ``arg``, ``depth``, ``calls``, ``builtin``,
+    ``lineno`` and ``code`` are set eagerly, ``filename``, ``source``, ``locals``, ``globals``, ``module`` and
+    ``function`` are computed on first access and cached in a slot.
+
+    The :class:`~hunter.tracer.Tracer` creates these instead of :class:`Event` when the handler declares, through an
+    ``event_fields`` attribute, that it doesn't need anything else. Cannot be detached or cloned.
+    """
+
+    __slots__ = (
+        'frame',
+        'kind',
+        'arg',
+        'depth',
+        'calls',
+        'builtin',
+        'threading_support',
+        'lineno',
+        'code',
+        '_filename',
+        '_source',
+        '_locals',
+        '_globals',
+        '_module',
+        '_function',
+    )
+
+    #: Names of the fields available on these events.
+    FIELDS = frozenset(
+        (
+            'frame',
+            'kind',
+            'arg',
+            'depth',
+            'calls',
+            'builtin',
+            'threading_support',
+            'detached',
+            'lineno',
+            'code',
+            'filename',
+            'source',
+            'locals',
+            'globals',
+            'module',
+            'function',
+        )
+    )
+
+    detached = False
+
+    def __init__(self, frame, kind, arg, depth, calls, threading_support):
+        if kind.startswith('c_'):
+            kind = kind[2:]
+            self.builtin = True
+        else:
+            self.builtin = False
+        self.frame = frame
+        self.kind = kind
+        self.arg = arg
+        self.depth = depth
+        self.calls = calls
+        self.threading_support = threading_support
+        self.lineno = frame.f_lineno
+        self.code = frame.f_code
+        self._filename = self._source = self._locals = self._globals = self._module = self._function = UNSET
+
+    def __repr__(self):
+        return (
+            f'<FastEvent kind={self.kind!r} function={self.function!r} module={self.module!r} filename={self.filename!r} lineno={self.lineno}>'
+        )
+
+    def __eq__(self, other):
+        return self is other
+
+    __hash__ = object.__hash__
+
+    def __reduce__(self):
+        raise TypeError("cannot pickle 'hunter.event.FastEvent' object")
+
+    @property
+    def filename(self):
+        filename = self._filename
+        if filename is UNSET:
+            filename = self._filename = frame_filename(self.frame)
+        return filename
+
+    @property
+    def source(self):
+        source = self._source
+        if source is UNSET:
+            source = self._source = line_source(self.filename, self.lineno, self.frame.f_globals)
+        return source
+
+    @property
+    def locals(self):
+        value = self._locals
+        if value is UNSET:
+            value = self._locals = {} if self.builtin else self.frame.f_locals
+        return value
+
+    @property
+    def globals(self):
+        value = self._globals
+        if value is UNSET:
+            value = self._globals = {} if self.builtin else self.frame.f_globals
+        return value
+
+    @property
+    def module(self):
+        module = self._module
+        if module is UNSET:
+            if self.builtin:
+                module = self.arg.__module__
+            else:
+                module = self.frame.f_globals.get('__name__', '')
+            if module is None:
+                module = '?'
+            self._module = module
+        return module
+
+    @property
+    def function(self):
+        function = self._function
+        if function is UNSET:
+            function = self._function = self.arg.__name__ if self.builtin else self.code.co_name
+        return function
 
     __getitem__ = object.__getattribute__
 
@@ -431,7 +697,7 @@ def yield_lines(
 ):
     dedent = None
     amount = 0
-    for line in linecache.getlines(filename, module_globals)[start : start + limit]:
+    for line in line_table(filename, module_globals)[0][start : start + limit]:
         if dedent is None:
             dedent = leading_whitespace_re.findall(line)
             dedent = dedent[0] if dedent else ''
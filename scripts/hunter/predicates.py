@@ -38,7 +38,123 @@ class BasePredicate:
     pass
 
 
-class Query:
+def _event_fields(*predicates):
+    """
+    Union of the ``event_fields`` declared by the given predicates/actions, or ``None`` if any of them doesn't declare.
+    """
+    fields = set()
+    for predicate in predicates:
+        needed = getattr(predicate, 'event_fields', None)
+        if needed is None:
+            return None
+        fields.update(needed)
+    return frozenset(fields)
+
+
+_LITERAL_TYPES = (str, int, bool, type(None))
+
+
+def _constant(value, bind):
+    """
+    Source for ``value``: a literal if it round-trips through ``repr`` (so it compiles to a constant), otherwise a bound name.
+    """
+    if type(value) in _LITERAL_TYPES or (type(value) is tuple and all(type(item) in _LITERAL_TYPES for item in value)):
+        return repr(value)
+    return bind(value)
+
+
+def _query_tests(query, bind):
+    """
+    Source for each test of a :class:`Query`, in the same order ``Query`` has always checked them. Fields are read by
+    subscript, like ``Query`` always did, so mapping-only events can be filtered too.
+    """
+    tests = []
+    for key, value in query.query_eq:
+        tests.append(f'event[{key!r}] == {_constant(value, bind)}')
+    for key, value in query.query_in:
+        tests.append(f'event[{key!r}] in {_constant(value, bind)}')
+    for key, value in query.query_contains:
+        tests.append(f'{_constant(value, bind)} in event[{key!r}]')
+    for key, value in query.query_startswith:
+        tests.append(f'event[{key!r}].startswith({_constant(value, bind)})')
+    for key, value in query.query_endswith:
+        tests.append(f'event[{key!r}].endswith({_constant(value, bind)})')
+    for key, value in query.query_regex:
+        tests.append(f'{bind(value.match)}(event[{key!r}])')
+    for key, value in query.query_gt:
+        tests.append(f'event[{key!r}] > {_constant(value, bind)}')
+    for key, value in query.query_gte:
+        tests.append(f'event[{key!r}] >= {_constant(value, bind)}')
+    for key, value in query.query_lt:
+        tests.append(f'event[{key!r}] < {_constant(value, bind)}')
+    for key, value in query.query_lte:
+        tests.append(f'event[{key!r}] <= {_constant(value, bind)}')
+    return tests
+
+
+def _expression(predicate, bind, kind=None):
+    """
+    Source for a boolean expression equivalent to ``predicate(event)``. Queries and ``And``/``Or``/``Not`` trees are inlined,
+    anything else (including subclasses, which may override ``__call__``) is called through a bound name. A ``kind`` given
+    inlines ``predicate`` from its fields as that class.
+    """
+    kind = kind or type(predicate)
+    if kind is Query:
+        parts, empty, joiner = _query_tests(predicate, bind), 'True', ' and '
+    elif kind is And:
+        parts, empty, joiner = [_expression(p, bind) for p in predicate.predicates], 'True', ' and '
+    elif kind is Or:
+        parts, empty, joiner = [_expression(p, bind) for p in predicate.predicates], 'False', ' or '
+    elif kind is Not:
+        return f'(not {_expression(predicate.predicate, bind)})'
+    else:
+        return f'{bind(predicate)}(event)'
+    if not parts:
+        return empty
+    return f'({joiner.join(parts)})'
+
+
+def _compile(predicate):
+    """
+    Generates and compiles a plain function equivalent to calling ``predicate``, with the whole predicate tree flattened into it.
+    """
+    namespace = {}
+
+    def bind(value):
+        name = f'_{len(namespace)}'
+        namespace[name] = value
+        return name
+
+    # Subclasses are compiled from their own fields, calling them would only come back here.
+    kind = next(kind for kind in (Query, When, And, Or, Not) if isinstance(predicate, kind))
+    if kind is When:
+        actions = ''.join(f'        {bind(action)}(event)\n' for action in predicate.actions)
+        source = f'def when(event):\n    if {_expression(predicate.condition, bind)}:\n{actions}        return True\n    return False\n'
+    else:
+        source = f'def predicate(event):\n    return True if {_expression(predicate, bind, kind)} else False\n'
+    exec(compile(source, '<hunter.predicates>', 'exec'), namespace)
+    function = namespace['when' if kind is When else 'predicate']
+    function.source = source
+    return function
+
+
+class _CompiledPredicate:
+    """
+    Leaves the generated ``_compiled`` function out of pickles (functions made by ``exec`` can't be pickled), it's generated
+    again on unpickling.
+    """
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_compiled']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compiled = _compile(self)
+
+
+class Query(_CompiledPredicate):
     """
     Event-filtering predicate.
 
@@ -137,6 +253,7 @@ class Query:
         self.query_lte = tuple(sorted(query_lte.items()))
         self.query_gt = tuple(sorted(query_gt.items()))
         self.query_gte = tuple(sorted(query_gte.items()))
+        self._compiled = _compile(self)
 
     def __str__(self):
         return 'Query(%s)' % (  # noqa: UP031
@@ -191,52 +308,33 @@ class Query:
             and self.query_gte == other.query_gte
         )
 
+    @property
+    def event_fields(self):
+        """
+        Names of the event fields this query reads.
+        """
+        return frozenset(
+            key
+            for mapping in (
+                self.query_eq,
+                self.query_in,
+                self.query_contains,
+                self.query_startswith,
+                self.query_endswith,
+                self.query_regex,
+                self.query_lt,
+                self.query_lte,
+                self.query_gt,
+                self.query_gte,
+            )
+            for key, _ in mapping
+        )
+
     def __call__(self, event):
         """
         Handles event. Returns True if all criteria matched.
         """
-        for key, value in self.query_eq:
-            evalue = event[key]
-            if evalue != value:
-                return False
-        for key, value in self.query_in:
-            evalue = event[key]
-            if evalue not in value:
-                return False
-        for key, value in self.query_contains:
-            evalue = event[key]
-            if value not in evalue:
-                return False
-        for key, value in self.query_startswith:
-            evalue = event[key]
-            if not evalue.startswith(value):
-                return False
-        for key, value in self.query_endswith:
-            evalue = event[key]
-            if not evalue.endswith(value):
-                return False
-        for key, value in self.query_regex:
-            evalue = event[key]
-            if not value.match(evalue):
-                return False
-        for key, value in self.query_gt:
-            evalue = event[key]
-            if not evalue > value:
-                return False
-        for key, value in self.query_gte:
-            evalue = event[key]
-            if not evalue >= value:
-                return False
-        for key, value in self.query_lt:
-            evalue = event[key]
-            if not evalue < value:
-                return False
-        for key, value in self.query_lte:
-            evalue = event[key]
-            if not evalue <= value:
-                return False
-
-        return True
+        return self._compiled(event)
 
     def __or__(self, other):
         """
@@ -269,7 +367,7 @@ class Query:
         return And(other, self)
 
 
-class When:
+class When(_CompiledPredicate):
     """
     Conditional predicate. Runs ``actions`` when ``condition(event)`` is ``True``.
 
@@ -281,6 +379,7 @@ class When:
             raise TypeError('Must give at least one action.')
         self.condition = condition
         self.actions = tuple(action() if inspect.isclass(action) and issubclass(action, Action) else action for action in actions)
+        self._compiled = _compile(self)
 
     def __str__(self):
         return 'When({}, {})'.format(
@@ -294,16 +393,18 @@ class When:
     def __eq__(self, other):
         return isinstance(other, When) and self.condition == other.condition and self.actions == other.actions
 
+    @property
+    def event_fields(self):
+        """
+        Event fields needed by the condition and actions (``None`` if any of them doesn't say).
+        """
+        return _event_fields(self.condition, *self.actions)
+
     def __call__(self, event):
         """
         Handles the event.
         """
-        if self.condition(event):
-            for action in self.actions:
-                action(event)
-            return True
-        else:
-            return False
+        return self._compiled(event)
 
     def __or__(self, other):
         """
@@ -428,13 +529,14 @@ class From:
         return And(other, self)
 
 
-class And:
+class And(_CompiledPredicate):
     """
     Logical conjunction. Returns ``False`` at the first sub-predicate that returns ``False``, otherwise returns ``True``.
     """
 
     def __init__(self, *predicates):
         self.predicates = predicates
+        self._compiled = _compile(self)
 
     def __str__(self):
         return f'And({", ".join(str(p) for p in self.predicates)})'
@@ -445,15 +547,18 @@ class And:
     def __eq__(self, other):
         return isinstance(other, And) and self.predicates == other.predicates
 
+    @property
+    def event_fields(self):
+        """
+        Event fields needed by the sub-predicates (``None`` if any of them doesn't say).
+        """
+        return _event_fields(*self.predicates)
+
     def __call__(self, event):
         """
         Handles the event.
         """
-        for predicate in self.predicates:
-            if not predicate(event):
-                return False
-        else:
-            return True
+        return self._compiled(event)
 
     def __or__(self, other):
         """
@@ -491,13 +596,14 @@ class And:
         return And(other, *self.predicates)
 
 
-class Or:
+class Or(_CompiledPredicate):
     """
     Logical disjunction. Returns ``True`` after the first sub-predicate that returns ``True``.
     """
 
     def __init__(self, *predicates):
         self.predicates = predicates
+        self._compiled = _compile(self)
 
     def __str__(self):
         return f'Or({", ".join(str(p) for p in self.predicates)})'
@@ -508,15 +614,18 @@ class Or:
     def __eq__(self, other):
         return isinstance(other, Or) and self.predicates == other.predicates
 
+    @property
+    def event_fields(self):
+        """
+        Event fields needed by the sub-predicates (``None`` if any of them doesn't say).
+        """
+        return _event_fields(*self.predicates)
+
     def __call__(self, event):
         """
         Handles the event.
         """
-        for predicate in self.predicates:
-            if predicate(event):
-                return True
-        else:
-            return False
+        return self._compiled(event)
 
     def __or__(self, other):
         """
@@ -554,13 +663,14 @@ class Or:
         return And(other, self)
 
 
-class Not:
+class Not(_CompiledPredicate):
     """
     Logical complement (negation). Simply returns ``not predicate(event)``.
     """
 
     def __init__(self, predicate):
         self.predicate = predicate
+        self._compiled = _compile(self)
 
     def __str__(self):
         return f'Not({self.predicate})'
@@ -571,11 +681,18 @@ class Not:
     def __eq__(self, other):
         return isinstance(other, Not) and self.predicate == other.predicate
 
+    @property
+    def event_fields(self):
+        """
+        Event fields needed by the negated predicate (``None`` if it doesn't say).
+        """
+        return _event_fields(self.predicate)
+
     def __call__(self, event):
         """
         Handles the event.
         """
-        return not self.predicate(event)
+        return self._compiled(event)
 
     def __or__(self, other):
         """
@@ -645,6 +762,10 @@ class Backlog:
         action (ColorStreamAction): A ColorStreamAction to display the stored events when an event matching the ``condition`` is found.
         filter (callable): Optional :class:`~hunter.predicates.Query` object or a callable that returns True/False to filter the stored
             events with.
+        deferred (bool): Only has an effect with ``vars=True``. Stores cheap references to the variables instead of their ``repr`` (see
+            :meth:`hunter.event.Event.defer`) and only renders them for the events that actually get displayed. Much faster on busy code
+            but mutated values will show their state at display time.
+        repr_budget (int): Maximum total length of the variable reprs rendered for each deferred event. Default: ``None`` (unlimited).
 
     See Also:
          :class:`hunter.predicates.From`
@@ -659,6 +780,8 @@ class Backlog:
         strip=True,
         action=None,
         filter=None,
+        deferred=False,
+        repr_budget=None,
     ):
         self.action = action() if inspect.isclass(action) and issubclass(action, Action) else action
         if not isinstance(self.action, ColorStreamAction):
@@ -671,6 +794,8 @@ class Backlog:
         self.vars = vars
         self._try_repr = self.action.try_repr if self.vars else None
         self._filter = filter
+        self.deferred = deferred
+        self.repr_budget = repr_budget
 
     def __call__(self, event):
         """
@@ -719,10 +844,8 @@ class Backlog:
                             if self._filter is None or self._filter(stack_event):
                                 self.action(stack_event)
                 for backlog_event in self.queue:
-                    if self._filter is None:
-                        self.action(backlog_event)
-                    elif self._filter(backlog_event):
-                        self.action(backlog_event)
+                    if self._filter is None or self._filter(backlog_event):
+                        self.action(backlog_event.resolve(self._try_repr, self.repr_budget))
                 self.queue.clear()
         else:
             if self.strip and event.depth < 1:
@@ -730,17 +853,26 @@ class Backlog:
                 # Delete everything because we don't want to see what is likely just a long stream of useless returns.
                 self.queue.clear()
             if self._filter is None or self._filter(event):
-                detached_event = event.detach(self._try_repr)
+                if self.deferred and self._try_repr is not None:
+                    detached_event = event.defer()
+                else:
+                    detached_event = event.detach(self._try_repr)
                 detached_event.frame = event.frame
                 self.queue.append(detached_event)
 
         return result
 
     def __str__(self):
-        return f'Backlog({self.condition}, size={self.size}, stack={self.stack}, vars={self.vars}, action={self.action}, filter={self._filter})'
+        return (
+            f'Backlog({self.condition}, size={self.size}, stack={self.stack}, vars={self.vars}, action={self.action}, filter={self._filter}, '
+            f'deferred={self.deferred}, repr_budget={self.repr_budget})'
+        )
 
     def __repr__(self):
-        return f'<hunter.predicates.Backlog: condition={self.condition!r}, size={self.size!r}, stack={self.stack!r}, vars={self.vars!r}, action={self.action!r}, filter={self._filter!r}>'
+        return (
+            f'<hunter.predicates.Backlog: condition={self.condition!r}, size={self.size!r}, stack={self.stack!r}, vars={self.vars!r}, '
+            f'action={self.action!r}, filter={self._filter!r}, deferred={self.deferred!r}, repr_budget={self.repr_budget!r}>'
+        )
 
     def __eq__(self, other):
         return (
@@ -750,6 +882,8 @@ class Backlog:
             and self.stack == other.stack
             and self.vars == other.vars
             and self.action == other.action
+            and self.deferred == other.deferred
+            and self.repr_budget == other.repr_budget
         )
 
     def __or__(self, other):
@@ -775,6 +909,8 @@ class Backlog:
             vars=self.vars,
             action=self.action,
             filter=self._filter,
+            deferred=self.deferred,
+            repr_budget=self.repr_budget,
         )
 
     def __ror__(self, other):
@@ -812,4 +948,6 @@ class Backlog:
             vars=self.vars,
             action=self.action,
             filter=_merge(*predicates, **kwargs),
+            deferred=self.deferred,
+            repr_budget=self.repr_budget,
         )
@@ -4,9 +4,12 @@ import errno
 import json
 import os
 import platform
+import queue
 import signal
 import socket
+import struct
 import sys
+import threading
 import time
 from contextlib import closing
 from contextlib import contextmanager
@@ -31,30 +34,110 @@ def install(**kwargs):
     manhole.install(**kwargs)
 
 
+# Every frame sent to the hunter-trace process is a 4 byte big-endian length followed by that many bytes of output.
+FRAME_HEADER = struct.Struct('>I')
+
+
 class RemoteStream:
-    def __init__(self, path, isatty, encoding):
+    """
+    File-like sink that ships trace output to the ``hunter-trace`` process.
+
+    Writes only append to an in-memory batch: a background thread sends batches as length-prefixed frames, once they
+    reach ``frame_size`` bytes or every ``flush_interval`` seconds. At most ``max_frames`` frames wait to be sent - when
+    the client can't keep up, new frames are dropped (and counted in :attr:`dropped`) instead of blocking the traced
+    process. The client is told how much was lost.
+    """
+
+    def __init__(self, path, isatty, encoding, frame_size=65536, flush_interval=0.05, max_frames=256):
         self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         self._sock.connect(path)
         self._isatty = isatty
         self._encoding = encoding
+        self._frame_size = frame_size
+        self._flush_interval = flush_interval
+        self._batch = []
+        self._batch_size = 0
+        self._lock = threading.Lock()
+        self._frames = queue.Queue(max_frames)
+        self._closing = False
+        self._error = None
+
+        #: Number of bytes of output dropped because the client was too slow.
+        self.dropped = 0
+        self._reported = 0
+
+        self._sender = threading.Thread(target=self._send_frames, name='hunter.remote.RemoteStream', daemon=True)
+        self._sender.start()
 
     def isatty(self):
         return self._isatty
 
     def write(self, data):
-        try:
-            if isinstance(data, bytes):
-                data = data.decode('ascii', 'replace')
-            self._sock.send(data.encode(self._encoding))
-        except Exception as exc:
+        if self._error is not None:
+            exc, self._error = self._error, None
             print(
-                f'Hunter failed to send trace output {data!r} (encoding: {self._encoding!r}): {exc!r}. Stopping tracer.',
+                f'Hunter failed to send trace output (encoding: {self._encoding!r}): {exc!r}. Stopping tracer.',
                 file=sys.stderr,
             )
             hunter.stop()
+            return
+        if isinstance(data, bytes):
+            data = data.decode('ascii', 'replace')
+        data = data.encode(self._encoding, 'replace')
+        with self._lock:
+            self._batch.append(data)
+            self._batch_size += len(data)
+            if self._batch_size >= self._frame_size:
+                self._seal()
 
     def flush(self):
-        pass
+        with self._lock:
+            self._seal()
+
+    def _seal(self):
+        """
+        Moves the current batch to the send queue, or drops it if the queue is full. Must hold ``self._lock``.
+        """
+        if not self._batch:
+            return
+        frame = b''.join(self._batch)
+        self._batch.clear()
+        self._batch_size = 0
+        try:
+            self._frames.put_nowait(frame)
+        except queue.Full:
+            self.dropped += len(frame)
+
+    def _send_frames(self):
+        while True:
+            try:
+                frame = self._frames.get(timeout=self._flush_interval)
+            except queue.Empty:
+                if self._closing:
+                    return
+                self.flush()
+                continue
+            try:
+                if self.dropped != self._reported:
+                    notice = f'\n... hunter dropped {self.dropped - self._reported} bytes of trace output (client too slow) ...\n'
+                    self._reported = self.dropped
+                    self._send(notice.encode(self._encoding, 'replace'))
+                self._send(frame)
+            except Exception as exc:
+                self._error = exc
+                return
+
+    def _send(self, payload):
+        self._sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+    def close(self, timeout=1):
+        """
+        Sends whatever is left (waiting up to ``timeout`` seconds) and closes the connection.
+        """
+        self.flush()
+        self._closing = True
+        self._sender.join(timeout)
+        self._sock.close()
 
 
 @contextmanager
@@ -140,12 +223,15 @@ def activate(sink_path, isatty, encoding, options):
             )
         )
         hunter._default_stream = sys.stderr
+        stream.close()
         raise
 
 
 def deactivate():
-    hunter._default_stream = sys.stderr
+    stream, hunter._default_stream = hunter._default_stream, sys.stderr
     hunter.stop()
+    if isinstance(stream, RemoteStream):
+        stream.close()
 
 
 parser = argparse.ArgumentParser(description='Trace a process.')
@@ -213,7 +299,10 @@ def main():
                 'WARNING: Failed to get pid of connected process.',
                 file=sys.stderr,
             )
-        data = conn.recv(1024)
-        while data:
-            stdout.write(data)
-            data = conn.recv(1024)
+        frames = conn.makefile('rb')
+        while True:
+            header = frames.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                break
+            (size,) = FRAME_HEADER.unpack(header)
+            stdout.write(frames.read(size))
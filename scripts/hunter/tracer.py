@@ -4,7 +4,9 @@ import traceback
 
 import hunter
 
+from .actions import ColorStreamAction
 from .event import Event
+from .event import FastEvent
 
 __all__ = ('Tracer',)
 
@@ -19,6 +21,7 @@ class Tracer:
 
     def __init__(self, threading_support=None, profiling_mode=False):
         self._handler = None
+        self._event_class = Event
         self._previous = None
         self._threading_previous = None
 
@@ -78,7 +81,7 @@ class Tracer:
         if self._handler is not None:
             if kind == 'return' and self.depth > 0:
                 self.depth -= 1
-            event = Event(frame, kind, arg, self.depth, self.calls, self.threading_support)
+            event = self._event_class(frame, kind, arg, self.depth, self.calls, self.threading_support)
             try:
                 self._handler(event)
             except Exception as exc:
@@ -96,12 +99,17 @@ class Tracer:
         """
         Starts tracing with the given callable.
 
+        If the predicate has an ``event_fields`` attribute listing only fields available on
+        :class:`~hunter.event.FastEvent` then those lighter events are created instead of :class:`~hunter.event.Event`.
+
         Args:
             predicate (callable that accepts a single :obj:`~hunter.event.Event` argument):
         Return:
             self
         """
         self._handler = predicate
+        fields = getattr(predicate, 'event_fields', None)
+        self._event_class = FastEvent if fields is not None and FastEvent.FIELDS.issuperset(fields) else Event
         if self.profiling_mode:
             if self.threading_support is None or self.threading_support:
                 self._threading_previous = getattr(threading, '_profile_hook', None)
@@ -118,7 +126,7 @@ class Tracer:
 
     def stop(self):
         """
-        Stop tracing. Reinstalls the :attr:`~hunter.tracer.Tracer.previous` tracer.
+        Stop tracing. Reinstalls the :attr:`~hunter.tracer.Tracer.previous` tracer and flushes buffered action output.
         """
         if self._handler is not None:
             if self.profiling_mode:
@@ -133,6 +141,7 @@ class Tracer:
                 if self.threading_support is None or self.threading_support:
                     threading.settrace(self._threading_previous)
                     self._threading_previous = None
+            ColorStreamAction.flush_all()
 
     def __enter__(self):
         """
@@ -18,6 +18,12 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import time
+
+# Taken before anything else is imported so PLV_STATS can tell how long
+# loading the tracer itself (hunter included) took.
+LOADED_AT = time.perf_counter()
+
 import ast
 import os
 import sys
@@ -26,8 +32,24 @@ import json
 import builtins
 import traceback
 import io
+import hashlib
+import hmac
+import linecache
+import marshal
+import secrets
+import shutil
+import signal
+import site
+import socket
+import sysconfig
+import tempfile
+import threading
 from copy import deepcopy
+from functools import lru_cache, wraps
 from importlib import util
+from importlib.machinery import SourceFileLoader
+from types import CodeType, FunctionType, ModuleType
+from collections.abc import Iterator
 from contextlib import contextmanager
 
 try:
@@ -42,6 +64,7 @@ except ImportError:
 try:
     import hunter
     from hunter import trace
+    from hunter.event import line_table
 except ImportError as e:
     # If hunter is not available, exit gracefully with an error
     print("PLV: []", file=sys.stdout)
@@ -63,12 +86,275 @@ PLV_MACROS = re.compile(
 )
 
 
-def import_file(full_name, fullpath):
+def cache_dir():
+    """
+    Where compiled code objects are kept between runs. Every
+    trace is a fresh interpreter, so the cache has to live on
+    disk to be of any use. It's per user, see `trusted_cache_dir`.
+    """
+    directory = os.environ.get("PYLIVEVIEW_CACHE_DIR")
+    if directory:
+        return directory
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or tempfile.gettempdir()
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "pyliveview")
+
+
+# TRUSTED_CACHE_DIRS[dict]: cache dir -> whether `trusted_cache_dir` accepted it.
+TRUSTED_CACHE_DIRS = {}
+
+# CACHE_PRUNED[bool]: Whether this process already pruned the cache.
+CACHE_PRUNED = False
+
+
+def trusted_cache_dir():
+    """
+    `cache_dir()`, created private (0700) when missing, or None when
+    it can't be trusted. What's loaded from it gets executed, so it
+    must belong to us and be writable by nobody else.
+    """
+    directory = cache_dir()
+    trusted = TRUSTED_CACHE_DIRS.get(directory)
+    if trusted is None:
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            st = os.stat(directory)
+            trusted = not hasattr(os, "getuid") or (
+                st.st_uid == os.getuid() and not st.st_mode & 0o022
+            )
+        except OSError:
+            trusted = False
+        TRUSTED_CACHE_DIRS[directory] = trusted
+    return directory if trusted else None
+
+
+def source_digest(*parts):
+    """
+    Hash of the given source fragments, salted with the bytecode
+    magic number so entries never leak across interpreter versions.
+    """
+    digest = hashlib.blake2b(util.MAGIC_NUMBER, digest_size=16)
+    for part in parts:
+        digest.update(part.encode("utf-8", "surrogatepass"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def cache_load(key):
+    directory = trusted_cache_dir()
+    if directory is None:
+        return None
+    try:
+        with open(os.path.join(directory, key + ".code"), "rb") as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def cache_store(key, code):
+    directory = trusted_cache_dir()
+    if directory is None:
+        return
+    path = os.path.join(directory, key + ".code")
+    try:
+        # Write then rename so a concurrent run never sees half a file.
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            marshal.dump(code, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def cache_prune(keep=512):
+    """
+    Bound the cache by dropping the least recently written entries.
+    Scanning the directory isn't free, so it's done once per process.
+    """
+    global CACHE_PRUNED
+    directory = trusted_cache_dir()
+    if CACHE_PRUNED or directory is None:
+        return
+    CACHE_PRUNED = True
+    try:
+        entries = [e for e in os.scandir(directory) if e.name.endswith(".code")]
+    except OSError:
+        return
+    if len(entries) <= keep:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for entry in entries[: len(entries) - keep]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def relocate_code(code, filename, line_delta=0):
+    """
+    Cached code objects remember the (random) temp file they were
+    first compiled from. Point them, and everything nested in them,
+    at the file being traced now so `co_filename` matches what the
+    tracer filters on. Line tables are stored relative to
+    `co_firstlineno`, so shifting a function only means shifting that.
+    """
+    consts = tuple(
+        relocate_code(c, filename, line_delta) if isinstance(c, CodeType) else c
+        for c in code.co_consts
+    )
+    return code.replace(
+        co_filename=filename,
+        co_firstlineno=code.co_firstlineno + line_delta,
+        co_consts=consts,
+    )
+
+
+def timed(name):
+    """
+    Accumulates the wall time spent in the decorated function
+    under `STATS[name + "_seconds"]`.
+    """
+    key = name + "_seconds"
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                STATS[key] += time.perf_counter() - started
+
+        return wrapper
+
+    return decorator
+
+
+@timed("compile")
+def compile_cached(source, fullpath):
+    """
+    Compiles `source` for `fullpath`, reusing earlier work where possible:
+
+        1. The whole module, when the exact source was compiled before.
+        2. Otherwise each unchanged top-level function body. Those are
+           compiled as `pass` stubs and swapped for the cached code
+           objects afterwards, so only edited functions pay for codegen.
+    """
+    module_key = source_digest("module", source)
+    code = cache_load(module_key)
+    if isinstance(code, CodeType):
+        return relocate_code(code, fullpath)
+
+    tree = ast.parse(source, fullpath)
+
+    # Future imports change how bodies compile, so they salt every key.
+    futures = "".join(
+        ast.get_source_segment(source, n) or ""
+        for n in tree.body
+        if isinstance(n, ast.ImportFrom) and n.module == "__future__"
+    )
+
+    lines = source.splitlines(True)
+    fresh = {}
+    reused = {}
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        # Generic functions live inside an annotation scope rather than
+        # directly in the module constants, so they can't be swapped.
+        if getattr(node, "type_params", None):
+            continue
+        # Code objects start at the first decorator, so the key covers
+        # the lines from there: line numbers are relative to it.
+        first_line = node.decorator_list[0].lineno if node.decorator_list else node.lineno
+        if node.end_lineno is None:
+            continue
+        segment = "".join(lines[first_line - 1 : node.end_lineno])
+        key = source_digest("function", futures, segment)
+        cached = cache_load(key)
+        if isinstance(cached, CodeType) and cached.co_name == node.name:
+            reused[(node.name, first_line)] = cached
+            node.body = [ast.copy_location(ast.Pass(), node.body[0])]
+        else:
+            fresh[(node.name, first_line)] = key
+
+    code = compile(tree, fullpath, "exec", dont_inherit=True)
+
+    consts = []
+    swapped = 0
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            location = (const.co_name, const.co_firstlineno)
+            if location in reused:
+                cached = reused[location]
+                const = relocate_code(
+                    cached, fullpath, const.co_firstlineno - cached.co_firstlineno
+                )
+                swapped += 1
+            elif location in fresh:
+                cache_store(fresh[location], const)
+        consts.append(const)
+
+    if swapped != len(reused):
+        # A stub we couldn't find again would silently run as `pass`.
+        code = compile(source, fullpath, "exec", dont_inherit=True)
+    else:
+        code = code.replace(co_consts=tuple(consts))
+
+    cache_store(module_key, code)
+    cache_prune()
+    return code
+
+
+class PyLiveViewLoader(SourceFileLoader):
+    """
+    Source loader that compiles through the content-hash code cache
+    instead of CPython's mtime-keyed `.pyc` files, which never hit for
+    the throwaway temp files the extension hands us (and which would
+    otherwise litter the user's `__pycache__` with one file per edit).
+
+    Given `source`, the module's file is never read: the (unsaved)
+    text is compiled instead and served to linecache in its place.
+    """
+
+    def __init__(self, fullname, path, source=None):
+        super().__init__(fullname, path)
+        self.source = source
+        if source is not None:
+            # An mtime of None keeps linecache.checkcache from
+            # replacing the entry with what's on disk.
+            lines = source.splitlines(True)
+            linecache.cache[path] = (len(source), None, lines, path)
+
+    def get_data(self, path):
+        if self.source is not None and path == self.path:
+            return self.source.encode("utf-8")
+        return super().get_data(path)
+
+    def get_source(self, fullname):
+        if self.source is not None:
+            return self.source
+        return super().get_source(fullname)
+
+    def get_code(self, fullname):
+        path = self.get_filename(fullname)
+        source = self.source
+        if source is None:
+            source = util.decode_source(self.get_data(path))
+        code = compile_cached(source, path)
+        volatile_names(source)
+        return code
+
+
+def import_file(full_name, fullpath, source=None):
     """
     The recommended method of importing a file by its
     absolute path in Python 3.5+
     """
-    spec = util.spec_from_file_location(full_name, fullpath)
+    loader = PyLiveViewLoader(full_name, fullpath, source)
+    spec = util.spec_from_file_location(full_name, fullpath, loader=loader)
     mod = util.module_from_spec(spec)
     spec.loader.exec_module(mod)
     return mod
@@ -82,13 +368,16 @@ def script_path(script_dir):
     relative imports to work on the target script.
     """
     original_cwd = os.getcwd()
-    os.chdir(script_dir)
+    # Unsaved sources (see `main`) can name a folder that doesn't exist.
+    if os.path.isdir(script_dir):
+        os.chdir(script_dir)
     sys.path.insert(1, script_dir)
     yield
     os.chdir(original_cwd)
     sys.path.remove(script_dir)
 
 
+@timed("deepcopy")
 def try_deepcopy(obj):
     """
     Deepcopy can throw a type error when sys modules are to be
@@ -120,6 +409,63 @@ ORIGINAL_PRINT = builtins.print
 # Sentinel used to signal an eval error without throwing from the tracer.
 EVAL_ERROR = object()
 
+# LINE_PLANS[dict]: stripped source line -> (PLV_MACROS match, parsed ast).
+# Loops run the same lines over and over, so each distinct line is only
+# matched and parsed once.
+LINE_PLANS = {}
+
+# HOT_LINE_LIMIT[int]: Hits after which a line backs off to exponential
+# sampling, it's then only recorded on hit 2K, 4K, 8K, .. and on its last
+# hit (0 disables it). The extension sets it from `pyliveview.hotLineLimit`.
+HOT_LINE_LIMIT = int(os.environ.get("PYLIVEVIEW_HOT_LINE_LIMIT", 100))
+
+# LINE_HITS[dict]: lineno -> exact number of times the line ran.
+LINE_HITS = {}
+
+# HOT_LINES_FILE[str|None]: The file LINE_HITS counts the lines of.
+HOT_LINES_FILE = None
+
+# BACKED_OFF[dict]: lineno -> [source, globals, locals, printed] of the
+# latest hit of a hot line, while that hit wasn't recorded.
+BACKED_OFF = {}
+
+
+def new_stats():
+    return {
+        "events": 0,
+        "events_filtered": 0,
+        "events_backed_off": 0,
+        "entries": 0,
+        "output_bytes": 0,
+        "load_seconds": 0.0,
+        "run_seconds": 0.0,
+        "compile_seconds": 0.0,
+        "result_handler_seconds": 0.0,
+        "parse_eval_seconds": 0.0,
+        "deepcopy_seconds": 0.0,
+        "serialize_seconds": 0.0,
+        # Why the same source could trace differently, see `watch_volatile`.
+        "uncacheable": [],
+    }
+
+
+# STATS[dict]: Cheap self-instrumentation, reported as `PLV_STATS:`
+STATS = new_stats()
+
+
+def should_record(hits):
+    """
+    True for the first HOT_LINE_LIMIT hits of a line, then only
+    when `hits` is the limit times a power of two.
+    """
+    limit = HOT_LINE_LIMIT
+    if not limit or hits <= limit:
+        return True
+    if hits % limit:
+        return False
+    doubling = hits // limit
+    return not doubling & (doubling - 1)
+
 
 def hooked_print(*args, **kwargs):
     # Capture output to a string
@@ -142,6 +488,16 @@ def hooked_print(*args, **kwargs):
     except:
         return
 
+    # A backed off hit has no entry of its own to hold the output, it's
+    # kept in case the hit is the line's last, see `replay_backed_off`.
+    if frame.f_code.co_filename == HOT_LINES_FILE and not should_record(
+        LINE_HITS.get(lineno, 0)
+    ):
+        pending = BACKED_OFF.get(lineno)
+        if pending is not None:
+            pending[3] = captured if pending[3] is None else pending[3] + "\n" + captured
+        return
+
     global PLV
     # Find active tracing entries for this line and update them
     # We search from the end of PLV because print happens after the line is hit.
@@ -153,6 +509,10 @@ def hooked_print(*args, **kwargs):
             else:
                 item["value"] = captured
             break
+    else:
+        # Sampled runs only build their entries at the end.
+        if SAMPLER is not None and frame.f_code.co_filename == SAMPLER.filename:
+            SAMPLER.printed(lineno, captured)
 
 
 def resultifier(value):
@@ -170,6 +530,7 @@ def resultifier(value):
     return str(value)
 
 
+@timed("serialize")
 def plv_formats():
     # It's important that we create an output that can be handled
     # by the javascript `JSON.parse(...)` function.
@@ -179,10 +540,26 @@ def plv_formats():
     return "[" + python_data + "]"
 
 
+def plv_stats(output):
+    STATS["entries"] = len(PLV)
+    # Exact counts of the lines that backed off (their values were sampled).
+    STATS["hot_lines"] = {
+        lineno: hits
+        for lineno, hits in sorted(LINE_HITS.items())
+        if HOT_LINE_LIMIT and hits > HOT_LINE_LIMIT
+    }
+    STATS["output_bytes"] = len(output.encode("utf-8", "surrogatepass"))
+    return json.dumps(
+        {k: round(v, 6) if isinstance(v, float) else v for k, v in STATS.items()}
+    )
+
+
 def plv_prints():
+    output = plv_formats()
     # DO NOT TOUCH, ie: no pretty printing
     print("PYLIVEVIEW_PYTHON_EXECUTABLE: " + sys.executable)
-    print("PLV: " + plv_formats())  # <--  PyLiveView result
+    print("PLV_STATS: " + plv_stats(output))
+    print("PLV: " + output)  # <--  PyLiveView result
     ######################################
 
 
@@ -192,6 +569,7 @@ class StopTracer(BaseException):
     pass
 
 
+@timed("parse_eval")
 def parse_eval(*args, **kw):
     global PLV
     event = kw.get("event")
@@ -221,6 +599,25 @@ def parse_eval(*args, **kw):
         raise e
 
 
+def line_plan(source):
+    """
+    Returns the (PLV_MACROS match, ast) pair for a stripped
+    source line, both None if the line isn't something we
+    annotate. Memoized in LINE_PLANS.
+    """
+    plan = LINE_PLANS.get(source)
+    if plan is None:
+        match = PLV_MACROS.search(source)
+        if source not in ["pass", "break", "continue"] and match:
+            # TODO: We should be using the ast instead of regex for all cases.
+            plan = (match, ast.parse(source))
+        else:
+            plan = (None, None)
+        LINE_PLANS[source] = plan
+    return plan
+
+
+@timed("result_handler")
 def result_handler(event):
     """
     Called by the `trace` function to handle any actions post
@@ -240,16 +637,18 @@ def result_handler(event):
     # NOTE: Consider refactoring this using
     #      class variables instead of globals.
 
-    # We don't want any whitespace around our
-    # source code that could mess up the parser.
-    source = event["source"].strip()
+    # We don't want any whitespace around our source code that could
+    # mess up the parser, the line table is already stripped.
+    lineno = event["lineno"]
+    lines = line_table(event["filename"], event["globals"])[1]
+    source = lines[lineno - 1] if 0 < lineno <= len(lines) else ""
 
     # These are the fields returned from each line
     # of the traced program. This is essentially
     # the metadata returned to the extension in the
     # PLV list.
     metadata = {
-        "lineno": event["lineno"],
+        "lineno": lineno,
         "source": source,
     }
 
@@ -264,19 +663,16 @@ def result_handler(event):
     _globals = event["globals"]
     _locals = event["locals"]
 
-    # This regex does all the heavy lifting. Check out
+    # The PLV_MACROS regex does all the heavy lifting. Check out
     # https://regex101.com/r/npWf6w/5 for an example of
     # how it works.
-    match = PLV_MACROS.search(source)
+    match, tree = line_plan(source)
 
     # Sometimes we have to skip an entry to prevent dupes
     skip = False
 
     # Regex match groups are used for convenience.
-    if source not in ["pass", "break", "continue"] and match:
-
-        # TODO: We should be using the ast instead of regex for all cases.
-        tree = ast.parse(source)
+    if tree is not None:
 
         # Simplest case.
         if match.group("variable"):
@@ -369,6 +765,12 @@ def result_handler(event):
             PLV.append(metadata)
 
 
+# Everything the handler (and parse_eval) reads from an event. Declaring
+# it lets hunter hand us its lightweight `FastEvent` objects instead of
+# full `Event`s for every traced line.
+result_handler.event_fields = ("kind", "filename", "lineno", "source", "globals", "locals")
+
+
 def filename_filter(filename):
     """
     Removes dependency noise from the output. We're only
@@ -376,19 +778,395 @@ def filename_filter(filename):
     so this filter traces based on the filename, provided as
     a prop on the `event` dict.
 
+    Lines of the target are counted in LINE_HITS, and hot
+    lines only get through on the hits picked by `should_record`.
+    The others are kept by `back_off` until the next hit.
+
     NOTE: `filename_filter` is a closure over the actual filtering
     function. It captures the target filename for injection
     into the inner scope when the filter is actually run.
     """
-    return lambda event: bool(event["filename"] == filename)
 
+    global HOT_LINES_FILE
+    HOT_LINES_FILE = filename
+
+    def predicate(event):
+        STATS["events"] += 1
+        if event["filename"] == filename:
+            if event["kind"] != "line":
+                return True
+            lineno = event["lineno"]
+            hits = LINE_HITS[lineno] = LINE_HITS.get(lineno, 0) + 1
+            if should_record(hits):
+                BACKED_OFF.pop(lineno, None)
+                return True
+            STATS["events_backed_off"] += 1
+            back_off(event)
+            return False
+        STATS["events_filtered"] += 1
+        return False
+
+    predicate.event_fields = ("filename", "kind", "lineno", "globals", "locals")
+    return predicate
+
+
+def back_off(event):
+    """
+    Keeps what replaying a skipped hit takes, in case it's the last
+    of its line: the names the line references, by reference (no
+    copies, this runs for every skipped hit).
+    """
+    lineno = event["lineno"]
+    lines = line_table(event["filename"], event["globals"])[1]
+    source = lines[lineno - 1] if 0 < lineno <= len(lines) else ""
+    tree = line_plan(source)[1]
+    if tree is None:
+        return
+    f_locals, f_globals = event["locals"], event["globals"]
+    _locals, _globals = {}, {}
+    for name in sample_names(source, tree):
+        if name in f_locals:
+            _locals[name] = f_locals[name]
+        elif name in f_globals:
+            _globals[name] = f_globals[name]
+    BACKED_OFF[lineno] = [source, _globals, _locals, None]
+
+
+def replay_backed_off(filename):
+    """
+    Appends an entry for every hot line of `filename` whose last hit
+    was backed off, so each line ends on the value it last had.
+    Immutable values are as of that hit, mutable ones as they're now.
+    """
+    for lineno in sorted(BACKED_OFF):
+        source, _globals, _locals, printed = BACKED_OFF[lineno]
+        count = len(PLV)
+        result_handler(SampledEvent(filename, lineno, source, _globals, _locals))
+        if printed is not None and len(PLV) > count:
+            PLV[-1]["value"] = printed
+    BACKED_OFF.clear()
+
+
+###################
+#
+# Sampling mode: approximate results at near-native speed
+#
+# Instead of a line trace, a background thread looks at the running
+# thread's stack every few milliseconds. Each frame of the target file
+# counts a hit for its current line, and annotated lines keep a copy of
+# the names they reference ("last seen"). Once the script is done, the
+# snapshots are fed through the usual result_handler so the output is
+# exactly the tracing mode's, only sparser.
+
+# SAMPLE_NAMES[dict]: stripped source line -> names referenced by its ast.
+SAMPLE_NAMES = {}
+
+# SAMPLER[Sampler]: The sampler of the running script (if any).
+SAMPLER = None
+
+
+def sample_names(source, tree):
+    names = SAMPLE_NAMES.get(source)
+    if names is None:
+        names = SAMPLE_NAMES[source] = tuple(
+            {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+        )
+    return names
+
+
+class SampledEvent:
+    """
+    Stands in for a hunter line event so the sampled snapshots (and
+    backed off hits) can be replayed through `result_handler`.
+    """
+
+    kind = "line"
 
-def import_and_trace_script(module_name, module_path):
+    def __init__(self, filename, lineno, source, _globals, _locals):
+        self.fields = {
+            "kind": "line",
+            "filename": filename,
+            "lineno": lineno,
+            "source": source,
+            "globals": _globals,
+            "locals": _locals,
+        }
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+
+class Sampler:
+    """
+    Samples the stack of the thread that enters it every `interval`
+    seconds, keeping per-line hit counts and the last snapshot of the
+    names referenced by each annotated line of `filename`.
+    """
+
+    def __init__(self, filename, interval=0.005):
+        self.filename = filename
+        self.interval = interval
+        self.hits = {}
+        self.snapshots = {}
+        self.prints = {}
+        self.samples = 0
+        self.ident = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name="pyliveview-sampler", daemon=True
+        )
+
+    def __enter__(self):
+        global SAMPLER
+        self.ident = threading.get_ident()
+        SAMPLER = self
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        global SAMPLER
+        self.stopped.set()
+        self.thread.join()
+        SAMPLER = None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        frame = sys._current_frames().get(self.ident)
+        if frame is None:
+            return
+        self.samples += 1
+        lines = line_table(self.filename, None)[1]
+        seen = set()
+        while frame is not None:
+            if frame.f_code.co_filename == self.filename:
+                lineno = frame.f_lineno
+                # Recursion puts the same line on the stack many times,
+                # it still only counts once per sample.
+                if lineno not in seen:
+                    seen.add(lineno)
+                    self.hits[lineno] = self.hits.get(lineno, 0) + 1
+                    source = lines[lineno - 1] if 0 < lineno <= len(lines) else ""
+                    tree = line_plan(source)[1]
+                    if tree is not None:
+                        try:
+                            self.snapshot(lineno, frame, sample_names(source, tree))
+                        except Exception:
+                            # The thread kept running while we copied its
+                            # objects (ie: a dict changed size), the
+                            # next sample will do.
+                            pass
+            frame = frame.f_back
+
+    def snapshot(self, lineno, frame, names):
+        f_locals, f_globals = frame.f_locals, frame.f_globals
+        _locals, _globals = {}, {}
+        for name in names:
+            if name in f_locals:
+                _locals[name] = try_deepcopy(f_locals[name])
+            elif name in f_globals:
+                _globals[name] = try_deepcopy(f_globals[name])
+        self.snapshots[lineno] = (_globals, _locals)
+
+    def printed(self, lineno, captured):
+        self.prints[lineno] = captured
+
+    def results(self):
+        """
+        Replays the snapshots through `result_handler`, appending one
+        entry per sampled line to PLV.
+        """
+        empty = ({}, {})
+        lines = line_table(self.filename, None)[1]
+        for lineno in sorted(set(self.snapshots) | set(self.prints)):
+            _globals, _locals = self.snapshots.get(lineno, empty)
+            source = lines[lineno - 1] if 0 < lineno <= len(lines) else ""
+            count = len(PLV)
+            result_handler(
+                SampledEvent(self.filename, lineno, source, _globals, _locals)
+            )
+            if lineno in self.prints and len(PLV) > count:
+                PLV[-1]["value"] = self.prints[lineno]
+
+        total = max(self.samples, 1)
+        STATS["samples"] = self.samples
+        STATS["line_share"] = {
+            lineno: round(hits / total, 4) for lineno, hits in sorted(self.hits.items())
+        }
+
+
+###################
+#
+# Cache hints: whether tracing the same source again would give the
+# same results, for the extension's result cache.
+
+# Qualified names of what makes a script depend on more than its source:
+# the clock, randomness, the environment and the state of the filesystem.
+# A trailing dot stands for everything in that module. Lookalikes (ie: a
+# variable called `random`) only cost a cache miss.
+VOLATILE_NAMES = frozenset({
+    "time.time", "time.time_ns", "time.perf_counter", "time.perf_counter_ns",
+    "time.monotonic", "time.monotonic_ns", "time.process_time", "time.process_time_ns",
+    "time.thread_time", "time.thread_time_ns",
+    "time.localtime", "time.gmtime", "time.ctime", "time.asctime", "time.strftime",
+    "datetime.datetime.now", "datetime.datetime.today", "datetime.datetime.utcnow",
+    "datetime.date.today",
+    "random.", "secrets.", "numpy.random.", "uuid.uuid1", "uuid.uuid4",
+    "os.urandom", "os.getrandom", "os.getpid",
+    "os.environ", "os.environb", "os.getenv", "sys.argv", "sys.stdin",
+    "os.stat", "os.lstat", "os.access", "os.path.exists", "os.path.lexists",
+    "os.path.isfile", "os.path.isdir", "os.path.islink",
+    "os.path.getsize", "os.path.getmtime", "os.path.getctime", "os.path.getatime",
+})
+
+# Audit events (PEP 578) of a script reaching outside. Opening files is
+# handled on its own, as the interpreter's own files don't count.
+VOLATILE_EVENTS = frozenset({
+    "builtins.input",
+    "os.system", "os.posix_spawn", "os.exec", "os.spawn", "os.fork", "subprocess.Popen",
+    "socket.connect", "socket.getaddrinfo", "http.client.connect", "urllib.Request",
+    "ftplib.connect", "smtplib.connect", "sqlite3.connect",
+})
+
+# Audit events of directory listings, the import system's don't count.
+VOLATILE_LISTINGS = frozenset({"os.listdir", "os.scandir", "os.walk", "glob.glob"})
+
+# VOLATILE_WATCH[tuple|None]: (traced file, trusted dirs) while the script runs.
+VOLATILE_WATCH = None
+AUDIT_HOOK_INSTALLED = False
+
+
+def volatile(reason):
+    reasons = STATS["uncacheable"]
+    if reason not in reasons and len(reasons) < 5:
+        reasons.append(reason)
+
+
+def is_volatile_name(name):
+    if name in VOLATILE_NAMES:
+        return True
+    parts = name.split(".")
+    return any(".".join(parts[:i]) + "." in VOLATILE_NAMES for i in range(1, len(parts)))
+
+
+def used_volatile_names(tree):
+    """
+    The VOLATILE_NAMES `tree` refers to, by their qualified names:
+    `import time as t` makes `t.time` "time.time", `from datetime
+    import datetime` makes `datetime.now` "datetime.datetime.now".
+    """
+    imported = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    imported[alias.asname] = alias.name
+                else:
+                    top = alias.name.split(".")[0]
+                    imported[top] = top
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            for alias in node.names:
+                imported[alias.asname or alias.name] = node.module + "." + alias.name
+
+    used = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute):
+            attributes = []
+            while isinstance(node, ast.Attribute):
+                attributes.append(node.attr)
+                node = node.value
+            if not isinstance(node, ast.Name):
+                continue
+            name = ".".join([imported.get(node.id, node.id)] + attributes[::-1])
+        elif isinstance(node, ast.Name) and node.id in imported:
+            name = imported[node.id]
+        else:
+            continue
+        if is_volatile_name(name):
+            used.add(name)
+    return used
+
+
+def volatile_names(source):
+    """
+    Flags the VOLATILE_NAMES used anywhere in `source`. Memoized
+    in the code cache, so unchanged sources aren't parsed again.
+    """
+    key = source_digest("volatile", *sorted(VOLATILE_NAMES), source)
+    names = cache_load(key)
+    if not isinstance(names, tuple):
+        names = tuple(sorted(used_volatile_names(ast.parse(source))))
+        cache_store(key, names)
+    for name in names:
+        volatile("uses " + name)
+
+
+def volatile_audit_hook(event, args):
+    if VOLATILE_WATCH is None:
+        return
+    if event == "open":
+        path = args[0]
+        if isinstance(path, int):
+            return
+        path = os.path.abspath(os.fsdecode(path))
+        traced, trusted = VOLATILE_WATCH
+        # Local modules count, the cache only knows the traced file's text.
+        if path != traced and not path.startswith(trusted):
+            volatile("opens " + os.path.basename(path))
+    elif event in VOLATILE_EVENTS:
+        volatile(event)
+    elif event in VOLATILE_LISTINGS:
+        path = args[0]
+        if isinstance(path, int):
+            return
+        # Folders of the interpreter and the tracer (ie: pruning the
+        # code cache) don't count either, see "open".
+        path = os.path.join(os.path.abspath(os.fsdecode(path or ".")), "")
+        if path.startswith(VOLATILE_WATCH[1]):
+            return
+        # Imports list the folders of sys.path, the script didn't ask.
+        if not sys._getframe(1).f_code.co_filename.startswith("<frozen importlib"):
+            volatile(event)
+
+
+@contextmanager
+def watch_volatile(full_path):
+    """
+    Records in `STATS["uncacheable"]` what the script did that the
+    same source might not do again: files read outside the interpreter
+    (and the tracer), directory listings, processes, sockets, input.
+    `volatile_names` adds the clock, randomness, the environment and
+    file metadata.
+    """
+    global VOLATILE_WATCH, AUDIT_HOOK_INSTALLED
+    if not AUDIT_HOOK_INSTALLED:
+        # Audit hooks can't be removed, one does for every run.
+        sys.addaudithook(volatile_audit_hook)
+        AUDIT_HOOK_INSTALLED = True
+    dirs = set(sysconfig.get_paths().values())
+    dirs.update((sys.prefix, sys.base_prefix, sys.exec_prefix, sys.base_exec_prefix))
+    dirs.update((os.path.dirname(os.path.abspath(__file__)), cache_dir()))
+    if site.ENABLE_USER_SITE:
+        dirs.add(site.getusersitepackages())
+    trusted = tuple(os.path.join(os.path.abspath(d), "") for d in dirs if d)
+    VOLATILE_WATCH = (full_path, trusted)
+    try:
+        yield
+    finally:
+        VOLATILE_WATCH = None
+
+
+def import_and_trace_script(module_name, module_path, sample=None, source=None):
     """
     As the name suggests, this imports and traces the target script.
 
     Filters for the running script and delegates the
-    resulting calls to the result_handler function.
+    resulting calls to the result_handler function. With
+    `sample` (an interval in seconds) the script is sampled
+    instead, see `Sampler`. `source` replaces the content of
+    the file at `module_path`.
 
     NOTE: script_path is necessary here for relative imports to work
     """
@@ -398,13 +1176,633 @@ def import_and_trace_script(module_name, module_path):
     with script_path(os.path.abspath(os.path.dirname(module_path))):
         builtins.print = hooked_print
         try:
-            with trace(filename_filter(module_path), action=result_handler):
-                import_file(module_name, module_path)
+            if sample:
+                sampler = Sampler(module_path, sample)
+                try:
+                    with sampler:
+                        import_file(module_name, module_path, source)
+                finally:
+                    sampler.results()
+            else:
+                try:
+                    with trace(filename_filter(module_path), action=result_handler):
+                        import_file(module_name, module_path, source)
+                finally:
+                    replay_backed_off(module_path)
         finally:
             builtins.print = ORIGINAL_PRINT
 
 
-def test(snippet):
+###################
+#
+# Attach mode: PyLiveView on a long-lived process
+#
+# `python pyliveview.py --attach PID file.py` injects `attach()` into a
+# running process with hunter.remote (manhole, or gdb with --gdb). The
+# target traces `file.py` with the usual result_handler, folds the
+# results into one aggregate per line (latest value + hit count) and
+# streams the lines that changed back over a Unix socket, as
+# `PLV_LIVE: [...]` records, one per line of output.
+
+# Longest value (in characters) streamed back for a line.
+LIVE_VALUE_LIMIT = 1000
+
+# LIVE[LiveSession]: The attach session running in this (target) process.
+LIVE = None
+
+
+def live_filter(filename):
+    """
+    Like `filename_filter`, but the target was started on its own
+    so its code may use relative or symlinked paths. Each distinct
+    co_filename is resolved once.
+    """
+    target = os.path.realpath(filename)
+    matches = {}
+
+    def predicate(event):
+        name = event["filename"]
+        hit = matches.get(name)
+        if hit is None:
+            hit = matches[name] = os.path.realpath(name) == target
+        return hit
+
+    predicate.event_fields = ("filename",)
+    return predicate
+
+
+class LiveSession:
+    """
+    Runs inside the target process. Traces `filename` in every thread
+    and sends the changed per-line aggregates to `sink_path` every
+    `interval` seconds, after a line with `token` (if any) to prove
+    who's connecting. Memory is bounded by the number of lines in the
+    file.
+    """
+
+    def __init__(self, sink_path, filename, interval=0.5, token=None):
+        self.filename = filename
+        self.interval = interval
+        self.lines = {}
+        self.changed = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(sink_path)
+        if token is not None:
+            self.sock.sendall((token + "\n").encode("utf8"))
+        self.tracer = hunter.Tracer(threading_support=True)
+        self.sender = threading.Thread(
+            target=self.send_updates, name="pyliveview-attach", daemon=True
+        )
+
+    def start(self):
+        def handler(event):
+            if self.stopped.is_set():
+                return
+            result_handler(event)
+            # result_handler (and parse_eval) append to PLV, other
+            # threads may be appending too so pop one at a time.
+            while PLV:
+                self.record(PLV.pop())
+
+        handler.event_fields = result_handler.event_fields
+        self.sender.start()
+        self.tracer.trace(hunter.When(live_filter(self.filename), handler))
+        # Threads that are already running (ie: the server's workers)
+        # can only be hooked on 3.12+, older versions only trace new ones.
+        if hasattr(threading, "settrace_all_threads"):
+            threading.settrace_all_threads(self.tracer)
+
+    def record(self, entry):
+        value = entry.get("value", "")
+        if isinstance(value, str) and len(value) > LIVE_VALUE_LIMIT:
+            value = value[:LIVE_VALUE_LIMIT] + " ..."
+        lineno = entry["lineno"]
+        with self.lock:
+            line = self.lines.get(lineno)
+            if line is None:
+                line = self.lines[lineno] = {
+                    "lineno": lineno,
+                    "source": entry.get("source", ""),
+                    "hits": 0,
+                }
+            line["hits"] += 1
+            line["value"] = value
+            line["error"] = entry.get("error", False)
+            self.changed.add(lineno)
+
+    def flush(self):
+        with self.lock:
+            changed = [dict(self.lines[lineno]) for lineno in sorted(self.changed)]
+            self.changed.clear()
+        if changed:
+            record = "PLV_LIVE: " + json.dumps(changed, default=str) + "\n"
+            self.sock.sendall(record.encode("utf8"))
+
+    def send_updates(self):
+        while not self.stopped.wait(self.interval):
+            # settrace_all_threads hooks this thread too.
+            sys.settrace(None)
+            try:
+                self.flush()
+            except OSError:
+                # The PyLiveView side went away, stop tracing for it.
+                self.stop()
+                return
+
+    def stop(self):
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        self.tracer.stop()
+        if hasattr(threading, "settrace_all_threads"):
+            threading.settrace_all_threads(None)
+        if threading.current_thread() is not self.sender:
+            self.sender.join(self.interval * 2)
+            try:
+                self.flush()
+            except OSError:
+                pass
+        self.sock.close()
+
+
+def attach(sink_path, filename, interval=0.5, token=None):
+    """
+    Entry point of the payload injected in the target process.
+    """
+    global LIVE
+    detach()
+    LIVE = LiveSession(sink_path, filename, interval, token)
+    LIVE.start()
+
+
+def detach():
+    """
+    Stops the attach session (if any) of this process.
+    """
+    global LIVE
+    if LIVE is not None:
+        LIVE.stop()
+        LIVE = None
+
+
+def accept_peer(sink, token, timeout=5):
+    """
+    Accepts connections on `sink` until one starts with the line
+    `token`, and returns its (binary) stream of records. Others
+    get closed, whoever they are.
+    """
+    expected = token.encode("utf8") + b"\n"
+    while True:
+        conn, _ = sink.accept()
+        conn.settimeout(timeout)
+        stream = conn.makefile("rb")
+        try:
+            authenticated = hmac.compare_digest(stream.readline(len(expected)), expected)
+        except OSError:
+            authenticated = False
+        if authenticated:
+            conn.settimeout(None)
+            return stream
+        stream.close()
+        conn.close()
+
+
+def attach_main(pid, filename, timeout=1, gdb=False):
+    """
+    Runs on the PyLiveView side: injects `attach()` in the process
+    `pid` and copies its `PLV_LIVE:` records to stdout until the
+    target goes away or we get interrupted/terminated. The target is
+    always detached on the way out.
+
+    The socket lives in a private (0700) directory and the payload
+    carries a random token the target has to send back first, so
+    no other local user can feed us records.
+    """
+    from argparse import Namespace
+
+    # Needs manhole (or gdb) and doesn't work on Windows.
+    from hunter import remote
+
+    full_path = os.path.abspath(filename)
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+    sink_dir = tempfile.mkdtemp(prefix="pyliveview-")
+    sink_path = os.path.join(sink_dir, "sink")
+    if os.path.lexists(sink_path):
+        os.unlink(sink_path)
+    token = secrets.token_hex(16)
+    sink = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sink.bind(sink_path)
+    sink.listen(1)
+
+    payload = (
+        "import sys; sys.path.insert(0, {!r}); "
+        "import pyliveview; pyliveview.attach({!r}, {!r}, token={!r})"
+    ).format(scripts_dir, sink_path, full_path, token)
+    deactivation = "import pyliveview; pyliveview.detach()"
+
+    # The extension stops us with SIGTERM, turn it into a normal exit
+    # so the target gets detached.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    bootstrap = remote.gdb_bootstrap if gdb else remote.manhole_bootstrap
+    args = Namespace(pid=pid, timeout=timeout, signal=signal.SIGURG)
+    try:
+        with bootstrap(args, payload, deactivation):
+            for record in accept_peer(sink, token):
+                sys.stdout.write(record.decode("utf8"))
+                sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()
+        shutil.rmtree(sink_dir, ignore_errors=True)
+    return 0
+
+
+def record_error(e, filename):
+    """
+    Appends the PLV entry decorating the line of `filename` that
+    raised `e` (the innermost one, if the error came from deeper).
+    """
+    # format_exception_only may include a trailing newline on some Python
+    # versions. Normalize by stripping trailing newlines so test snapshots
+    # remain stable across environments.
+    value = traceback.format_exception_only(type(e), e)[0].rstrip("\n")
+
+    if isinstance(e, SyntaxError):
+        lineno = getattr(e, "lineno")
+        value = e.msg
+        source = e.text  # SyntaxError uses 'text' not 'line'
+    else:
+        tb = traceback.extract_tb(e.__traceback__)[-1]
+        for i in traceback.extract_tb(e.__traceback__):
+            if i.filename == filename:
+                tb = i
+        lineno = tb.lineno
+        source = tb.line
+
+    metadata = {
+        "lineno": lineno,
+        "source": source.strip() if source else "",
+        "value": value,
+        "error": True,
+    }
+
+    # Avoid appending a duplicate error entry when the same error has
+    # already been recorded by the tracer (some tracer versions produce
+    # the same error metadata twice). Only append if it's not identical
+    # to the last recorded item.
+    if not (PLV and PLV[-1] == metadata):
+        PLV.append(metadata)
+
+
+###################
+#
+# Cell mode: notebook-style files (`# %%` cells) in a long-lived worker
+#
+# The worker keeps the module namespace between runs and a snapshot of
+# it before every cell. A run restores the snapshot before the first
+# cell whose text changed and only executes (and traces) the cells from
+# there, the annotations of the cells before it are kept. Expensive
+# setup in the first cells runs once.
+#
+# Snapshots share their values with the namespace, a cell only gets
+# copies of the values its code may change in place, the iterators it
+# may consume and what they're bound to (found from its AST), so a
+# large dataset the later cells only read is never copied.
+#
+# Caveats: modules the cells import stay imported, edits to them on
+# disk aren't picked up until the worker restarts. A value changed
+# behind the cells' back (by a library object keeping a reference to
+# it) changes in the snapshots too.
+
+CELL_MARKER = re.compile(r"^#\s*%%")
+
+
+def split_cells(source):
+    """
+    [(first line number, source)] of the cells of `source`. Every
+    `# %%` line starts a new cell, the lines before the first one
+    are a cell too.
+    """
+    cells = []
+    start, lines = 1, []
+    for lineno, line in enumerate(source.splitlines(True), 1):
+        if lines and CELL_MARKER.match(line):
+            cells.append((start, "".join(lines)))
+            start, lines = lineno, []
+        lines.append(line)
+    if lines:
+        cells.append((start, "".join(lines)))
+    return cells
+
+
+# Builtins that don't change their arguments: passing a value to one
+# of them doesn't make a cell copy it out of the snapshots, unless it's
+# an iterator they consume (see `cell_effects`).
+PURE_BUILTINS = frozenset(
+    {
+        "abs", "all", "any", "bin", "bool", "callable", "chr", "dict", "dir",
+        "divmod", "enumerate", "filter", "float", "format", "frozenset",
+        "getattr", "hasattr", "hash", "hex", "id", "int", "isinstance",
+        "issubclass", "iter", "len", "list", "map", "max", "min", "oct", "ord",
+        "pow", "print", "range", "repr", "reversed", "round", "set", "sorted",
+        "str", "sum", "tuple", "type", "zip",
+    }
+)
+
+# Builtins that hand a cell the whole namespace.
+NAMESPACE_BUILTINS = frozenset({"eval", "exec", "globals", "locals", "vars"})
+
+
+def base_name(node):
+    """The name `node` (ie: `data[0].rows`) starts from, if any."""
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Starred)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def load_names(node):
+    """Every name `node` refers to."""
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+
+
+def value_names(node):
+    """The names whose values `node` may evaluate to, or hold: all but the called ones."""
+    called = {base_name(n.func) for n in ast.walk(node) if isinstance(n, ast.Call)}
+    return load_names(node) - called
+
+
+@lru_cache(maxsize=256)
+def cell_effects(text):
+    """
+    (mutated, iterated, called, links) of the cell `text`:
+
+        mutated: names whose values it may change in place (rebinding
+            a name changes no value). Targets of item/attribute stores
+            and augmented assignments, receivers of method calls and
+            arguments of calls but to PURE_BUILTINS. None when the cell
+            can reach the whole namespace.
+        iterated: names it iterates (loops, comprehensions, unpacking,
+            `in`, PURE_BUILTINS arguments), which changes iterators.
+        called: names it calls, their code can change more.
+        links: the names of each binding, target and sources (`b = a[0]`
+            and `for b in a` make `b.append(0)` change `a`).
+    """
+    tree = ast.parse(text)
+    mutated, iterated, called, links = set(), set(), set(), set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in NAMESPACE_BUILTINS:
+            return None, frozenset(), frozenset(), frozenset()
+        if isinstance(node, (ast.Attribute, ast.Subscript)) and not isinstance(node.ctx, ast.Load):
+            mutated.add(base_name(node.value))
+        elif isinstance(node, ast.AugAssign):
+            mutated.add(base_name(node.target))
+        elif isinstance(node, ast.Compare):
+            for op, comparator in zip(node.ops, node.comparators):
+                if isinstance(op, (ast.In, ast.NotIn)):
+                    iterated |= load_names(comparator)
+        elif isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Attribute):
+                mutated.add(base_name(node.func.value))
+            else:
+                called.add(base_name(node.func))
+            arguments = node.args + [keyword.value for keyword in node.keywords]
+            pure = isinstance(node.func, ast.Name) and node.func.id in PURE_BUILTINS
+            for argument in arguments:
+                (iterated if pure else mutated).update(load_names(argument))
+
+        if isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign, ast.NamedExpr)):
+            targets = getattr(node, "targets", None) or [node.target]
+            value = node.value
+            if any(isinstance(t, (ast.Tuple, ast.List)) for t in targets) and value is not None:
+                iterated |= load_names(value)
+        elif isinstance(node, (ast.For, ast.AsyncFor, ast.comprehension)):
+            targets, value = [node.target], node.iter
+            iterated |= load_names(value)
+        elif isinstance(node, ast.withitem):
+            targets, value = [node.optional_vars], node.context_expr
+        else:
+            continue
+        if value is not None:
+            names = value_names(value).union(*(load_names(t) for t in targets if t is not None))
+            links.add(frozenset(names))
+
+    mutated.discard(None)
+    called.discard(None)
+    return frozenset(mutated), frozenset(iterated), frozenset(called), frozenset(links)
+
+
+def code_names(code):
+    """The global (and attribute) names `code` and the code nested in it use."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            names |= code_names(const)
+    return names
+
+
+@timed("snapshot")
+def copy_values(namespace, names):
+    """
+    Replaces the values of `names` in `namespace` by deep copies, with
+    one memo so aliases stay aliases. Values that can't be deep-copied
+    (modules, files, locks, ...) stay shared. Functions and classes too,
+    which is what keeps their `__globals__` (the live namespace) valid.
+    """
+    memo = {}
+    for name in names:
+        value = namespace[name]
+        if name == "__builtins__" or isinstance(value, ModuleType):
+            continue
+        try:
+            namespace[name] = deepcopy(value, memo)
+        except Exception:
+            pass
+
+
+class CellSession:
+    """
+    The state of one file in cell mode, see `run`.
+
+    Invariant: `namespace` is the state after `cells` when `clean`,
+    and `snapshots[i]` the state before `cells[i]` (there's one more
+    snapshot, before the cell that failed, when not `clean`).
+    Snapshots are shallow: the values of the names in `shared` are
+    the snapshots' own, `guard` copies them before a cell may change
+    them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        module_name = os.path.basename(path).split(".")[0]
+        # The same dict for every run: functions of kept cells hold it.
+        self.namespace = {"__name__": module_name, "__file__": path, "__builtins__": builtins}
+        self.cells = []
+        self.snapshots = []
+        self.results = []
+        self.reasons = []
+        self.clean = True
+        self.shared = set(self.namespace)
+        # Bindings of the cells run since the namespace was fresh, see `guard`.
+        self.links = set()
+
+    def global_names(self, value):
+        """
+        The global names used by the code of `value` (a function, or
+        a class or instance with methods) that the cells defined.
+        """
+        if isinstance(value, FunctionType):
+            functions = [value]
+        else:
+            functions = []
+            for cls in (value if isinstance(value, type) else type(value)).__mro__:
+                for attribute in vars(cls).values():
+                    attribute = getattr(attribute, "__func__", attribute)
+                    if isinstance(attribute, property):
+                        functions += [attribute.fget, attribute.fset, attribute.fdel]
+                    else:
+                        functions.append(attribute)
+        names = set()
+        for function in functions:
+            if isinstance(function, FunctionType) and function.__globals__ is self.namespace:
+                names |= code_names(function.__code__)
+        return names
+
+    def guard(self, text):
+        """
+        Copies the values the cell `text` may change (see `cell_effects`,
+        and the globals of the code it calls) out of the snapshots, along
+        with the values linked to them by a binding of this cell or an
+        earlier one, so elements stay elements. The others stay shared,
+        a run copies what its cells touch rather than the whole namespace.
+        """
+        mutated, iterated, called, links = cell_effects(text)
+        self.links |= links
+        if mutated is None:
+            names = set(self.shared)
+        else:
+            names = set(mutated | called)
+            # Iterating a container leaves it as it was, an iterator is consumed.
+            names |= {name for name in iterated if isinstance(self.namespace.get(name), Iterator)}
+            pending = list(names)
+            while pending:
+                for name in self.global_names(self.namespace.get(pending.pop())) - names:
+                    names.add(name)
+                    pending.append(name)
+            changed = True
+            while changed:
+                changed = False
+                for link in self.links:
+                    if link & names and not link <= names:
+                        names |= link
+                        changed = True
+            names &= self.shared
+            # Aliases of a copied value are copied along, they stay aliases.
+            copied = {id(self.namespace[name]) for name in names}
+            names |= {name for name in self.shared if id(self.namespace[name]) in copied}
+        if names:
+            copy_values(self.namespace, names)
+            self.shared -= names
+
+    def run(self, source):
+        """
+        Runs the cells of `source` that changed since the last run, and
+        the ones after them. PLV ends up with the results of every cell.
+        """
+        STATS.setdefault("snapshot_seconds", 0.0)
+        cells = split_cells(source)
+        first = 0
+        while first < min(len(cells), len(self.cells)) and cells[first] == self.cells[first]:
+            first += 1
+
+        if first < len(self.cells) or not self.clean:
+            self.namespace.clear()
+            self.namespace.update(self.snapshots[first])
+            self.shared = set(self.namespace)
+            self.links = set().union(*(cell_effects(text)[3] for _, text in self.cells[:first]))
+        del self.cells[first:], self.results[first:], self.reasons[first:]
+        del self.snapshots[first + 1 :]
+        self.clean = True
+
+        STATS["cells_reused"] = first
+        STATS["cells_run"] = 0
+        # Lines (and tracebacks) come from this text, the file isn't read.
+        linecache.cache[self.path] = (len(source), None, source.splitlines(True), self.path)
+        PLV.clear()
+        failed_reasons = []
+
+        with script_path(os.path.dirname(self.path)), watch_volatile(self.path):
+            builtins.print = hooked_print
+            try:
+                for index in range(first, len(cells)):
+                    start, text = cells[index]
+                    if index == len(self.snapshots):
+                        self.snapshots.append(dict(self.namespace))
+                        self.shared = set(self.namespace)
+                    STATS["uncacheable"] = []
+                    STATS["cells_run"] += 1
+                    before = len(PLV)
+                    try:
+                        # Padded so the cell's line numbers are the file's.
+                        code = compile_cached("\n" * (start - 1) + text, self.path)
+                        volatile_names(text)
+                        self.guard(text)
+                        try:
+                            with trace(filename_filter(self.path), action=result_handler):
+                                exec(code, self.namespace)
+                        finally:
+                            replay_backed_off(self.path)
+                    except BaseException as e:
+                        record_error(e, self.path)
+                        # Its snapshot stays, the next run restarts from it.
+                        self.clean = False
+                        failed_reasons = STATS["uncacheable"]
+                        break
+                    self.cells.append(cells[index])
+                    self.results.append(PLV[before:])
+                    self.reasons.append(STATS["uncacheable"])
+            finally:
+                builtins.print = ORIGINAL_PRINT
+
+        PLV[:0] = [entry for cell in self.results[:first] for entry in cell]
+        reasons = []
+        for reason in [r for cell in self.reasons for r in cell] + failed_reasons:
+            if reason not in reasons:
+                reasons.append(reason)
+        STATS["uncacheable"] = reasons[:5]
+
+
+def cells_main(filename):
+    """
+    The cell mode worker for `filename`: every line read on stdin is a
+    JSON request, `{"source": <the file's text>}`, answered like a
+    normal run (`PLV_STATS:`, then `PLV:`) once the changed cells ran.
+    PLV_STATS also gets `cells_reused`, `cells_run` and
+    `snapshot_seconds`.
+    """
+    session = CellSession(os.path.abspath(filename))
+    requests = sys.stdin.buffer
+    # The cells read nothing of the requests.
+    sys.stdin = io.StringIO()
+    for line in requests:
+        if not line.strip():
+            continue
+        source = json.loads(line.decode("utf-8"))["source"]
+        STATS.clear()
+        STATS.update(new_stats())
+        LINE_HITS.clear()
+        started = time.perf_counter()
+        session.run(source)
+        STATS["run_seconds"] = time.perf_counter() - started
+        plv_prints()
+        sys.stdout.flush()
+    return 0
+
+
+def test(snippet, sample=None):
     """
     TODO
     """
@@ -419,10 +1817,10 @@ def test(snippet):
     with open(full_path, "a", encoding="utf-8") as the_file:
         the_file.write(snippet.strip() + "\n")
 
-    return main(full_path, test=True)
+    return main(full_path, test=True, sample=sample)
 
 
-def main(filename, test=False):
+def main(filename, test=False, sample=None, source=None):
     """
     Simply ensures the target script exists and calls
     the import_and_trace_script function. The results
@@ -435,6 +1833,17 @@ def main(filename, test=False):
     requires some parsing on the client side. Tags are
     used to simplify this.
 
+    With `source` the script's text is traced as `filename`
+    (for `__file__`, relative imports and line numbers) and
+    the file itself is never read, it doesn't even have to
+    exist.
+
+    With `sample` (seconds between samples) the script runs
+    untraced and is sampled instead, see `Sampler`. The output
+    is the same, with at most one entry per line, and PLV_STATS
+    also gets `samples` and `line_share` (the fraction of the
+    samples each line was on the stack for).
+
     Tag list (tags are the capitalized text):
 
         On Failure:
@@ -444,6 +1853,12 @@ def main(filename, test=False):
 
         On success:
 
+            -> `PLV_STATS:` a single line JSON object with the
+                tracer's own counters and timers (events seen,
+                events filtered, time in the handler, eval,
+                deepcopy, serialization, ...). Always printed
+                right before `PLV:`.
+
             -> `PLV:` a string search for this tag returns the
                 starting index `i` of the resulting data. This
                 can then be sliced from index `i + 4` to get a
@@ -458,7 +1873,7 @@ def main(filename, test=False):
                 This is always the last item of the result, so
                 you need not worry about an ending slice index.
     """
-    if not os.path.exists(filename):
+    if source is None and not os.path.exists(filename):
         message = "EXISTS_ERROR: " + filename + " doesn't exist"
         print(message, file=sys.stderr)
         return 1
@@ -470,56 +1885,37 @@ def main(filename, test=False):
     # ie: /home/user/scripts/my_script.py  ->  my_script
     module_name = os.path.basename(full_path).split(".")[0]
 
+    started = time.perf_counter()
+    STATS["load_seconds"] = started - LOADED_AT
+
     try:
 
-        import_and_trace_script(module_name, full_path)
+        with watch_volatile(full_path):
+            import_and_trace_script(module_name, full_path, sample, source)
 
     except BaseException as e:
 
         # If there's an error, we try to handle it and
         # send back data that can be used to decorate
         # the offending line.
+        record_error(e, filename)
 
-        # format_exception_only may include a trailing newline on some Python
-        # versions. Normalize by stripping trailing newlines so test snapshots
-        # remain stable across environments.
-        value = traceback.format_exception_only(type(e), e)[0].rstrip("\n")
-
-        if isinstance(e, SyntaxError):
-            lineno = getattr(e, "lineno")
-            value = e.msg
-            source = e.text  # SyntaxError uses 'text' not 'line'
-        else:
-            _, _, exc_traceback = sys.exc_info()
-            tb = traceback.extract_tb(exc_traceback)[-1]
-            for i in traceback.extract_tb(exc_traceback):
-                if i.filename == filename:
-                    tb = i
-            lineno = tb.lineno
-            source = tb.line
-
-        metadata = {
-            "lineno": lineno,
-            "source": source.strip() if source else "",
-            "value": value,
-            "error": True,
-        }
+    STATS["run_seconds"] = time.perf_counter() - started
 
-        # Avoid appending a duplicate error entry when the same error has
-        # already been recorded by the tracer (some tracer versions produce
-        # the same error metadata twice). Only append if it's not identical
-        # to the last recorded item.
-        if not (PLV and PLV[-1] == metadata):
-            PLV.append(metadata)
     # handle testing
     if test:
         res = plv_formats()
         PLV.clear()
-        try:
-            os.remove(full_path)
-        except PermissionError:
-            # NBD, this can fail on Windows CI tests..
-            pass
+        LINE_HITS.clear()
+        # Sampled runs add their own keys.
+        STATS.clear()
+        STATS.update(new_stats())
+        if source is None:
+            try:
+                os.remove(full_path)
+            except PermissionError:
+                # NBD, this can fail on Windows CI tests..
+                pass
         return res
 
     # print the results and return a 0 for the exit code
@@ -532,4 +1928,38 @@ if __name__ == "__main__":
         print("ARGS_ERROR: Must provide a file to trace.")
         sys.exit(1)
 
-    sys.exit(main(sys.argv[1]))
+    if sys.argv[1] == "--attach":
+        if len(sys.argv) < 4 or not sys.argv[2].isdigit():
+            print("ARGS_ERROR: Usage: pyliveview.py --attach PID FILE [--gdb]")
+            sys.exit(1)
+        sys.exit(attach_main(int(sys.argv[2]), sys.argv[3], gdb="--gdb" in sys.argv[4:]))
+
+    if sys.argv[1] == "--cells":
+        if len(sys.argv) < 3:
+            print("ARGS_ERROR: Usage: pyliveview.py --cells FILE")
+            sys.exit(1)
+        sys.exit(cells_main(sys.argv[2]))
+
+    # pyliveview.py [--sample MS] (FILE | --stdin --filename FILE)
+    args = sys.argv[1:]
+    options = {}
+    filename = None
+    try:
+        while args:
+            arg = args.pop(0)
+            if arg == "--sample":
+                options["sample"] = float(args.pop(0)) / 1000
+            elif arg == "--stdin":
+                # Bytes, so the encoding is decided like for a file.
+                options["source"] = util.decode_source(sys.stdin.buffer.read())
+            elif arg == "--filename":
+                filename = args.pop(0)
+            else:
+                filename = arg
+    except (IndexError, ValueError):
+        filename = None
+    if filename is None:
+        print("ARGS_ERROR: Usage: pyliveview.py [--sample MS] (FILE | --stdin --filename FILE)")
+        sys.exit(1)
+
+    sys.exit(main(filename, **options))
@@ -0,0 +1,94 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from .. import pyliveview
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+handler = r"""
+def handle(request):
+    doubled = request * 2
+    doubled
+    return doubled
+"""
+
+# Stand-in for a long-lived service: a worker thread that is already busy
+# when PyLiveView attaches. It runs the payload hunter.remote would inject
+# (attach/detach) itself, so manhole isn't needed.
+service = r"""
+import sys, threading, time
+sys.path.insert(0, {scripts!r})
+sys.path.insert(0, {handler_dir!r})
+import handlers
+import pyliveview
+
+done = threading.Event()
+
+def worker():
+    request = 0
+    while not done.is_set():
+        request += 1
+        handlers.handle(request)
+        time.sleep(0.001)
+
+thread = threading.Thread(target=worker)
+thread.start()
+pyliveview.attach({sink!r}, {handler_file!r}, interval=0.05, token="secret")
+sys.stdin.read()  # until the test closes our stdin
+pyliveview.detach()
+done.set()
+thread.join()
+"""
+
+
+@pytest.mark.skipif(
+    not hasattr(threading, "settrace_all_threads"),
+    reason="attaching to running threads needs Python 3.12+",
+)
+def test_attach_streams_live_values(tmp_path):
+    handler_file = tmp_path / "handlers.py"
+    handler_file.write_text(handler.strip() + "\n")
+    sink_path = str(tmp_path / "sink")
+    sink = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sink.bind(sink_path)
+    sink.listen(1)
+    sink.settimeout(10)
+
+    script = tmp_path / "service.py"
+    script.write_text(
+        service.format(
+            scripts=SCRIPTS,
+            handler_dir=str(tmp_path),
+            sink=sink_path,
+            handler_file=str(handler_file),
+        )
+    )
+    # Connects first, without the token the payload was given.
+    forger = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    forger.connect(sink_path)
+    forger.sendall(b'wrong\nPLV_LIVE: [{"lineno": 3, "value": "forged"}]\n')
+    proc = subprocess.Popen([sys.executable, str(script)], stdin=subprocess.PIPE)
+    try:
+        records = pyliveview.accept_peer(sink, "secret")
+        lines = {}
+        for _ in range(3):
+            record = records.readline().decode("utf8")
+            assert record.startswith("PLV_LIVE: ")
+            for line in json.loads(record[len("PLV_LIVE: ") :]):
+                lines[line["lineno"]] = line
+    finally:
+        proc.stdin.close()
+        assert proc.wait(10) == 0
+        sink.close()
+        forger.close()
+
+    assert lines[3]["source"] == "doubled"
+    assert int(lines[3]["value"]) % 2 == 0
+    assert lines[3]["hits"] > 1
+    assert set(lines) == {3}
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from .. import pyliveview
+from ..pyliveview import test as pyliveviewtest
+
+snippet = r"""
+for i in range(1000):
+    i
+    print(i)
+"""
+
+
+@pytest.fixture(autouse=True)
+def hot_line_limit(monkeypatch):
+    monkeypatch.setattr(pyliveview, "HOT_LINE_LIMIT", 10)
+
+
+def test_should_record():
+    recorded = [hits for hits in range(1, 200) if pyliveview.should_record(hits)]
+    assert recorded == list(range(1, 11)) + [20, 40, 80, 160]
+
+
+def test_hot_lines_back_off():
+    entries = json.loads(pyliveviewtest(snippet))
+    values = [int(entry["value"]) for entry in entries if entry["lineno"] == 2]
+    # Hit n shows the value of iteration n - 1, the last hit is always kept.
+    assert values == list(range(10)) + [19, 39, 79, 159, 319, 639, 999]
+
+    # Prints of the skipped hits don't end up on the recorded entries.
+    printed = [entry["value"] for entry in entries if entry["lineno"] == 3]
+    assert printed == [str(value) for value in values]
+
+
+def test_hot_line_ends_on_its_last_value(monkeypatch):
+    monkeypatch.setattr(pyliveview, "HOT_LINE_LIMIT", 100)
+    source = "total = 0\nfor i in range(150):\n    total = total + i  # ?\n"
+    entries = json.loads(pyliveviewtest(source))
+    assert entries[-1] == {
+        "lineno": 3,
+        "source": "total = total + i  # ?",
+        "value": "total = 11175",
+    }
+
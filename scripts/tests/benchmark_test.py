@@ -0,0 +1,25 @@
+from .. import benchmark
+
+
+def test_benchmark_smoke():
+    results = benchmark.run_benchmarks("quick", only=["recursion"], repeat=1, log=lambda *a: None)
+    entry = results["recursion[500]"]
+
+    assert set(benchmark.MODES) <= set(entry)
+    assert entry["traced"]["output_bytes"] > 0
+    assert entry["subprocess"]["output_bytes"] > entry["traced"]["output_bytes"]
+    assert entry["slowdown"] > 0
+
+
+def test_benchmark_compare_flags_regressions():
+    def entry(seconds):
+        return {mode: {"seconds": seconds} for mode in benchmark.MODES}
+
+    baseline = {"results": {"loop[10]": entry(1.0), "gone[1]": entry(1.0)}}
+    results = {"loop[10]": entry(1.3), "new[1]": entry(9.0)}
+
+    assert benchmark.compare(results, baseline, threshold=1.5) == []
+    assert benchmark.compare(results, baseline, threshold=1.25) == [
+        ("loop[10]", "traced", 1.0, 1.3),
+        ("loop[10]", "subprocess", 1.0, 1.3),
+    ]
@@ -0,0 +1,90 @@
+import marshal
+import os
+import types
+
+import pytest
+
+from .. import pyliveview
+
+
+def run(code):
+    namespace = {}
+    exec(code, namespace)
+    return namespace
+
+
+def test_module_cache_is_relocated():
+    source = "def f():\n    return 1\n\nx = f()\n"
+    pyliveview.compile_cached(source, "/tmp/.pyliveviewAAAA.py")
+    code = pyliveview.compile_cached(source, "/tmp/.pyliveviewBBBB.py")
+
+    assert code.co_filename == "/tmp/.pyliveviewBBBB.py"
+    nested = [c for c in code.co_consts if isinstance(c, types.CodeType)]
+    assert [c.co_filename for c in nested] == ["/tmp/.pyliveviewBBBB.py"]
+    assert run(code)["x"] == 1
+
+
+def test_unchanged_function_is_reused():
+    function = "def f():\n    return 1\n"
+    pyliveview.compile_cached(function, "/tmp/.pyliveviewAAAA.py")
+
+    # Poison the cached body so we can tell it was reused, not recompiled.
+    key = pyliveview.source_digest("function", "", function)
+    poisoned = compile("def f():\n    return 2\n", "<poison>", "exec").co_consts[0]
+    pyliveview.cache_store(key, poisoned)
+
+    code = pyliveview.compile_cached("x = 0\n\n" + function, "/tmp/.pyliveviewBBBB.py")
+    f = run(code)["f"]
+    assert f() == 2
+    assert f.__code__.co_filename == "/tmp/.pyliveviewBBBB.py"
+    assert f.__code__.co_firstlineno == 3
+
+
+def test_reused_function_reports_shifted_lines():
+    function = "def f():\n    return 1 / 0\n"
+    pyliveview.compile_cached(function, "/tmp/.pyliveviewAAAA.py")
+    code = pyliveview.compile_cached("x = 0\n\n" + function, "/tmp/.pyliveviewBBBB.py")
+
+    with pytest.raises(ZeroDivisionError) as info:
+        run(code)["f"]()
+    assert info.traceback[-1].lineno + 1 == 4
+
+
+def test_added_decorator_shifts_reused_lines():
+    decorated = "def d(f):\n    return f\n\n@d\ndef f():\n    return 1 / 0\n"
+    pyliveview.compile_cached(decorated, "/tmp/.pyliveviewAAAA.py")
+    code = pyliveview.compile_cached(decorated.replace("@d\n", "@d\n@d\n"), "/tmp/.pyliveviewBBBB.py")
+
+    with pytest.raises(ZeroDivisionError) as info:
+        run(code)["f"]()
+    assert info.traceback[-1].lineno + 1 == 7
+
+
+def test_edited_function_is_recompiled():
+    pyliveview.compile_cached("def f():\n    return 1\n", "/tmp/a.py")
+    code = pyliveview.compile_cached("def f():\n    return 3\n", "/tmp/b.py")
+    assert run(code)["f"]() == 3
+
+
+def test_cache_dir_is_created_private(tmp_path, monkeypatch):
+    directory = tmp_path / "cache"
+    monkeypatch.setenv("PYLIVEVIEW_CACHE_DIR", str(directory))
+    pyliveview.cache_store("key", compile("x = 1", "<x>", "exec"))
+
+    assert directory.stat().st_mode & 0o777 == 0o700
+    assert pyliveview.cache_load("key") is not None
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_shared_cache_dir_is_never_loaded(tmp_path, monkeypatch):
+    directory = tmp_path / "shared"
+    directory.mkdir()
+    os.chmod(directory, 0o777)
+    monkeypatch.setenv("PYLIVEVIEW_CACHE_DIR", str(directory))
+    # Planted by someone else, it would run as the traced module.
+    with open(directory / "key.code", "wb") as f:
+        marshal.dump(compile("x = 1", "<x>", "exec"), f)
+
+    assert pyliveview.cache_load("key") is None
+    pyliveview.cache_store("other", compile("x = 1", "<x>", "exec"))
+    assert not (directory / "other.code").exists()
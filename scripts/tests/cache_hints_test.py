@@ -0,0 +1,46 @@
+import pytest
+
+
+@pytest.fixture
+def uncacheable(run_pyliveview):
+    def reasons(source):
+        run = run_pyliveview(source, "--stdin")
+        assert run.returncode == 0, run.stderr
+        return run.stats["uncacheable"]
+
+    return reasons
+
+
+def test_pure_scripts_are_cacheable(uncacheable):
+    source = "import json, collections\ndata = json.dumps(collections.Counter('aab'))\ndata\n"
+    assert uncacheable(source) == []
+    # Waiting doesn't change what the script computes, reading the clock does.
+    assert uncacheable("import time\ntime.sleep(0)\nx = 1\n") == []
+
+
+@pytest.mark.parametrize(
+    "source, reason",
+    [
+        ("import random\nx = random.random()\nx\n", "uses random.random"),
+        ("import time as t\nstarted = t.perf_counter()\n", "uses time.perf_counter"),
+        ("from time import time\nnow = time()\n", "uses time.time"),
+        ("from datetime import datetime\nstamp = datetime.now()\n", "uses datetime.datetime.now"),
+        ("def f():\n    import os\n    return os.environ['HOME']\nf()\n", "uses os.environ"),
+        ("import os.path\nfound = os.path.exists('data.txt')\n", "uses os.path.exists"),
+        ("import os\nnames = os.listdir('.')\n", "os.listdir"),
+        ("import glob\nnames = glob.glob('*.txt')\n", "glob.glob"),
+        ("import subprocess\nsubprocess.run(['true'])\n", "subprocess.Popen"),
+    ],
+)
+def test_volatile_scripts_say_why(uncacheable, source, reason):
+    assert reason in uncacheable(source)
+
+
+def test_reading_local_files_is_volatile(tmp_path, uncacheable):
+    (tmp_path / "data.txt").write_text("1\n", encoding="utf-8")
+    (tmp_path / "helper.py").write_text("VALUE = 1\n", encoding="utf-8")
+    source = "import helper\nwith open('data.txt') as f:\n    n = int(f.read())\nn\n"
+
+    reasons = uncacheable(source)
+    assert "opens data.txt" in reasons
+    assert "opens helper.py" in reasons
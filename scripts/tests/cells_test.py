@@ -0,0 +1,118 @@
+import json
+
+from .. import pyliveview
+
+NOTEBOOK = """\
+# %% setup
+loads = []
+def load():
+    loads.append(1)
+    return list(range(5))
+data = load()
+
+# %% analysis
+total = sum(data)
+total
+"""
+
+
+def run(session, source):
+    session.run(source)
+    results = [dict(entry) for entry in pyliveview.PLV]
+    pyliveview.PLV.clear()
+    return results
+
+
+def test_split_cells():
+    assert pyliveview.split_cells("a = 1\n# %%\nb = 2\n#%% two\nc\n") == [
+        (1, "a = 1\n"),
+        (2, "# %%\nb = 2\n"),
+        (4, "#%% two\nc\n"),
+    ]
+    assert pyliveview.split_cells("") == []
+
+
+def test_only_changed_cells_run(tmp_path):
+    session = pyliveview.CellSession(str(tmp_path / "notebook.py"))
+    assert run(session, NOTEBOOK)[-1] == {"lineno": 10, "source": "total", "value": "10"}
+
+    edited = NOTEBOOK.replace("sum(data)", "sum(data) * 2")
+    results = run(session, edited)
+    assert session.namespace["loads"] == [1]
+    assert pyliveview.STATS["cells_reused"] == 1
+    assert pyliveview.STATS["cells_run"] == 1
+    # The setup cell's annotations are kept, in the file's line numbers.
+    assert results[-1] == {"lineno": 10, "source": "total", "value": "20"}
+    assert results[:-1] == run(pyliveview.CellSession(str(tmp_path / "notebook.py")), edited)[:-1]
+
+
+def test_restarts_from_a_snapshot(tmp_path):
+    session = pyliveview.CellSession(str(tmp_path / "notebook.py"))
+    run(session, NOTEBOOK + "data.append(99)\n")
+    # The appending line is gone, the analysis sees the data as the setup left it.
+    results = run(session, NOTEBOOK)
+    assert results[-1]["value"] == "10"
+    assert session.namespace["loads"] == [1]
+
+
+def test_failed_cell_runs_again(tmp_path):
+    session = pyliveview.CellSession(str(tmp_path / "notebook.py"))
+    broken = NOTEBOOK.replace("sum(data)", "sum(data) / zero")
+    assert run(session, broken)[-1]["error"] is True
+    assert not session.clean
+
+    fixed = NOTEBOOK.replace("total = sum(data)", "zero = 1\ntotal = sum(data)")
+    assert run(session, fixed)[-1] == {"lineno": 11, "source": "total", "value": "10"}
+    assert session.namespace["loads"] == [1]
+
+
+def test_worker_answers_every_request(run_pyliveview):
+    requests = [NOTEBOOK, NOTEBOOK.replace("sum(data)", "max(data)")]
+    run = run_pyliveview(
+        "",
+        "--cells",
+        filename="notebook.py",
+        input="".join(json.dumps({"source": r}) + "\n" for r in requests),
+    )
+
+    assert run.returncode == 0, run.stderr
+    stats = run.records("PLV_STATS")
+    outputs = run.records("PLV")
+    assert [(s["cells_reused"], s["cells_run"]) for s in stats] == [(0, 2), (1, 1)]
+    assert [o[-1]["value"] for o in outputs] == ["10", "4"]
+
+
+def test_cells_only_copy_what_they_change(tmp_path):
+    session = pyliveview.CellSession(str(tmp_path / "notebook.py"))
+    run(session, NOTEBOOK)
+    run(session, NOTEBOOK.replace("sum(data)", "max(data)"))
+    # Only read by the analysis: the snapshot's list, not a copy of it.
+    assert session.namespace["data"] is session.snapshots[1]["data"]
+
+    links = pyliveview.cell_effects("rows = data\nfor row in rows:\n    row.append(0)\n")[3]
+    assert links == {frozenset({"rows", "data"}), frozenset({"row", "rows"})}
+    assert pyliveview.cell_effects("exec('data.clear()')")[0] is None
+
+
+def test_changes_in_place_stay_out_of_the_snapshots(tmp_path):
+    session = pyliveview.CellSession(str(tmp_path / "notebook.py"))
+    notebook = NOTEBOOK + "# %%\ndef grow():\n    data.append(0)\n"
+    for cell in ["data[0] = 9", "data += [9]", "grow()", "rows = [data]\nrows[0].append(9)"]:
+        run(session, notebook + "# %%\n" + cell + "\n")
+        assert session.snapshots[1]["data"] == [0, 1, 2, 3, 4]
+        assert run(session, NOTEBOOK)[-1]["value"] == "10"
+
+
+def test_consumed_iterators_are_restored(tmp_path):
+    session = pyliveview.CellSession(str(tmp_path / "notebook.py"))
+    notebook = "# %%\nit = iter(range(5))\n# %%\nx = list(it)\nx\n"
+    run(session, notebook)
+    assert run(session, notebook.replace("x\n", "y = 0\nx\n"))[-1]["value"] == "[0, 1, 2, 3, 4]"
+
+
+def test_elements_stay_elements(tmp_path):
+    session = pyliveview.CellSession(str(tmp_path / "notebook.py"))
+    notebook = "# %%\na = [[0]]\nb = a[0]\n# %%\nb.append(1)\na\n"
+    run(session, notebook)
+    assert run(session, notebook.replace("a\n", "y = 0\na\n"))[-1]["value"] == "[[0, 1]]"
+    assert session.snapshots[1]["a"] == [[0]]
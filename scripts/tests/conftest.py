@@ -4,8 +4,17 @@ Pytest configuration and fixtures.
 This module checks that required dependencies are installed before running tests.
 """
 
+import json
+import os
+import subprocess
 import sys
 
+import pytest
+
+PYLIVEVIEW = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pyliveview.py"
+)
+
 
 def check_required_packages():
     """Check that all required test dependencies are installed."""
@@ -46,3 +55,68 @@ def check_required_packages():
 
 # Run the check when pytest loads this conftest
 check_required_packages()
+
+
+@pytest.fixture(autouse=True)
+def private_cache(tmp_path_factory, monkeypatch):
+    """
+    Every test gets its own compile cache, in-process runs (`pyliveview.test`)
+    and tracer subprocesses alike, so none depends on what earlier runs left.
+    """
+    monkeypatch.setenv("PYLIVEVIEW_CACHE_DIR", str(tmp_path_factory.mktemp("cache")))
+
+
+class TracerRun:
+    """
+    The outcome of a `pyliveview.py` run, see `run_pyliveview`. `stats`
+    and `results` are the last `PLV_STATS:` and `PLV:` records (there's
+    one pair per request in cell mode, see `records`), `output` the raw
+    text of the last `PLV:` record.
+    """
+
+    def __init__(self, process):
+        self.returncode = process.returncode
+        self.stderr = process.stderr.decode("utf-8")
+        self.lines = process.stdout.decode("utf-8").splitlines()
+        outputs = self.records("PLV", parse=False)
+        self.output = outputs[-1] if outputs else None
+        self.results = json.loads(self.output) if outputs else None
+        stats = self.records("PLV_STATS")
+        self.stats = stats[-1] if stats else None
+
+    def records(self, tag, parse=True):
+        prefix = tag + ": "
+        values = [line[len(prefix) :] for line in self.lines if line.startswith(prefix)]
+        return [json.loads(value) for value in values] if parse else values
+
+
+@pytest.fixture
+def run_pyliveview(tmp_path):
+    """
+    Runs `python pyliveview.py *args FILE` in a fresh interpreter, FILE
+    being `filename` (relative to `tmp_path`) with `source` written to
+    it. With `--stdin` among `args` the source is piped instead, as
+    `--filename FILE`, and FILE is never written. `input` goes to the
+    tracer's stdin otherwise (cell mode requests). The compile cache
+    is the test's, see `private_cache`.
+    """
+
+    def run(source, *args, env=None, filename="main.py", input=None):
+        path = tmp_path / filename
+        command = [sys.executable, PYLIVEVIEW, *args]
+        if "--stdin" in args:
+            command += ["--filename", str(path)]
+            input = source
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(source, encoding="utf-8")
+            command.append(str(path))
+        process = subprocess.run(
+            command,
+            input=input.encode("utf-8") if input is not None else None,
+            capture_output=True,
+            env=dict(os.environ, **(env or {})),
+        )
+        return TracerRun(process)
+
+    return run
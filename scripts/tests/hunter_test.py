@@ -0,0 +1,346 @@
+import pickle
+import sys
+
+import hunter
+from hunter import predicates
+from hunter.event import Event
+from hunter.event import FastEvent
+from hunter.tracer import Tracer
+
+from .. import pyliveview
+
+
+def record_events(predicate_factory):
+    seen = []
+
+    def action(event):
+        seen.append((type(event), event.kind, event.lineno, event.function, event.source.strip()))
+
+    tracer = Tracer()
+    tracer.trace(predicate_factory(action))
+    try:
+        value = sample(2)
+    finally:
+        tracer.stop()
+    assert value == 4
+    return seen
+
+
+def sample(x):
+    y = x * 2
+    return y
+
+
+def test_fast_event_when_fields_declared():
+    def predicate(action):
+        action.event_fields = ("kind", "lineno", "function", "source")
+        return hunter.When(hunter.Q(function="sample"), action)
+
+    seen = record_events(predicate)
+    assert {kind for kind, *_ in seen} == {FastEvent}
+    assert [(k, source) for _, k, _, _, source in seen] == [
+        ("call", "def sample(x):"),
+        ("line", "y = x * 2"),
+        ("line", "return y"),
+        ("return", "return y"),
+    ]
+
+
+def test_full_event_without_declaration():
+    seen = record_events(lambda action: hunter.When(hunter.Q(function="sample"), action))
+    assert {kind for kind, *_ in seen} == {Event}
+    assert len(seen) == 4
+
+
+def make_events():
+    frame = sys._getframe()
+    return FastEvent(frame, "line", None, 0, 0, None), Event(frame, "line", None, 0, 0, None)
+
+
+def test_fast_event_matches_event():
+    fast, full = make_events()
+    for field in ("filename", "source", "module", "function", "lineno", "code", "globals", "kind"):
+        assert fast[field] == full[field], field
+
+
+def test_compiled_query_matches_fields():
+    event = make_events()[1]
+    assert hunter.Q(function="make_events", kind="line", lineno_gt=1)(event) is True
+    assert hunter.Q(function_in=("a", "make_events"), filename_endswith=".py")(event) is True
+    assert hunter.Q(function_startswith=["make", "take"], module_contains="hunter_test")(event) is True
+    assert hunter.Q(function_rx="^make_")(event) is True
+    assert hunter.Q(function="make_events", lineno_lt=1)(event) is False
+    assert hunter.Q(kind_in={"call", "return"})(event) is False
+
+
+def test_compiled_tree_is_flattened():
+    calls = []
+
+    def spy(event):
+        calls.append(event)
+        return True
+
+    predicate = hunter.When(
+        hunter.And(hunter.Q(kind="line"), hunter.Not(hunter.Or(hunter.Q(kind="call"), spy))),
+        print,
+    )
+    source = predicate._compiled.source
+    assert "event['kind'] == 'line'" in source
+    assert "Query" not in source and "And" not in source
+
+    event = make_events()[1]
+    assert predicate(event) is False
+    assert calls == [event]
+    assert predicates.And()(event) is True
+    assert predicates.Or()(event) is False
+
+
+def test_compiled_predicates_take_mappings():
+    event = {"kind": "line", "lineno": 3, "filename": "main.py"}
+    assert hunter.Q(kind="line", lineno_gte=3, filename_endswith=".py")(event) is True
+    assert hunter.Not(hunter.Q(kind="call"))(event) is True
+    assert hunter.Q(kind="line", lineno_lt=3)(event) is False
+
+
+class SubQuery(predicates.Query):
+    pass
+
+
+class SubAnd(predicates.And):
+    pass
+
+
+class NegatedQuery(predicates.Query):
+    def __call__(self, event):
+        return not super().__call__(event)
+
+
+def test_compiled_predicate_subclasses():
+    event = {"kind": "line", "lineno": 3}
+    assert SubQuery(kind="line")(event) is True
+    assert SubAnd(hunter.Q(kind="line"), SubQuery(lineno=4))(event) is False
+    assert hunter.Or(NegatedQuery(kind="call"), SubQuery(kind="call"))(event) is True
+    assert NegatedQuery(kind="line")(event) is False
+
+
+def test_compiled_predicates_pickle():
+    predicate = hunter.And(hunter.Q(kind="line", function_rx="^make_"), hunter.Not(hunter.Q(lineno=1)))
+    copy = pickle.loads(pickle.dumps(predicate))
+
+    assert copy == predicate
+    assert copy(make_events()[1]) is True
+
+
+def test_filename_and_stdlib_are_memoized():
+    from hunter import event as event_module
+
+    fast, full = make_events()
+    assert event_module.FILENAMES[fast.code.co_filename] == fast.filename == full.filename
+    assert full.stdlib is False
+    assert event_module.STDLIB[(full.filename, full.module)] is False
+
+    namespace = {"__file__": "/somewhere/else.py", "sys": sys}
+    exec(compile("frame = sys._getframe()", "", "exec"), namespace)
+    assert Event(namespace["frame"], "line", None, 0, 0, None).filename == "/somewhere/else.py"
+    assert "" not in event_module.FILENAMES
+
+
+def test_line_table_follows_linecache(tmp_path):
+    import linecache
+
+    from hunter.event import line_source
+    from hunter.event import line_table
+
+    path = tmp_path / "module.py"
+    path.write_text("x = 1\n  y = 2  \n")
+    filename = str(path)
+    assert line_table(filename, None)[1] == ["x = 1", "y = 2"]
+    assert line_source(filename, 2, None) == "  y = 2  \n"
+    assert line_source(filename, 3, None) == ""
+
+    path.write_text("z = 3\n")
+    assert line_table(filename, None)[1] == ["x = 1", "y = 2"]
+    linecache.checkcache(filename)
+    assert line_table(filename, None)[1] == ["z = 3"]
+
+
+def decorated(function):
+    return function
+
+
+@decorated
+def defined_here():
+    return sys._getframe()
+
+
+def test_fullsource_definition_is_memoized():
+    from hunter import event as event_module
+
+    frame = defined_here()
+    first = Event(frame, "call", None, 0, 0, None)
+    first.lineno = frame.f_code.co_firstlineno
+    assert first.fullsource == "@decorated\ndef defined_here():\n"
+    assert event_module.DEFINITIONS[frame.f_code] == {(first.filename, first.lineno): first.fullsource}
+
+
+def backlog_output(**options):
+    import io
+
+    stream = io.StringIO()
+    action = hunter.CallPrinter(stream=stream, force_colors=False)
+    backlog = hunter.Backlog(function="target", kind="return", vars=True, action=action, stack=0, **options)
+    tracer = Tracer()
+    tracer.trace(hunter.When(hunter.Q(module=__name__), backlog))
+    try:
+        chatty(3)
+    finally:
+        tracer.stop()
+    return stream.getvalue()
+
+
+def chatty(n):
+    big = "x" * 100
+    return target(n + len(big))
+
+
+def target(n):
+    return n
+
+
+def test_deferred_backlog_matches_eager_backlog():
+    output = backlog_output(deferred=True)
+    assert "=> chatty(n=3)" in output
+    assert output == backlog_output()
+
+
+def test_deferred_detach_renders_on_resolve():
+    frame = defined_here()
+    deferred = Event(frame, "call", None, 0, 0, None).defer()
+    assert deferred.deferred and deferred.detached
+    assert deferred.globals is frame.f_globals
+
+    resolved = deferred.resolve(repr, budget=10)
+    assert not resolved.deferred
+    assert resolved.arg == "None"
+    assert set(resolved.globals.values()) - {"..."}
+    assert len([value for value in resolved.globals.values() if value != "..."]) < len(resolved.globals)
+    assert resolved.resolve(repr) is resolved
+
+
+def mutating():
+    items = []
+    count = 0
+    items.append(1)
+    count = 0
+    count += 1
+    return items
+
+
+def snoop(**options):
+    import io
+
+    stream = io.StringIO()
+    snooper = hunter.VarsSnooper(stream=stream, force_colors=False, **options)
+    tracer = Tracer()
+    tracer.trace(hunter.When(hunter.Q(function="mutating"), snooper))
+    try:
+        mutating()
+    finally:
+        tracer.stop()
+    return snooper, [line.split(" ", 1)[1].strip() for line in stream.getvalue().splitlines()]
+
+
+def test_vars_snooper_reports_changes():
+    snooper, lines = snoop()
+    assert [line.split(None, 1)[1] for line in lines] == [
+        "[items := []]",
+        "[count := 0]",
+        "[items : [] => [1]]",
+        "[count : 0 => 1]",
+    ]
+    assert not snooper.stored_reprs
+
+
+def test_vars_snooper_bounds_memory():
+    snooper, _ = snoop(max_scopes=2)
+    frames = [make_events()[1].frame, defined_here(), sys._getframe()]
+    for frame in frames:
+        snooper(Event(frame, "line", None, 0, 0, None))
+    assert list(snooper.stored_reprs) == [frame.f_code for frame in frames[1:]]
+    assert snooper.preview("x" * 100) == "x" * 32 + " [...] " + "x" * 32
+
+
+def test_output_templates_match_format():
+    import io
+
+    from hunter.actions import compile_template
+
+    stream = io.StringIO()
+    action = hunter.CallPrinter(stream=stream, force_colors=True)
+    format_str = "{}{KIND}{:9} {fore(BLUE)}{name}{RESET} {{literal}}\n"
+    template = compile_template(format_str, action.other_colors)
+    assert "KIND" not in template and "{name}" in template
+    expected = format_str.format("a", "line", name="n", **action.other_colors)
+    assert template.format("a", "line", name="n") == expected
+
+    action.output(format_str, "a", "line", name="n")
+    action.output(format_str, "a", "line", name="n", KIND="<kind>")
+    assert stream.getvalue() == expected + expected.replace(action.other_colors["KIND"], "<kind>", 1)
+
+
+def test_buffered_output_flushes_on_stop():
+    import io
+
+    stream = io.StringIO()
+    action = hunter.CodePrinter(stream=stream, force_colors=False, buffer_size=1 << 20, flush_interval=60)
+    tracer = Tracer()
+    tracer.trace(hunter.When(hunter.Q(function="sample"), action))
+    try:
+        sample(1)
+        assert stream.getvalue() == ""
+    finally:
+        tracer.stop()
+    assert stream.getvalue().count("\n") == 5
+
+
+def failing_macro():
+    value = 1 / 0  # ?
+
+
+def test_result_handler_reads_only_declared_fields():
+    fields = pyliveview.result_handler.event_fields
+    assert FastEvent.FIELDS.issuperset(fields)
+
+    class DeclaredEvent:
+        kind = "line"
+
+        def __init__(self, event):
+            self.event = event
+
+        def __getitem__(self, name):
+            assert name in fields, name
+            return self.event[name]
+
+    def action(event):
+        if event.kind == "line":
+            pyliveview.result_handler(DeclaredEvent(event))
+
+    tracer = Tracer()
+    tracer.trace(hunter.When(hunter.Q(function="failing_macro"), action))
+    try:
+        failing_macro()
+    except ZeroDivisionError:
+        pass
+    finally:
+        tracer.stop()
+    entries = list(pyliveview.PLV)
+    pyliveview.PLV.clear()
+
+    assert entries == [
+        {
+            "lineno": failing_macro.__code__.co_firstlineno + 1,
+            "source": "value = 1 / 0  # ?",
+            "value": "ZeroDivisionError: division by zero",
+            "error": True,
+        }
+    ]
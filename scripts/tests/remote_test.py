@@ -0,0 +1,58 @@
+import socket
+import threading
+
+import pytest
+
+pytest.importorskip("manhole")
+
+from hunter import remote  # noqa: E402
+
+
+@pytest.fixture
+def sink(tmp_path):
+    path = str(tmp_path / "sink")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    yield path, server
+    server.close()
+
+
+def read_frames(conn):
+    frames = []
+    reader = conn.makefile("rb")
+    while True:
+        header = reader.read(remote.FRAME_HEADER.size)
+        if len(header) < remote.FRAME_HEADER.size:
+            return frames
+        (size,) = remote.FRAME_HEADER.unpack(header)
+        frames.append(reader.read(size))
+
+
+def test_writes_are_batched_into_frames(sink):
+    path, server = sink
+    stream = remote.RemoteStream(path, False, "utf-8", frame_size=10)
+    conn, _ = server.accept()
+    for fragment in ("abc", "def", "ghij", "k"):
+        stream.write(fragment)
+    stream.close()
+    assert read_frames(conn) == [b"abcdefghij", b"k"]
+    assert stream.dropped == 0
+
+
+def test_slow_client_drops_instead_of_blocking(sink):
+    path, server = sink
+    stream = remote.RemoteStream(path, False, "utf-8", frame_size=1 << 16, max_frames=1)
+    conn, _ = server.accept()
+    chunk = "x" * (1 << 16)
+    for _ in range(200):  # way more than the socket buffer, nobody is reading yet
+        stream.write(chunk)
+    assert stream.dropped
+
+    frames = []
+    reader = threading.Thread(target=lambda: frames.extend(read_frames(conn)))
+    reader.start()
+    stream.close(timeout=5)
+    reader.join(5)
+    assert any(frame.startswith(b"\n... hunter dropped") for frame in frames)
+    assert sum(len(frame) for frame in frames if frame.startswith(b"x")) + stream.dropped == 200 * len(chunk)
@@ -0,0 +1,90 @@
+import json
+
+from .. import pyliveview
+from ..pyliveview import test as pyliveviewtest
+
+snippet = r"""
+def slow(n, tag):
+    total = 0
+    for i in range(n):
+        total += i % 7
+        tag
+    return total
+
+values = [slow({n}, "work") for _ in range(10)]
+count = len(values)
+count
+print('done')
+"""
+
+
+def test_sampled_output_matches_tracing():
+    traced = json.loads(pyliveviewtest(snippet.format(n=1000)))
+    sampled = json.loads(pyliveviewtest(snippet.format(n=100000), sample=0.001))
+
+    # Lines that ran too fast to be sampled are missing, the others
+    # look exactly like their traced entries, once per line.
+    linenos = [entry["lineno"] for entry in sampled]
+    assert 5 in linenos
+    assert len(set(linenos)) == len(linenos)
+    for entry in sampled:
+        assert entry in traced
+
+
+def test_sampled_print_is_kept():
+    source = "print('hello')\n" + snippet.format(n=100000)
+    sampled = json.loads(pyliveviewtest(source, sample=0.001))
+    assert {"lineno": 1, "source": "print('hello')", "value": "hello"} in sampled
+
+
+def test_sample_stats(run_pyliveview):
+    run = run_pyliveview(snippet.format(n=100000).strip() + "\n", "--sample", "1")
+
+    assert run.lines[-1].startswith("PLV: ")
+    stats = run.stats
+
+    # Nothing is traced, the time goes to the loop in `slow`.
+    assert stats["events"] == 0
+    assert stats["samples"] > 0
+    hottest = max(stats["line_share"], key=stats["line_share"].get)
+    assert int(hottest) in (3, 4, 5, 6)
+    assert stats["line_share"]["8"] > 0.5
+
+
+def test_sampled_macro_error_is_reported():
+    source = r"""
+def slow(n):
+    total = 0
+    for i in range(n):
+        total += i
+        total
+    return total
+
+ratio = slow(1000000) / 0  # ?
+"""
+    sampled = json.loads(pyliveviewtest(source, sample=0.001))
+
+    assert 5 in [entry["lineno"] for entry in sampled]
+    assert sampled[-1] == {
+        "lineno": 8,
+        "source": "ratio = slow(1000000) / 0  # ?",
+        "value": "ZeroDivisionError: division by zero",
+        "error": True,
+    }
+
+
+def test_sampler_survives_a_failed_snapshot(monkeypatch):
+    copy = pyliveview.try_deepcopy
+    raced = []
+
+    def racing_copy(obj):
+        if not raced:
+            raced.append(obj)
+            raise RuntimeError("dictionary changed size during iteration")
+        return copy(obj)
+
+    monkeypatch.setattr(pyliveview, "try_deepcopy", racing_copy)
+    sampled = json.loads(pyliveviewtest(snippet.format(n=100000), sample=0.001))
+    # The samples after the failed one still got their snapshots.
+    assert raced
+    assert 5 in [entry["lineno"] for entry in sampled]
@@ -0,0 +1,30 @@
+import json
+
+snippet = r"""
+import json
+
+def double(x):
+    return x * 2
+
+total = 0
+for i in range(10):
+    total += double(i)
+total
+data = json.dumps([total])  # ?
+"""
+
+
+def test_stats_line(run_pyliveview):
+    run = run_pyliveview(snippet.strip() + "\n")
+
+    assert run.lines[-1].startswith("PLV: ")
+    assert run.lines[-2].startswith("PLV_STATS: ")
+    stats = run.stats
+
+    assert stats["entries"] == len(run.results)
+    assert stats["output_bytes"] == len(run.output.encode("utf-8"))
+    # json.dumps runs outside the traced file, so some events get filtered.
+    assert stats["events"] > stats["events_filtered"] > 0
+    assert stats["run_seconds"] >= stats["result_handler_seconds"] > 0
+    assert stats["result_handler_seconds"] >= stats["parse_eval_seconds"] > 0
+    assert stats["deepcopy_seconds"] > 0
@@ -0,0 +1,38 @@
+import json
+import os
+
+from .. import pyliveview
+
+
+def test_source_replaces_the_file(tmp_path):
+    (tmp_path / "stdin_helper.py").write_text("VALUE = 41\n", encoding="utf-8")
+    script = tmp_path / "main.py"
+    script.write_text("saved = True\nsaved\n", encoding="utf-8")
+
+    source = "from stdin_helper import VALUE\nname = __file__\nname\nv = VALUE + 1\nv\n"
+    results = json.loads(pyliveview.main(str(script), test=True, source=source))
+
+    assert results == [
+        {"lineno": 3, "source": "name", "value": str(script)},
+        {"lineno": 5, "source": "v", "value": "42"},
+    ]
+    # The file is left alone and no temp copy is written next to it.
+    assert script.read_text(encoding="utf-8") == "saved = True\nsaved\n"
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".pyliveview")]
+
+
+def test_stdin_errors_point_at_the_piped_source(tmp_path, run_pyliveview):
+    source = "x = 'é'\nx\n\ny = x / 2\n"
+    run = run_pyliveview(source, "--stdin", filename="unsaved/main.py")
+
+    assert run.returncode == 0, run.stderr
+    assert run.results == [
+        {"lineno": 2, "source": "x", "value": "é"},
+        {
+            "lineno": 4,
+            "source": "y = x / 2",
+            "value": "TypeError: unsupported operand type(s) for /: 'str' and 'int'",
+            "error": True,
+        },
+    ]
+    assert not (tmp_path / "unsaved").exists()
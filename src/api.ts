@@ -1,6 +1,14 @@
-import * as fs from "fs";
+import type { ChildProcess } from "child_process";
 import { PyLiveViewDecorationsController, pyLiveViewDecorationStoreFactory } from "./decorations";
-import { PyLiveViewDecorations, PyLiveViewParsedTraceResults, TracerParsedResultTuple, PyLiveViewTraceLineResult } from "./types";
+import {
+  PyLiveViewDecorations,
+  PyLiveViewLiveLineResult,
+  PyLiveViewParsedTraceResults,
+  TracerParsedResultTuple,
+  PyLiveViewTraceLineResult,
+  PyLiveViewTracerStats,
+  PyLiveViewSessionMode,
+} from "./types";
 import {
   commands,
   extensions,
@@ -9,17 +17,28 @@ import {
   TextDocumentChangeEvent,
   TextDocument,
   TextEditor,
+  window,
   workspace,
   WorkspaceConfiguration,
 } from "vscode";
 import { PyLiveViewSessionController, pyLiveViewSessionStoreFactory } from "./sessions";
-import { PythonTracer, pythonTracerFactory } from "./tracer";
-import { getActiveEditor, makeTempFile } from "./helpers";
+import { PythonTracer, pythonTracerFactory, tracerEnv } from "./tracer";
+import { pyLiveViewTraceTimingsFactory } from "./timings";
+import { PyLiveViewResultCache, pyLiveViewResultCacheFactory } from "./resultCache";
+import { PyLiveViewInterpreterController, pyLiveViewInterpreterStoreFactory } from "./interpreter";
+import {
+  PRIORITY_ACTIVE,
+  PRIORITY_HIDDEN,
+  PRIORITY_VISIBLE,
+  pyLiveViewTraceSchedulerFactory,
+} from "./scheduler";
+import { getActiveEditor } from "./helpers";
+import { clamp } from "./utils";
 import { hotModeWarning } from "./hotWarning";
 import { pyLiveViewOutputFactory, PyLiveViewOutputController } from "./output";
 import { EventEmitter } from "events";
-import { platform } from "os";
-import { PyLiveViewError } from "./errors";
+import { cpus } from "os";
+import { PyLiveViewError, TraceCancelledError } from "./errors";
 
 export function pyLiveViewStandardApiFactory(
   context: ExtensionContext,
@@ -31,6 +50,7 @@ export function pyLiveViewStandardApiFactory(
     pyLiveViewDecorationStoreFactory(context),
     pyLiveViewSessionStoreFactory(),
     pythonTracerFactory(),
+    pyLiveViewInterpreterStoreFactory(context),
   );
 }
 
@@ -38,35 +58,174 @@ export class PyLiveViewAPI {
   private _changedConfigFlag = false;
   private _endOfFile = 0;
   private _eventEmitter = new EventEmitter()
+  private _attached: { process: ChildProcess; fileName: string } | null = null;
+  /* Sessions not in the default ("trace") mode */
+  private _sessionModes = new Map<string, PyLiveViewSessionMode>();
+  private _traceGeneration = 0;
+  /* Generation of the results currently shown, per file */
+  private _appliedGenerations = new Map<string, number>();
+  /* Last results per file, the decorations controller only holds the active one's */
+  private _results = new Map<string, PyLiveViewParsedTraceResults>();
+  /* Per file, the controllers background editors scroll with, see `refreshVisibleDecorations` */
+  private _backgroundDecorations = new Map<string, PyLiveViewDecorationsController>();
+  private _scheduler = pyLiveViewTraceSchedulerFactory(
+    () => this.maxConcurrentTraces,
+    (fileName: string) => this.tracePriority(fileName),
+  );
+  private _timings = pyLiveViewTraceTimingsFactory();
+  private _resultCache = pyLiveViewResultCacheFactory();
 
   constructor(
     public context: ExtensionContext,
     private _outputController: PyLiveViewOutputController,
     private _decorationController: PyLiveViewDecorationsController,
     private _sessionController: PyLiveViewSessionController,
-    private _pythonTracer: PythonTracer
+    private _pythonTracer: PythonTracer,
+    private _interpreterController: PyLiveViewInterpreterController,
   ) { }
 
-  public stepInPyLiveView = (): void => {
+  public stepInPyLiveView = (mode: PyLiveViewSessionMode = "trace"): void => {
     this.logToOutput("[DEBUG] stepInPyLiveView called");
+    const document = this.activeEditor.document;
+    const fileName = document.fileName;
     this.decorations.setDefaultDecorationOptions("green", "red");
     this.sessions.createSessionFromEditor(this.activeEditor);
+    if (mode === "trace") this._sessionModes.delete(fileName);
+    else this._sessionModes.set(fileName, mode);
     this.updateLineCount(this.activeEditor.document.lineCount);
-    this.logToOutput(`[DEBUG] Tracing file: ${this.activeEditor.document.fileName}`);
-    this.traceAndSetDecorations(this.activeEditor.document.fileName);
+    this.logToOutput(`[DEBUG] Tracing file: ${fileName}`);
+    this.traceAndSetDecorationsFromDocument(document);
     this.enterPyLiveViewContext();
   };
 
   public stopPyLiveView = (): void => {
+    this.detachFromProcess();
+    this._scheduler.clear();
+    this.tracer.cancelAll();
+    this.tracer.closeCellWorkers();
     this.clearAllSessionsAndDecorations();
     this.exitPyLiveViewContext();
   };
 
-  public traceAndSetDecorationsUsingTempFile = (document: TextDocument): void => {
-    const tempFileObj = makeTempFile(document.fileName);
-    fs.writeFileSync(tempFileObj.name, document.getText());
-    this.traceAndSetDecorations(tempFileObj.name)
-      .finally(tempFileObj.removeCallback);
+  public attachToProcess = async (pid: number): Promise<void> => {
+    this.detachFromProcess();
+    const editor = this.activeEditor;
+    const fileName = editor.document.fileName;
+    this.decorations.setDefaultDecorationOptions("green", "red");
+    this.sessions.createSessionFromEditor(editor);
+    this.enterPyLiveViewContext();
+
+    // Latest aggregate per line, the tracer only sends the lines that changed.
+    const lines = new Map<number, PyLiveViewTraceLineResult>();
+    const pythonPath = await this.getPythonPath();
+    const process = this.tracer.attachToProcess(
+      { fileName, pythonPath, rootDir: this.rootExtensionDir, pid },
+      (update: PyLiveViewLiveLineResult[]) => {
+        for (const line of update) {
+          lines.set(line.lineno, {
+            lineno: line.lineno,
+            value: line.value,
+            kind: "line",
+            source: line.source,
+            pretty: line.value,
+            error: line.error,
+            calls: line.hits,
+          });
+        }
+        const session = this.sessions.getSessionByFileName(fileName);
+        if (session) this.parsePythonDataAndSetDecorations(session, [...lines.values()]);
+      },
+      (message: string) => this.logToOutput("[ERROR] PyLiveView attach:", message),
+    );
+    process.on("exit", () => {
+      if (this._attached?.process === process) this._attached = null;
+    });
+    this._attached = { process, fileName };
+    this.logToOutput(`Attached to process ${pid}, watching ${fileName}`);
+  };
+
+  public detachFromProcess = (): void => {
+    if (this._attached) {
+      // SIGTERM lets the python side detach the tracer from the target.
+      this._attached.process.kill("SIGTERM");
+      this._attached = null;
+    }
+  };
+
+  public isAttachedToDocument = (document: TextDocument): boolean => {
+    return this._attached?.fileName === document.fileName;
+  };
+
+  /*
+   * Queues a trace of the document's current (possibly unsaved) text,
+   * nothing is written to disk. Requests for the same document coalesce,
+   * the text is read when the trace actually starts.
+   */
+  public traceAndSetDecorationsFromDocument = (document: TextDocument): void => {
+    this._scheduler.schedule(document.fileName, () => this.traceAndSetDecorations(
+      document.fileName,
+      this.sessionMode(document.fileName),
+      document.getText(),
+    ));
+  };
+
+  /* How long to wait after an edit before re-tracing, adapted to the file's trace times. */
+  public updateDelayFor = (document: TextDocument): number => {
+    const min = clamp(100, 10000, this.updateFrequency ?? 100);
+    const max = clamp(min, 10000, this.maxUpdateFrequency ?? 5000);
+    return this._timings.delayFor(document.fileName, min, max);
+  };
+
+  /*
+   * Shows the results of an earlier run of the document's exact text,
+   * if there are any (ie: after an undo). True when it did, nothing needs
+   * to run then.
+   */
+  public showCachedResults = async (document: TextDocument): Promise<boolean> => {
+    if (this.sessionMode(document.fileName) !== "trace") return false;
+    const pythonPath = await this.getPythonPath();
+    const result = this._resultCache.get(this.resultCacheKey(document.fileName, pythonPath, document.getText()));
+    if (result === undefined) return false;
+    // Runs still going were for other text, and won't reset the loading icon.
+    this._appliedGenerations.set(document.fileName, ++this._traceGeneration);
+    if (this.config.get<boolean>('showLoadingIcon') === true)
+      commands.executeCommand('setContext', 'pyliveview.isLoading', false);
+    this.onPythonDataSuccess(document.fileName, result);
+    return true;
+  };
+
+  /* A whole trace's results depend on the settings passed to the tracer too. */
+  private resultCacheKey = (fileName: string, pythonPath: string, source: string): string => {
+    return PyLiveViewResultCache.key(fileName, pythonPath, source, tracerEnv({ hotLineLimit: this.hotLineLimit }));
+  };
+
+  /* Starts the queued traces the visible editors changed the priority of. */
+  public pumpTraces = (): void => {
+    this._scheduler.pump();
+  };
+
+  /* Shows the last results of the editor's document while it's re-traced. */
+  public showLastResults = (editor: TextEditor): void => {
+    const results = this._results.get(editor.document.fileName);
+    if (results) this.parsePythonDataAndSetDecorations(editor, results);
+  };
+
+  /* The controller only holds the active document's annotations. */
+  public decorationsForDocument = (document: TextDocument): PyLiveViewDecorationsController | undefined => {
+    if (this.isDocumentPyLiveViewSession(document) && window.activeTextEditor?.document === document)
+      return this.decorations;
+  };
+
+  public sessionMode = (fileName: string): PyLiveViewSessionMode => {
+    return this._sessionModes.get(fileName) ?? "trace";
+  };
+
+  private tracePriority = (fileName: string): number => {
+    if (!this.sessions.sessionNames.includes(fileName)) return PRIORITY_HIDDEN;
+    if (window.activeTextEditor?.document.fileName === fileName) return PRIORITY_ACTIVE;
+    if (window.visibleTextEditors.some(editor => editor.document.fileName === fileName))
+      return PRIORITY_VISIBLE;
+    return PRIORITY_HIDDEN;
   };
 
   public enterPyLiveViewContext = (): void => {
@@ -93,6 +252,10 @@ export class PyLiveViewAPI {
   public clearAllSessionsAndDecorations = (): void => {
     this.clearAllDecorations();
     this.sessions.clearAllSessions();
+    this._sessionModes.clear();
+    this._results.clear();
+    this._backgroundDecorations.clear();
+    this._resultCache.clear();
   };
 
   public isDocumentPyLiveViewSession = (document: TextDocument): boolean => {
@@ -106,20 +269,48 @@ export class PyLiveViewAPI {
     );
   }
 
-  private onPythonDataError = (data?: string): void => {
+  private onPythonDataError = (fileName: string, data?: string): void => {
     // Always emit the event on error to unblock waiting tests
-    const filepath = this.activeEditor?.document.uri.path || '';
+    const filepath = this.editorForFile(fileName)?.document.uri.path || '';
     this._eventEmitter.emit('decorations-changed', filepath, this.decorations);
 
     // Always log errors for debugging
     this.logToOutput("[ERROR] Python tracer failed:", data ?? '<no message>');
   };
 
-  private onPythonDataSuccess = ([data, stdout]: TracerParsedResultTuple): void => {
+  private prettyPrintTracerStats(stats: PyLiveViewTracerStats): string {
+    const ms = (seconds?: number) => `${((seconds ?? 0) * 1000).toFixed(1)}ms`;
+    const python = stats.load_seconds + stats.run_seconds + stats.serialize_seconds;
+    return [
+      `events: ${stats.events} (filtered: ${stats.events_filtered}, backed off: ${stats.events_backed_off ?? 0}), ` +
+      `entries: ${stats.entries}, output: ${stats.output_bytes} bytes`,
+      ...(Object.keys(stats.hot_lines ?? {}).length === 0 ? [] : [
+        `hot lines (values sampled): ` + Object.entries(stats.hot_lines ?? {})
+          .map(([lineno, hits]) => `${lineno} (${hits} hits)`)
+          .join(", "),
+      ]),
+      `wall: ${ms(stats.wall_seconds)}, startup (approx): ${ms(Math.max(0, (stats.wall_seconds ?? python) - python))}, ` +
+      `tracer load: ${ms(stats.load_seconds)}, compile: ${ms(stats.compile_seconds)}, run: ${ms(stats.run_seconds)}`,
+      `result_handler: ${ms(stats.result_handler_seconds)}, parse_eval: ${ms(stats.parse_eval_seconds)}, ` +
+      `deepcopy: ${ms(stats.deepcopy_seconds)}, serialize: ${ms(stats.serialize_seconds)}`,
+      ...(stats.cells_run === undefined ? [] : [
+        `cells run: ${stats.cells_run}, kept: ${stats.cells_reused}, snapshots: ${ms(stats.snapshot_seconds)}`,
+      ]),
+      ...(stats.samples === undefined ? [] : [
+        `samples: ${stats.samples}, hottest lines: ` + Object.entries(stats.line_share ?? {})
+          .sort((a, b) => b[1] - a[1])
+          .slice(0, 5)
+          .map(([lineno, share]) => `${lineno} (${(share * 100).toFixed(1)}%)`)
+          .join(", "),
+      ]),
+    ].join("\n");
+  }
+
+  private onPythonDataSuccess = (fileName: string, [data, stdout, stats]: TracerParsedResultTuple): void => {
     this.logToOutput(`[DEBUG] onPythonDataSuccess called, data length: ${data?.length ?? 0}`);
     try {
-      this.parsePythonDataAndSetDecorations(this.activeEditor, data);
-      if (this.printLogging) {
+      this.applyResults(fileName, data);
+      if (this.printLogging && window.activeTextEditor?.document.fileName === fileName) {
         const output = this.prettyPrintPyLiveViewData(data);
         this._outputController.clear();
 
@@ -136,15 +327,45 @@ export class PyLiveViewAPI {
           this.logToOutput(cleanStdout ? cleanStdout + '\n\n' : '');
           this.logToOutput(`(PyLiveView Output): ${JSON.stringify(output, null, 4)}`);
           this.logToOutput(`\n\nTotal Line Count: ${data === null || data === void 0 ? void 0 : data.length}`);
+          if (stats) this.logToOutput(`\n\n(PyLiveView Stats):\n${this.prettyPrintTracerStats(stats)}\n`);
         });
       }
     } finally {
       // Always emit the event, even if decoration processing fails
-      const filepath = this.activeEditor.document.uri.path;
+      const filepath = this.editorForFile(fileName)?.document.uri.path || '';
       this.emit('decorations-changed', filepath, this.decorations);
     }
   };
 
+  /*
+   * Renders into every editor showing the file. The decorations controller
+   * ends up holding the active editor's results, whichever file came in.
+   */
+  private applyResults = (fileName: string, data: PyLiveViewParsedTraceResults = []): void => {
+    this._results.set(fileName, data);
+    this._backgroundDecorations.delete(fileName);
+    const active = window.activeTextEditor;
+    const background = window.visibleTextEditors.filter(
+      editor => editor !== active && editor.document.fileName === fileName
+    );
+    for (const editor of background)
+      this.parsePythonDataAndSetDecorations(editor, data);
+
+    if (active?.document.fileName === fileName) {
+      this.parsePythonDataAndSetDecorations(active, data);
+    } else if (background.length > 0) {
+      // The active editor keeps what it shows, its next render starts over.
+      this.decorations.reInitDecorationCollection();
+      this.decorations.prepareParsedPythonData(active && this._results.get(active.document.fileName));
+    }
+  };
+
+  private editorForFile = (fileName: string): TextEditor | undefined => {
+    const active = window.activeTextEditor;
+    if (active?.document.fileName === fileName) return active;
+    return window.visibleTextEditors.find(editor => editor.document.fileName === fileName);
+  };
+
   private parsePythonDataAndSetDecorations = (
     session: TextEditor,
     data: PyLiveViewParsedTraceResults = []
@@ -155,6 +376,35 @@ export class PyLiveViewAPI {
     this.setPreparedDecorations(session);
   };
 
+  /*
+   * Renders the lines scrolled into view, if the last render didn't cover
+   * them. Editors in the background render from their own file's results.
+   */
+  public refreshVisibleDecorations = (editor: TextEditor): void => {
+    if (!this.isDocumentPyLiveViewSession(editor.document)) return;
+    if (editor === window.activeTextEditor) {
+      if (this.decorations.needsRender(editor)) this.setPreparedDecorations(editor);
+      return;
+    }
+    const controller = this.backgroundDecorations(editor.document.fileName);
+    if (controller?.needsRender(editor)) {
+      controller.setPreparedDecorationsForEditor(editor);
+      this.setDecorations(editor, controller.getPreparedDecorations());
+    }
+  };
+
+  /* A controller holding the file's last results, for scrolling an editor that isn't the active one. */
+  private backgroundDecorations = (fileName: string): PyLiveViewDecorationsController | undefined => {
+    let controller = this._backgroundDecorations.get(fileName);
+    const results = this._results.get(fileName);
+    if (controller === undefined && results !== undefined) {
+      controller = new PyLiveViewDecorationsController(this.context);
+      controller.prepareParsedPythonData(results);
+      this._backgroundDecorations.set(fileName, controller);
+    }
+    return controller;
+  };
+
   private setPreparedDecorations = (session: TextEditor): void => {
     this.decorations.setPreparedDecorationsForEditor(session);
     const decorations = this.decorations.getPreparedDecorations();
@@ -172,37 +422,74 @@ export class PyLiveViewAPI {
     }
   };
 
-  private traceAndSetDecorations = (fileName: string): Promise<void> => {
+  private traceAndSetDecorations = (
+    fileName: string,
+    mode: PyLiveViewSessionMode = "trace",
+    source?: string,
+  ): Promise<void> => {
     // Optionally set loading context so UI can show a loading icon
     const shouldShowLoading = this.config.get<boolean>('showLoadingIcon') === true;
     if (shouldShowLoading) commands.executeCommand('setContext', 'pyliveview.isLoading', true);
-    return this.getPythonPath().then(pythonPath =>
-      this.tracer.tracePythonScript({
+    // Taken before any await, so the order of the requests decides.
+    const generation = ++this._traceGeneration;
+    return this.getPythonPath().then(pythonPath => {
+      // Sampled runs differ every time and cell runs depend on the
+      // worker's earlier runs, only whole traces are cached.
+      const cacheKey = mode !== "trace" || source === undefined
+        ? undefined
+        : this.resultCacheKey(fileName, pythonPath, source);
+      const cached = cacheKey && this._resultCache.get(cacheKey);
+      if (cached) {
+        if (generation < (this._appliedGenerations.get(fileName) ?? 0)) return;
+        this._appliedGenerations.set(fileName, generation);
+        try { this.onPythonDataSuccess(fileName, cached); }
+        finally { if (shouldShowLoading) commands.executeCommand('setContext', 'pyliveview.isLoading', false); }
+        return;
+      }
+      const startedAt = Date.now();
+      this._timings.started(fileName, startedAt);
+      const options = {
         fileName,
         pythonPath,
         rootDir: this.rootExtensionDir,
-      })
+        sampleInterval: mode === "sampled" ? this.sampleInterval : undefined,
+        hotLineLimit: this.hotLineLimit,
+        source,
+        generation,
+      };
+      return (mode === "cells" ? this.tracer.traceCells(options) : this.tracer.tracePythonScript(options))
         .then((res) => {
-          try { this.onPythonDataSuccess(res); }
+          // Spawn to exit, as timed by the tracer when the run reported its stats.
+          this._timings.record(fileName, res[2]?.wall_seconds ?? (Date.now() - startedAt) / 1000);
+          if (cacheKey) this._resultCache.set(cacheKey, res);
+          // Never let a late run overwrite newer annotations.
+          if (generation < (this._appliedGenerations.get(fileName) ?? 0)) return;
+          this._appliedGenerations.set(fileName, generation);
+          try { this.onPythonDataSuccess(fileName, res); }
           finally { if (shouldShowLoading) commands.executeCommand('setContext', 'pyliveview.isLoading', false); }
         })
         .catch((err) => {
-          try { this.onPythonDataError(err?.toString?.() ?? String(err)); }
+          // The run that replaced this one takes care of the loading icon.
+          if (err instanceof TraceCancelledError) return;
+          try { this.onPythonDataError(fileName, err?.toString?.() ?? String(err)); }
           finally { if (shouldShowLoading) commands.executeCommand('setContext', 'pyliveview.isLoading', false); }
         })
-    );
+    });
   };
 
   private updateLineCount = (count: number): void => {
     this.oldLineCount = count;
   };
 
+  /* Moves the current annotations along with an edit while the re-trace is pending. */
   public updateStickysHot = (event: TextDocumentChangeEvent): void => {
-    if (this.isHot) {
-      this.setPreparedDecorations(this.activeEditor);
-      this.updateLineCount(event.document.lineCount);
-    }
-    this.activeEditor.document.save();
+    // Only the active document's annotations are held by the controller.
+    const session = window.activeTextEditor?.document === event.document
+      ? this.sessions.getSessionByFileName(event.document.fileName)
+      : undefined;
+    if (session && this.decorations.shiftForContentChanges(event.document, event.contentChanges))
+      this.setPreparedDecorations(session);
+    this.updateLineCount(event.document.lineCount);
   };
 
   public setConfigUpdatedFlag(v: boolean): void {
@@ -253,6 +540,10 @@ export class PyLiveViewAPI {
     return this.config.get<number>("updateFrequency");
   }
 
+  public get maxUpdateFrequency(): number | undefined {
+    return this.config.get<number>("maxUpdateFrequency");
+  }
+
   public get oldLineCount(): number {
     return this._endOfFile;
   }
@@ -265,6 +556,21 @@ export class PyLiveViewAPI {
     return this.config.get<boolean>("printLoggingEnabled");
   }
 
+  public get sampleInterval(): number {
+    return this.config.get<number>("sampleInterval") ?? 5;
+  }
+
+  /* pyliveview.hotLineLimit, 0 records every hit of every line */
+  public get hotLineLimit(): number {
+    return Math.max(0, this.config.get<number>("hotLineLimit") ?? 100);
+  }
+
+  /* pyliveview.maxConcurrentTraces, 0 (the default) is half the cores */
+  public get maxConcurrentTraces(): number {
+    const configured = this.config.get<number>("maxConcurrentTraces") ?? 0;
+    return configured > 0 ? configured : Math.max(1, Math.floor(cpus().length / 2));
+  }
+
   public get rootExtensionDir(): string {
     const res = extensions.getExtension("nabilab.pyliveview")?.extensionPath;
     if (res === undefined)
@@ -288,33 +594,17 @@ export class PyLiveViewAPI {
     return this._pythonTracer;
   }
 
-  private __platform = platform().trim()
-
-  // Enhanced pythonPath getter: config > VSCode Python ext > fallback
-  public async getPythonPath(): Promise<string> {
-    // 1. User config
-    const fromconfig = this.config.get<string>("pythonPath");
-    if (fromconfig) return fromconfig;
-
-    // 2. VS Code Python extension
-    const pythonExt = extensions.getExtension('ms-python.python');
-    if (pythonExt) {
-      if (!pythonExt.isActive) {
-        await pythonExt.activate();
-      }
-      // Accessing Python extension API for interpreter details (may be untyped)
-      const execDetails = pythonExt.exports.settings?.getExecutionDetails?.(workspace.workspaceFolders?.[0]?.uri);
-      if (execDetails?.execCommand?.length) {
-        return execDetails.execCommand.join(' ');
-      }
-    }
+  public get interpreter(): PyLiveViewInterpreterController {
+    return this._interpreterController;
+  }
 
-    // 3. Fallback
-    return this.__platform === "win32" ? 'python' : 'python3';
+  /* Resolved once, until the interpreter settings change (see `interpreter.invalidate`) */
+  public getPythonPath(): Promise<string> {
+    return this.interpreter.getPythonPath();
   }
 
   public getPythonMajorVersion = async (): Promise<string> => {
-    const pythonPath = await this.getPythonPath();
-    return await this.tracer.getPythonMajorVersion(pythonPath);
+    const { version } = await this.interpreter.getInterpreterInfo();
+    return version.split(".")[0];
   }
 }
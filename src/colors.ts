@@ -20,6 +20,9 @@ const PyLiveViewHexColorMap = {
   red: "#ea2f36"
 } as PyLiveViewHexColorType;
 
+/* Alpha appended to the colors of stale annotations (0x73 is 45%) */
+const STALE_ALPHA = "73";
+
 export function pyLiveViewIconColorProvider(color: PyLiveViewColorSelection): PyLiveViewIconColor {
   return PyLiveViewIconColorMap[color];
 }
@@ -27,3 +30,8 @@ export function pyLiveViewIconColorProvider(color: PyLiveViewColorSelection): Py
 export function pyLiveViewTextColorProvider(color: PyLiveViewColorSelection): PyLiveViewHexColor {
   return PyLiveViewHexColorMap[color];
 }
+
+/* The color of an annotation kept on an edited line until the re-trace */
+export function pyLiveViewStaleTextColorProvider(color: PyLiveViewColorSelection): PyLiveViewHexColor {
+  return PyLiveViewHexColorMap[color] + STALE_ALPHA;
+}
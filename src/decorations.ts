@@ -1,5 +1,7 @@
 import {
   DecorationOptions,
+  TextDocument,
+  TextDocumentContentChangeEvent,
   TextEditor,
   TextEditorDecorationType,
   window,
@@ -18,11 +20,10 @@ import type {
   PyLiveViewTraceLineResult,
   PyLiveViewParsedTraceResults,
 } from "./types";
-import { pyLiveViewTextColorProvider } from "./colors";
+import { pyLiveViewStaleTextColorProvider, pyLiveViewTextColorProvider } from "./colors";
 import { pyLiveViewIconProvider } from "./icons";
 import { formatPyLiveViewResponseElement } from "./helpers";
 import { clamp, stringEscape } from "./utils";
-import { js as beautify } from "js-beautify";
 
 
 export function pyLiveViewDecorationStoreFactory(
@@ -31,10 +32,22 @@ export function pyLiveViewDecorationStoreFactory(
   return new PyLiveViewDecorationsController(context);
 }
 
+/* Lines above and below the viewport that get rendered ahead of scrolling */
+const VIEWPORT_MARGIN = 200;
+
+interface RenderedWindow {
+  fileName: string;
+  start: number;
+  end: number;
+}
+
 export class PyLiveViewDecorationsController {
-  private _decorations: PyLiveViewDecorationMapping = {};
+  private _decorations: PyLiveViewDecorationMapping = new Map();
   private _decorationTypes: PyLiveViewStandardDecorationTypes | null = null;
   private _preparedDecorations: PyLiveViewDecorations | null = null;
+  /* Formatted text and hover of the lines rendered so far (ranges excluded, edits move those) */
+  private _rendered = new Map<number, Omit<DecorationOptions, "range">>();
+  private _renderedWindows: RenderedWindow[] = [];
 
   constructor(public context: ExtensionContext) { }
 
@@ -62,7 +75,9 @@ export class PyLiveViewDecorationsController {
   };
 
   public reInitDecorationCollection = (): void => {
-    this._decorations = {};
+    this._decorations = new Map();
+    this._rendered.clear();
+    this._renderedWindows = [];
   };
 
   public setDefaultDecorationOptions = (
@@ -75,71 +90,181 @@ export class PyLiveViewDecorationsController {
     };
   };
 
+  /*
+   * Builds the DecorationOptions of the lines in (or near) the editor's
+   * visible ranges only. Scrolling out of them calls for another render,
+   * see `needsRender`.
+   */
   public setPreparedDecorationsForEditor = (editor: TextEditor): void => {
     const decorations: DecorationOptions[] = [];
     const errorDecorations: DecorationOptions[] = [];
+    const lineCount = editor.document.lineCount;
+    const truncLength = workspace
+      .getConfiguration("pyliveview")
+      .get<number>("maxLineLength") ?? 100;
 
-    Object.keys(this._decorations).forEach(key => {
-      const lineNo = parseInt(key, 10);
-      const lineIndex = lineNo - 1;
-      const decorationData = this.getDecorationAtLine(lineNo);
+    const windows = this.viewportWindows(editor);
+    for (const { start, end } of windows) {
+      for (let lineNo = start; lineNo <= end; lineNo++) {
+        const decorationData = this._decorations.get(lineNo);
+        if (decorationData === undefined || lineCount < lineNo) continue;
 
-      if (!decorationData.data || editor.document.lineCount < lineNo) {
-        return;
-      }
+        const textLine = editor.document.lineAt(lineNo - 1);
+        const decoration = {
+          range: new Range(
+            new Position(lineNo - 1, textLine.firstNonWhitespaceCharacterIndex),
+            new Position(lineNo - 1, textLine.text.length)
+          ),
+          ...this.renderLine(decorationData, truncLength),
+        };
 
-      const textLine = editor.document.lineAt(lineIndex);
-      const source = textLine.text;
-      const decoRange = new Range(
-        new Position(lineIndex, textLine.firstNonWhitespaceCharacterIndex),
-        new Position(lineIndex, textLine.text.indexOf(source) + source.length)
-      );
-
-      const decoration = this.createPyLiveViewDecorationOptions({
-        range: decoRange,
-        text: decorationData.data.join(" => "), // This seperator should be adjustable from the config
-        hoverText: decorationData.pretty.join("\n"),
-        color: decorationData.error ? "red" : "cornflower"
-      });
-
-      if (decorationData.error)
-        errorDecorations.push(decoration)
-      else
-        decorations.push(decoration)
-    });
+        if (decorationData.error)
+          errorDecorations.push(decoration)
+        else
+          decorations.push(decoration)
+      }
+    }
 
+    this._renderedWindows = windows;
     this._preparedDecorations = {
       success: decorations,
       error: errorDecorations
     };
   };
 
+  /* True once the editor scrolled past what the last render covered. */
+  public needsRender = (editor: TextEditor): boolean => {
+    const fileName = editor.document.fileName;
+    return editor.visibleRanges.some(range => !this._renderedWindows.some(window =>
+      window.fileName === fileName &&
+      window.start <= range.start.line + 1 &&
+      range.end.line + 1 <= window.end
+    ));
+  };
+
+  /*
+   * Moves the annotations along with the edits, until fresh results come
+   * in. Lines after a change shift by the number of lines it added or
+   * removed, lines it deleted lose their annotation and the line it
+   * edited keeps its annotation, dimmed. Returns false if nothing moved.
+   */
+  public shiftForContentChanges = (
+    document: TextDocument,
+    changes: readonly TextDocumentContentChangeEvent[]
+  ): boolean => {
+    if (this._decorations.size === 0 || changes.length === 0) return false;
+
+    for (const change of changes) {
+      const first = change.range.start.line + 1;
+      const last = change.range.end.line + 1;
+      const inserted = change.text.split(/\r\n|\r|\n/);
+      const added = inserted.length - 1;
+      const delta = added - (last - first);
+      // Whole lines replaced (ie: pasting or deleting full lines): the ones
+      // in between go, the line the change ends on only moves.
+      const wholeLines = change.range.start.character === 0 &&
+        change.range.end.character === 0 && inserted[added] === "";
+      // Pressing enter at the end of a line: the line itself is unchanged.
+      const newlineAfter = change.range.isEmpty && added > 0 && changes.length === 1 &&
+        inserted.slice(0, -1).every(text => text.trim() === "") &&
+        document.lineAt(first - 1 + added).text.slice(inserted[added].length).trim() === "";
+      if (wholeLines) {
+        this.remapLines(lineNo => lineNo < first ? lineNo : lineNo < last ? undefined : lineNo + delta);
+      } else if (newlineAfter) {
+        this.remapLines(lineNo => lineNo > first ? lineNo + delta : lineNo);
+      } else {
+        this.remapLines(lineNo => {
+          if (lineNo < first) return lineNo;
+          if (lineNo > last) return lineNo + delta;
+          return lineNo === first ? first : undefined;
+        });
+        const edited = this._decorations.get(first);
+        if (edited !== undefined) {
+          edited.stale = true;
+          this._rendered.delete(first);
+        }
+      }
+    }
+    this._renderedWindows = [];
+    return true;
+  };
+
+  public getLineDecoration = (lineNo: number): PyLiveViewLineDecoration | undefined => {
+    return this._decorations.get(lineNo);
+  };
+
   public get hasDecorations(): boolean {
-    return Object.keys(this._decorations).length > 0;
+    return this._decorations.size > 0;
+  }
+
+  /* Re-keys the annotations (and their renders), dropping the lines mapped to undefined. */
+  private remapLines(mapLine: (lineNo: number) => number | undefined): void {
+    const decorations: PyLiveViewDecorationMapping = new Map();
+    const rendered = new Map<number, Omit<DecorationOptions, "range">>();
+    for (const [lineNo, decoration] of this._decorations) {
+      const target = mapLine(lineNo);
+      if (target === undefined) continue;
+      decoration.lineno = target;
+      decorations.set(target, decoration);
+      const render = this._rendered.get(lineNo);
+      if (render !== undefined) rendered.set(target, render);
+    }
+    this._decorations = decorations;
+    this._rendered = rendered;
+  }
+
+  /* Visible ranges (1-based, inclusive) grown by the margin, overlapping ones merged. */
+  private viewportWindows(editor: TextEditor): RenderedWindow[] {
+    const fileName = editor.document.fileName;
+    const windows: RenderedWindow[] = [];
+    const ranges = [...editor.visibleRanges].sort((a, b) => a.start.line - b.start.line);
+    for (const range of ranges) {
+      const start = Math.max(1, range.start.line + 1 - VIEWPORT_MARGIN);
+      const end = Math.min(editor.document.lineCount, range.end.line + 1 + VIEWPORT_MARGIN);
+      const last = windows[windows.length - 1];
+      if (last && start <= last.end + 1)
+        last.end = Math.max(last.end, end);
+      else
+        windows.push({ fileName, start, end });
+    }
+    return windows;
   }
 
+  private renderLine = (
+    decorationData: PyLiveViewLineDecoration,
+    truncLength: number
+  ): Omit<DecorationOptions, "range"> => {
+    let rendered = this._rendered.get(decorationData.lineno);
+    if (rendered === undefined) {
+      const { results, stale } = decorationData;
+      rendered = this.createPyLiveViewDecorationOptions({
+        text: results.map(line => stringEscape(formatPyLiveViewResponseElement(line))).join(" => "), // This seperator should be adjustable from the config
+        color: decorationData.error ? "red" : "cornflower",
+        stale,
+      }, truncLength);
+      this._rendered.set(decorationData.lineno, rendered);
+    }
+    return rendered;
+  };
 
   private createPyLiveViewDecorationOptions = (
-    options: PyLiveViewDecorationOptions
-  ): DecorationOptions => {
-    const truncLength = workspace
-      .getConfiguration("pyliveview")
-      .get<number>("maxLineLength") ?? 100;
+    options: PyLiveViewDecorationOptions,
+    truncLength: number
+  ): Omit<DecorationOptions, "range"> => {
     const textLength = options.text.length;
     const ellipsis = textLength > truncLength ? " ..." : "";
+    // Hovers come from PyLiveViewHoverProvider, when they're asked for.
     return {
-      range: options.range,
-      hoverMessage: {
-        language: options.language || "python",
-        value: options.hoverText
-      },
       renderOptions: {
         after: {
           contentText:
             options.text.slice(0, clamp(1, 1000, truncLength)) + ellipsis,
           fontWeight: "normal",
-          fontStyle: "normal",
-          color: pyLiveViewTextColorProvider(options.color)
+          fontStyle: options.stale ? "italic" : "normal",
+          // Attachments have no opacity, a translucent color dims them.
+          color: options.stale
+            ? pyLiveViewStaleTextColorProvider(options.color)
+            : pyLiveViewTextColorProvider(options.color)
         }
       }
     };
@@ -167,29 +292,17 @@ export class PyLiveViewDecorationsController {
     });
   };
 
-  private getDecorationAtLine = (lineNo: number): PyLiveViewLineDecoration => {
-    return this._decorations[lineNo];
-  };
-
-  private getDecorationAtLineOrDefault = (lineNo: number): PyLiveViewLineDecoration => {
-    return (this.getDecorationAtLine(lineNo) || { data: [], pretty: [] });
-  };
-
   private setDecorationAtLine = (line: PyLiveViewTraceLineResult): void => {
     const lineNo = line.lineno;
-    const { data, pretty } = this.getDecorationAtLineOrDefault(lineNo);
-    const annotation = formatPyLiveViewResponseElement(line);
-
-    this._decorations[lineNo] = {
-      data: [...data, stringEscape(annotation)],
-      lineno: lineNo,
-      error: line.error ? true : false,
-      loop: line["_loop"],
-      pretty: [...pretty, beautify(line.value, {
-        indent_size: 4,
-        space_in_empty_paren: true
-      })]
-    };
+    let decoration = this._decorations.get(lineNo);
+    if (decoration === undefined) {
+      decoration = { lineno: lineNo, results: [], error: false };
+      this._decorations.set(lineNo, decoration);
+    }
+    // Appended in place, copying the list for every value adds up in loops.
+    decoration.results.push(line);
+    decoration.error = line.error ? true : false;
+    decoration.loop = line["_loop"];
   };
 
   private get useGutterIcons(): boolean {
@@ -1 +1,4 @@
 export class PyLiveViewError extends Error { }
+
+/* A trace run that was superseded by a newer one for the same file. */
+export class TraceCancelledError extends PyLiveViewError { }
@@ -4,17 +4,19 @@ import type {
   ConfigurationChangeEvent,
   OutputChannel,
   TextDocumentChangeEvent,
+  TextEditorVisibleRangesChangeEvent,
 } from "vscode";
 
 import { pyLiveViewStandardApiFactory, PyLiveViewAPI } from "./api";
 import type { ActiveTextEditorChangeEventResult } from "./types";
 import { registerCommand } from "./helpers";
-import { clamp } from "./utils";
+import { pyLiveViewHoverProviderFactory } from "./hover";
 
 export function activate(context: ExtensionContext): PyLiveViewAPI {
   const output: OutputChannel = vscode.window.createOutputChannel("PyLiveView");
   const api: PyLiveViewAPI = pyLiveViewStandardApiFactory(context, { output });
-  let updateTimeout: null | NodeJS.Timeout = null;
+  /* Pending throttled update per document */
+  const updateTimeouts = new Map<string, NodeJS.Timeout>();
 
   initializePyLiveViewExtension();
 
@@ -25,12 +27,18 @@ export function activate(context: ExtensionContext): PyLiveViewAPI {
       registerCommand("pyliveview.touchBarStart", startPyLiveView),
       registerCommand("pyliveview.touchBarStop", stopPyLiveView),
       registerCommand("pyliveview.runAtCurrentFile", startPyLiveView),
-      registerCommand("pyliveview.stopRunning", stopPyLiveView)
+      registerCommand("pyliveview.runSampledAtCurrentFile", startSampledPyLiveView),
+      registerCommand("pyliveview.runCellsAtCurrentFile", startCellsPyLiveView),
+      registerCommand("pyliveview.stopRunning", stopPyLiveView),
+      registerCommand("pyliveview.attachToProcess", attachPyLiveView),
+      vscode.languages.registerHoverProvider({ language: "python" }, pyLiveViewHoverProviderFactory(api))
     );
 
     const sharedOptions = [null, context.subscriptions];
     vscode.window.onDidChangeActiveTextEditor(changedActiveTextEditor, ...sharedOptions);
     vscode.workspace.onDidChangeTextDocument(changedTextDocument, ...sharedOptions);
+    vscode.window.onDidChangeTextEditorVisibleRanges(changedVisibleRanges, ...sharedOptions);
+    vscode.window.onDidChangeVisibleTextEditors(api.pumpTraces, ...sharedOptions);
     vscode.workspace.onDidChangeConfiguration(changedConfiguration, ...sharedOptions);
   }
 
@@ -45,6 +53,30 @@ export function activate(context: ExtensionContext): PyLiveViewAPI {
       forceRefreshActiveDocument(api);
   }
 
+  function startCellsPyLiveView(): void {
+    api.stepInPyLiveView("cells");
+
+    if (api.activeEditorIsDirty)
+      forceRefreshActiveDocument(api);
+  }
+
+  function startSampledPyLiveView(): void {
+    api.stepInPyLiveView("sampled");
+
+    if (api.activeEditorIsDirty)
+      forceRefreshActiveDocument(api);
+  }
+
+  async function attachPyLiveView(): Promise<void> {
+    const pid = await vscode.window.showInputBox({
+      prompt: "PID of the running Python process to attach to (it must have manhole installed).",
+      validateInput: value => /^\d+$/.test(value.trim()) ? null : "Expected a numeric PID",
+    });
+    if (pid === undefined) return;
+    clearThrottleUpdateBuffer();
+    await api.attachToProcess(parseInt(pid.trim(), 10));
+  }
+
   function stopPyLiveView(): void {
     api.stopPyLiveView();
     clearThrottleUpdateBuffer();
@@ -61,11 +93,16 @@ export function activate(context: ExtensionContext): PyLiveViewAPI {
             "Attempting to restart."
           );
           api.setConfigUpdatedFlag(false);
+          const mode = api.sessionMode(editor.document.fileName);
           stopPyLiveView();
-          api.stepInPyLiveView();
+          api.stepInPyLiveView(mode);
         } else {
           api.enterPyLiveViewContext();
-          forceRefreshActiveDocument(api);
+          // Attached sessions get their values from the live process.
+          if (!api.isAttachedToDocument(editor.document)) {
+            api.showLastResults(editor);
+            forceRefreshActiveDocument(api);
+          }
         }
       } else {
         api.exitPyLiveViewContext();
@@ -74,12 +111,23 @@ export function activate(context: ExtensionContext): PyLiveViewAPI {
   }
 
   function changedTextDocument(event: TextDocumentChangeEvent): void {
-    if (api.isDocumentPyLiveViewSession(event.document)) {
+    if (api.isDocumentPyLiveViewSession(event.document) && !api.isAttachedToDocument(event.document)) {
+      api.updateStickysHot(event);
       throttledHandleDidChangeTextDocument(event);
+      // Text traced before (ie: an undo) is shown right away, without a run.
+      api.showCachedResults(event.document)
+        .then(hit => { if (hit) clearThrottledUpdate(event.document.fileName); })
+        .catch(() => undefined);
     }
   }
 
+  function changedVisibleRanges(event: TextEditorVisibleRangesChangeEvent): void {
+    api.refreshVisibleDecorations(event.textEditor);
+  }
+
   function changedConfiguration(event: ConfigurationChangeEvent): void {
+    if (event.affectsConfiguration("pyliveview.pythonPath") || event.affectsConfiguration("python"))
+      api.interpreter.invalidate();
     if (
       event.affectsConfiguration("pyliveview.iconStyleInGutter") ||
       event.affectsConfiguration("pyliveview.updateFrequency") ||
@@ -92,11 +140,12 @@ export function activate(context: ExtensionContext): PyLiveViewAPI {
   function throttledHandleDidChangeTextDocument(
     event: TextDocumentChangeEvent
   ): void {
-    clearThrottleUpdateBuffer()
-    updateTimeout = setTimeout(
-      () => api.traceAndSetDecorationsUsingTempFile(event.document),
-      clamp(100, 10000, api.updateFrequency ?? Infinity)
-    );
+    const fileName = event.document.fileName;
+    clearTimeout(updateTimeouts.get(fileName));
+    updateTimeouts.set(fileName, setTimeout(() => {
+      updateTimeouts.delete(fileName);
+      api.traceAndSetDecorationsFromDocument(event.document);
+    }, api.updateDelayFor(event.document)));
   }
 
   function forceRefreshActiveDocument(api: PyLiveViewAPI) {
@@ -105,8 +154,14 @@ export function activate(context: ExtensionContext): PyLiveViewAPI {
     } as TextDocumentChangeEvent);
   }
 
+  function clearThrottledUpdate(fileName: string): void {
+    clearTimeout(updateTimeouts.get(fileName));
+    updateTimeouts.delete(fileName);
+  }
+
   function clearThrottleUpdateBuffer(): void {
-    if (updateTimeout)
-      clearTimeout(updateTimeout);
+    for (const timeout of updateTimeouts.values())
+      clearTimeout(timeout);
+    updateTimeouts.clear();
   }
 }
@@ -1,10 +1,7 @@
-import * as path from "path";
 import * as vscode from "vscode";
 import type { PyLiveViewTraceLineResult } from "./types";
 import type { Disposable, TextEditor } from "vscode";
 
-import * as tmp from "tmp";
-
 export function formatPyLiveViewResponseElement(
   element: PyLiveViewTraceLineResult
 ): string {
@@ -38,13 +35,3 @@ export function registerCommand(
 ): Disposable {
   return vscode.commands.registerCommand(cmdName, callBack);
 }
-
-export function makeTempFile(filename: string): tmp.FileResult {
-  const dir = path.dirname(filename);
-  return tmp.fileSync({
-    tmpdir: dir,
-    dir: dir,
-    prefix: "/.pyliveview",
-    postfix: ".py"
-  });
-}
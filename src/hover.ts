@@ -0,0 +1,45 @@
+import { Hover } from "vscode";
+import type { HoverProvider, Position, TextDocument } from "vscode";
+import type { PyLiveViewLineDecoration } from "./types";
+import type { PyLiveViewAPI } from "./api";
+import { js as beautify } from "js-beautify";
+
+/* Hovers kept around, re-hovering the same lines is the common case */
+const HOVER_CACHE_SIZE = 64;
+
+export function pyLiveViewHoverProviderFactory(api: PyLiveViewAPI): PyLiveViewHoverProvider {
+  return new PyLiveViewHoverProvider(api);
+}
+
+/*
+ * Pretty prints a line's values when it's hovered, instead of running
+ * js-beautify on every value of every line up front.
+ */
+export class PyLiveViewHoverProvider implements HoverProvider {
+  // Keyed by the line's decoration, which is replaced by every new trace.
+  private _cache = new Map<PyLiveViewLineDecoration, { count: number; hover: Hover }>();
+
+  constructor(private _api: PyLiveViewAPI) { }
+
+  public provideHover = (document: TextDocument, position: Position): Hover | undefined => {
+    const decoration = this._api.decorationsForDocument(document)?.getLineDecoration(position.line + 1);
+    if (decoration === undefined) return;
+
+    const cached = this._cache.get(decoration);
+    this._cache.delete(decoration);
+    if (cached !== undefined && cached.count === decoration.results.length) {
+      this._cache.set(decoration, cached);
+      return cached.hover;
+    }
+
+    const pretty = decoration.results.map(line => beautify(line.value, {
+      indent_size: 4,
+      space_in_empty_paren: true
+    })).join("\n");
+    const hover = new Hover({ language: "python", value: pretty });
+    this._cache.set(decoration, { count: decoration.results.length, hover });
+    if (this._cache.size > HOVER_CACHE_SIZE)
+      this._cache.delete(this._cache.keys().next().value as PyLiveViewLineDecoration);
+    return hover;
+  };
+}
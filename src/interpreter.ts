@@ -0,0 +1,143 @@
+import { spawn } from "child_process";
+import { promises as fs } from "fs";
+import { platform } from "os";
+import { extensions, workspace } from "vscode";
+import type { ExtensionContext } from "vscode";
+import type { PyLiveViewInterpreterInfo } from "./types";
+
+/* globalState key of the probes, by interpreter path */
+const PROBE_CACHE_KEY = "pyliveview.interpreterProbes";
+
+/* Prints what we want to know about the interpreter running it, as one JSON line */
+const PROBE_SCRIPT = [
+  "import importlib.util, json, sys",
+  "print(json.dumps({",
+  "    'executable': sys.executable,",
+  "    'version': '.'.join(map(str, sys.version_info[:3])),",
+  "    'monitoring': hasattr(sys, 'monitoring'),",
+  "    'numpy': importlib.util.find_spec('numpy') is not None,",
+  "}))",
+].join("\n");
+
+interface CachedProbe {
+  /* Of `info.executable`, a reinstalled interpreter gets probed again */
+  mtimeMs: number;
+  info: PyLiveViewInterpreterInfo;
+}
+
+export function pyLiveViewInterpreterStoreFactory(context: ExtensionContext): PyLiveViewInterpreterController {
+  return new PyLiveViewInterpreterController(context);
+}
+
+/*
+ * Resolves the interpreter once (until `invalidate`), and probes each one
+ * once, persisting the probe across restarts.
+ */
+export class PyLiveViewInterpreterController {
+  private _pythonPath: Promise<string> | null = null;
+  private _probes = new Map<string, Promise<PyLiveViewInterpreterInfo>>();
+  private _watchingPythonExtension = false;
+
+  constructor(public context: ExtensionContext) { }
+
+  public getPythonPath = (): Promise<string> => {
+    if (this._pythonPath === null) {
+      const pythonPath = this.resolvePythonPath();
+      // A failed resolution is retried by the next call.
+      pythonPath.catch(() => { if (this._pythonPath === pythonPath) this._pythonPath = null; });
+      this._pythonPath = pythonPath;
+    }
+    return this._pythonPath;
+  };
+
+  public getInterpreterInfo = async (): Promise<PyLiveViewInterpreterInfo> => {
+    const pythonPath = await this.getPythonPath();
+    let probe = this._probes.get(pythonPath);
+    if (probe === undefined) {
+      probe = this.loadOrProbe(pythonPath);
+      probe.catch(() => this._probes.delete(pythonPath));
+      this._probes.set(pythonPath, probe);
+    }
+    return probe;
+  };
+
+  /* The interpreter settings changed, resolve (and maybe probe) again. */
+  public invalidate = (): void => {
+    this._pythonPath = null;
+    this._probes.clear();
+  };
+
+  // config > VSCode Python ext > fallback
+  private resolvePythonPath = async (): Promise<string> => {
+    // 1. User config
+    const fromconfig = workspace.getConfiguration("pyliveview").get<string>("pythonPath");
+    if (fromconfig) return fromconfig;
+
+    // 2. VS Code Python extension
+    const pythonExt = extensions.getExtension('ms-python.python');
+    if (pythonExt) {
+      if (!pythonExt.isActive) {
+        await pythonExt.activate();
+      }
+      // Accessing Python extension API for interpreter details (may be untyped)
+      const settings = pythonExt.exports.settings;
+      this.watchPythonExtension(settings);
+      const execDetails = settings?.getExecutionDetails?.(workspace.workspaceFolders?.[0]?.uri);
+      if (execDetails?.execCommand?.length) {
+        return execDetails.execCommand.join(' ');
+      }
+    }
+
+    // 3. Fallback
+    return platform().trim() === "win32" ? 'python' : 'python3';
+  };
+
+  /* Picking another interpreter in the Python extension isn't a pyliveview setting. */
+  private watchPythonExtension(settings: { onDidChangeExecutionDetails?: (listener: () => void) => { dispose(): void } }): void {
+    if (this._watchingPythonExtension || settings?.onDidChangeExecutionDetails === undefined) return;
+    this._watchingPythonExtension = true;
+    this.context.subscriptions.push(settings.onDidChangeExecutionDetails(this.invalidate));
+  }
+
+  private loadOrProbe = async (pythonPath: string): Promise<PyLiveViewInterpreterInfo> => {
+    const cached = this.context.globalState.get<Record<string, CachedProbe>>(PROBE_CACHE_KEY)?.[pythonPath];
+    if (cached && await modifiedAt(cached.info.executable) === cached.mtimeMs)
+      return cached.info;
+
+    const info = await probeInterpreter(pythonPath);
+    const mtimeMs = await modifiedAt(info.executable);
+    if (mtimeMs !== undefined) {
+      const probes = this.context.globalState.get<Record<string, CachedProbe>>(PROBE_CACHE_KEY) ?? {};
+      await this.context.globalState.update(PROBE_CACHE_KEY, { ...probes, [pythonPath]: { mtimeMs, info } });
+    }
+    return info;
+  };
+}
+
+async function modifiedAt(file: string): Promise<number | undefined> {
+  try {
+    return (await fs.stat(file)).mtimeMs;
+  } catch {
+    return undefined;
+  }
+}
+
+export function probeInterpreter(pythonPath: string): Promise<PyLiveViewInterpreterInfo> {
+  return new Promise((resolve, reject) => {
+    const child = spawn(pythonPath, ["-c", PROBE_SCRIPT]);
+    const stdout: Buffer[] = [];
+    const stderr: Buffer[] = [];
+    child.stdout.on("data", (data: Buffer) => stdout.push(data));
+    child.stderr.on("data", (data: Buffer) => stderr.push(data));
+    child.on("error", (err: Error) => reject(err.message));
+    child.on("close", (code: number | null) => {
+      try {
+        if (code !== 0) throw new Error(Buffer.concat(stderr).toString() || `exited with code ${code}`);
+        const lines = Buffer.concat(stdout).toString().trim().split("\n");
+        resolve(JSON.parse(lines[lines.length - 1]));
+      } catch (err) {
+        reject(`Probing ${pythonPath} failed: ${err}`);
+      }
+    });
+  });
+}
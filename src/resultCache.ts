@@ -0,0 +1,81 @@
+import { createHash } from "crypto";
+import type { TracerParsedResultTuple } from "./types";
+
+/* What the kept results may add up to, as serialized by the tracer */
+const RESULT_CACHE_BYTES = 32 * 1024 * 1024;
+
+interface CachedResult {
+  result: TracerParsedResultTuple;
+  bytes: number;
+}
+
+export function pyLiveViewResultCacheFactory(): PyLiveViewResultCache {
+  return new PyLiveViewResultCache(RESULT_CACHE_BYTES);
+}
+
+/*
+ * LRU of trace results by the exact text traced, so undoing back to
+ * something traced before (or toggling between two versions) needs no
+ * run. Only runs the tracer found deterministic get in, see the
+ * `uncacheable` stat.
+ */
+export class PyLiveViewResultCache {
+  private _entries = new Map<string, CachedResult>();
+  private _bytes = 0;
+
+  constructor(private _maxBytes: number) { }
+
+  /*
+   * The text is traced as `fileName` (for `__file__` and relative imports)
+   * by `pythonPath`, with the settings the tracer gets in `env`.
+   */
+  public static key(fileName: string, pythonPath: string, source: string, env: Record<string, string> = {}): string {
+    const settings = Object.entries(env).sort(([a], [b]) => (a < b ? -1 : a > b ? 1 : 0));
+    return createHash("sha256")
+      .update(JSON.stringify([fileName, pythonPath, settings]))
+      .update("\0")
+      .update(source)
+      .digest("hex");
+  }
+
+  public get = (key: string): TracerParsedResultTuple | undefined => {
+    const entry = this._entries.get(key);
+    if (entry === undefined) return;
+    this._entries.delete(key);
+    this._entries.set(key, entry);
+    return entry.result;
+  };
+
+  /* Keeps `result` if the tracer found nothing that makes it volatile. */
+  public set = (key: string, result: TracerParsedResultTuple): void => {
+    const stats = result[2];
+    if (result[0] == null || stats?.uncacheable === undefined || stats.uncacheable.length > 0) return;
+    const bytes = stats.output_bytes + Buffer.byteLength(result[1]);
+    if (bytes > this._maxBytes) return;
+
+    this.delete(key);
+    this._entries.set(key, { result, bytes });
+    this._bytes += bytes;
+    for (const [oldest, entry] of this._entries) {
+      if (this._bytes <= this._maxBytes) break;
+      this._entries.delete(oldest);
+      this._bytes -= entry.bytes;
+    }
+  };
+
+  public clear = (): void => {
+    this._entries.clear();
+    this._bytes = 0;
+  };
+
+  public get bytes(): number {
+    return this._bytes;
+  }
+
+  private delete(key: string): void {
+    const entry = this._entries.get(key);
+    if (entry === undefined) return;
+    this._entries.delete(key);
+    this._bytes -= entry.bytes;
+  }
+}
@@ -0,0 +1,83 @@
+/* Priorities of the documents waiting for a trace, higher runs first */
+export const PRIORITY_HIDDEN = 0;
+export const PRIORITY_VISIBLE = 1;
+export const PRIORITY_ACTIVE = 2;
+
+export type PyLiveViewTraceJob = () => Promise<unknown>;
+
+export function pyLiveViewTraceSchedulerFactory(
+  limit: () => number,
+  priorityOf: (fileName: string) => number,
+): PyLiveViewTraceScheduler {
+  return new PyLiveViewTraceScheduler(limit, priorityOf);
+}
+
+/*
+ * Keeps at most `limit()` traces running. Every document has at most one
+ * job waiting, a newer request replaces it. Waiting documents start by
+ * priority, hidden ones (PRIORITY_HIDDEN) wait until a `pump` finds them
+ * visible.
+ */
+export class PyLiveViewTraceScheduler {
+  private _pending = new Map<string, PyLiveViewTraceJob>();
+  /* Token of the job in flight per document */
+  private _running = new Map<string, object>();
+
+  constructor(
+    private _limit: () => number,
+    private _priorityOf: (fileName: string) => number,
+  ) { }
+
+  public schedule = (fileName: string, job: PyLiveViewTraceJob): void => {
+    this._pending.set(fileName, job);
+    this.pump();
+  };
+
+  /* Starts what fits, call again when the priorities changed. */
+  public pump = (): void => {
+    for (let fileName = this.next(); fileName !== undefined; fileName = this.next())
+      this.start(fileName);
+  };
+
+  public clear = (): void => {
+    this._pending.clear();
+    this._running.clear();
+  };
+
+  public get pendingCount(): number {
+    return this._pending.size;
+  }
+
+  public get runningCount(): number {
+    return this._running.size;
+  }
+
+  private next(): string | undefined {
+    const full = this._running.size >= Math.max(1, this._limit());
+    let best: string | undefined;
+    let bestPriority = PRIORITY_HIDDEN;
+    for (const fileName of this._pending.keys()) {
+      // The tracer cancels a document's run in flight when the next one
+      // starts, so that one doesn't take another slot.
+      if (full && !this._running.has(fileName)) continue;
+      const priority = this._priorityOf(fileName);
+      if (priority > bestPriority) {
+        best = fileName;
+        bestPriority = priority;
+      }
+    }
+    return best;
+  }
+
+  private start(fileName: string): void {
+    const job = this._pending.get(fileName) as PyLiveViewTraceJob;
+    this._pending.delete(fileName);
+    const token = {};
+    this._running.set(fileName, token);
+    const done = () => {
+      if (this._running.get(fileName) === token) this._running.delete(fileName);
+      this.pump();
+    };
+    Promise.resolve().then(job).then(done, done);
+  }
+}
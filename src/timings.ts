@@ -0,0 +1,48 @@
+import { clamp } from "./utils";
+
+/* Weight of the newest run in the moving estimate */
+const DURATION_SMOOTHING = 0.3;
+
+export function pyLiveViewTraceTimingsFactory(): PyLiveViewTraceTimings {
+  return new PyLiveViewTraceTimings();
+}
+
+/*
+ * Moving estimate of how long each file takes to trace, and when its last
+ * run started. Fast files get updated right away, slow ones wait for a
+ * pause in typing and for their previous run to be about done.
+ */
+export class PyLiveViewTraceTimings {
+  private _estimates = new Map<string, number>();
+  private _starts = new Map<string, number>();
+
+  public started = (fileName: string, now = Date.now()): void => {
+    this._starts.set(fileName, now);
+  };
+
+  public record = (fileName: string, seconds: number): void => {
+    const previous = this._estimates.get(fileName);
+    this._estimates.set(
+      fileName,
+      previous === undefined ? seconds : previous + DURATION_SMOOTHING * (seconds - previous)
+    );
+  };
+
+  public estimate = (fileName: string): number | undefined => {
+    return this._estimates.get(fileName);
+  };
+
+  /*
+   * Milliseconds to wait after an edit: half the estimate of quiet time,
+   * and at least the estimate since the last run started. Both within
+   * [min, max], and `min` until a run was timed.
+   */
+  public delayFor = (fileName: string, min: number, max: number, now = Date.now()): number => {
+    const estimate = this._estimates.get(fileName);
+    if (estimate === undefined) return min;
+    const interval = clamp(min, max, estimate * 1000);
+    const debounce = clamp(min, max, estimate * 500);
+    const start = this._starts.get(fileName);
+    return start === undefined ? debounce : Math.max(debounce, start + interval - now);
+  };
+}
@@ -1,74 +1,392 @@
 import * as path from "path";
 import { spawn } from "child_process"
-import { indexOrLast } from "./utils";
-import type { PyLiveViewTracerInterface, TracerParsedResultTuple } from "./types";
+import type { ChildProcess } from "child_process"
+import { TraceCancelledError } from "./errors";
+import type {
+  PyLiveViewAttachInterface,
+  PyLiveViewLiveLineResult,
+  PyLiveViewTraceLineResult,
+  PyLiveViewTracerInterface,
+  PyLiveViewTracerStats,
+  TracerParsedResultTuple,
+} from "./types";
+
+const NEWLINE = 0x0a;
+
+/*
+ * Splits a byte stream into lines. Chunks are only joined (and decoded)
+ * once a line is complete, so long lines cost one copy and multi-byte
+ * characters split across chunks decode fine.
+ */
+export class LineReader {
+  private pending: Buffer[] = [];
+
+  constructor(private onLine: (line: string) => void) { }
+
+  public push = (chunk: Buffer): void => {
+    let start = 0;
+    let newline = chunk.indexOf(NEWLINE);
+    while (newline !== -1) {
+      this.pending.push(chunk.subarray(start, newline));
+      this.flushLine();
+      start = newline + 1;
+      newline = chunk.indexOf(NEWLINE, start);
+    }
+    if (start < chunk.length) this.pending.push(chunk.subarray(start));
+  }
+
+  /* The stream is done, a last line without a newline is still a line. */
+  public end = (): void => {
+    if (this.pending.length) this.flushLine();
+  }
+
+  private flushLine(): void {
+    const line = this.pending.length === 1 ? this.pending[0] : Buffer.concat(this.pending);
+    this.pending = [];
+    const text = line.toString("utf8");
+    this.onLine(text.endsWith("\r") ? text.slice(0, -1) : text);
+  }
+}
+
+/*
+ * Incremental parser for the tracer's stdout. `PLV_STATS:` and `PLV:`
+ * records are picked up as their lines complete, every `PLV:` record is
+ * a batch of results (handed to `onBatch` as it arrives) and everything
+ * else is the script's own output.
+ */
+export class TracerOutputReader {
+  private lines = new LineReader(line => this.onLine(line));
+  private stdout: string[] = [];
+  private results: PyLiveViewTraceLineResult[] | undefined = undefined;
+  private stats: PyLiveViewTracerStats | undefined = undefined;
+
+  constructor(private onBatch?: (batch: PyLiveViewTraceLineResult[]) => void) { }
+
+  public push = (chunk: Buffer): void => this.lines.push(chunk);
+
+  public end = (): void => this.lines.end();
+
+  /* A line split off the stream elsewhere (see PythonCellWorker). */
+  public pushLine = (line: string): void => this.onLine(line);
+
+  public get result(): TracerParsedResultTuple {
+    return [this.results, this.stdout.join(""), this.stats];
+  }
+
+  private onLine(line: string): void {
+    if (line.startsWith("PLV_STATS:")) {
+      try {
+        this.stats = JSON.parse(line.slice("PLV_STATS:".length));
+      } catch (err) {
+        console.error("Error parsing Python tracer stats.", err);
+      }
+    } else if (line.startsWith("PLV:")) {
+      try {
+        const batch: PyLiveViewTraceLineResult[] = JSON.parse(line.slice("PLV:".length));
+        const results = this.results ?? (this.results = []);
+        for (const entry of batch) results.push(entry);
+        this.onBatch?.(batch);
+      } catch (err) {
+        console.error("Error parsing Python tracer output.", err);
+      }
+    } else {
+      this.stdout.push(line + "\n");
+    }
+  }
+}
+
+/* A cell run can include the file's slow setup cells (only the first time) */
+const CELL_RUN_TIMEOUT = 2 * 60 * 1000;
+
+/* Tail of the worker's stderr kept for the error of a run it dies in */
+export const CELL_STDERR_BYTES = 16 * 1024;
+
+interface CellRequest {
+  source: string;
+  resolve: (result: TracerParsedResultTuple) => void;
+  reject: (reason: unknown) => void;
+}
+
+/*
+ * Cell mode: a long-lived `pyliveview.py --cells FILE` keeping the file's
+ * namespace between runs, so only the edited `# %%` cells (and the ones
+ * after them) run again. It takes one request at a time, one still
+ * waiting for it is replaced (rejected as cancelled) by a newer one.
+ */
+export class PythonCellWorker {
+  private running: { request: CellRequest; reader: TracerOutputReader; timeout: NodeJS.Timeout } | null = null;
+  private waiting: CellRequest | null = null;
+  private closed = false;
+  private lines = new LineReader(line => this.running?.reader.pushLine(line));
+  /* The last CELL_STDERR_BYTES the worker wrote since its current run started */
+  private stderr = Buffer.alloc(0);
+
+  constructor(
+    public pythonPath: string,
+    private python: ChildProcess,
+    private kill: (python: ChildProcess) => void,
+  ) {
+    python.stdin?.on("error", () => undefined);
+    python.stdout?.on("data", this.lines.push);
+    python.stderr?.on("data", (data: Buffer) => {
+      const stderr = Buffer.concat([this.stderr, data]);
+      this.stderr = stderr.length > CELL_STDERR_BYTES ? Buffer.from(stderr.subarray(-CELL_STDERR_BYTES)) : stderr;
+    });
+    python.on("error", (err: Error) => this.onClose(err.message));
+    python.on("close", (code: number | null) => this.onClose(
+      this.stderr.toString() || `PyLiveView cell worker exited with code ${code}`
+    ));
+  }
+
+  public get alive(): boolean {
+    return !this.closed;
+  }
+
+  public run = (source: string): Promise<TracerParsedResultTuple> => {
+    return new Promise((resolve, reject) => {
+      if (this.closed) {
+        reject("PyLiveView cell worker is gone");
+        return;
+      }
+      this.waiting?.reject(new TraceCancelledError("Cell run was superseded"));
+      this.waiting = { source, resolve, reject };
+      this.next();
+    });
+  }
+
+  public close = (): void => {
+    this.kill(this.python);
+    this.onClose(new TraceCancelledError("Cell worker was stopped"));
+  }
+
+  private next(): void {
+    if (this.running || !this.waiting) return;
+    const request = this.waiting;
+    this.waiting = null;
+    const startedAt = Date.now();
+    // Every answer ends with its `PLV:` record.
+    const reader = new TracerOutputReader(() => {
+      clearTimeout(timeout);
+      this.running = null;
+      const result = reader.result;
+      if (result[2]) result[2].wall_seconds = (Date.now() - startedAt) / 1000;
+      request.resolve(result);
+      this.next();
+    });
+    // Killing it loses the namespace, the next run starts a new worker.
+    const timeout = setTimeout(() => this.kill(this.python), CELL_RUN_TIMEOUT);
+    this.running = { request, reader, timeout };
+    // Warnings of earlier runs are no reason for this one's failure.
+    this.stderr = Buffer.alloc(0);
+    this.python.stdin?.write(JSON.stringify({ source: request.source }) + "\n", "utf8");
+  }
+
+  private onClose(reason: unknown): void {
+    if (this.closed) return;
+    this.closed = true;
+    if (this.running) {
+      clearTimeout(this.running.timeout);
+      this.running.request.reject(reason);
+      this.running = null;
+    }
+    this.waiting?.reject(reason);
+    this.waiting = null;
+  }
+}
 
 export function pythonTracerFactory(): PythonTracer {
   return new PythonTracer();
 }
 
+interface TraceRun {
+  generation: number;
+  cancel: () => void;
+}
+
+/* Environment of the tracer process for the given options */
+export function tracerEnv(options: Pick<PyLiveViewTracerInterface, "hotLineLimit">): Record<string, string> {
+  return options.hotLineLimit === undefined
+    ? {}
+    : { PYLIVEVIEW_HOT_LINE_LIMIT: String(options.hotLineLimit) };
+}
+
 export class PythonTracer {
+  private nextGeneration = 0;
+  /* Newest generation started per file, and the run (if any) still going. */
+  private latestGenerations = new Map<string, number>();
+  private runs = new Map<string, TraceRun>();
+  private cellWorkers = new Map<string, PythonCellWorker>();
 
   public tracePythonScript = async (
     options: PyLiveViewTracerInterface,
   ): Promise<TracerParsedResultTuple> => {
     return new Promise((resolve, reject) => {
-      const { fileName, pythonPath, rootDir } = options
+      const { fileName, pythonPath, rootDir, sampleInterval, source } = options
+      const generation = options.generation ?? ++this.nextGeneration;
 
       console.log(`[PyLiveView DEBUG] Tracing: python=${pythonPath}, file=${fileName}, rootDir=${rootDir}`);
 
-      if (this.tracerTimeout !== null) {
-        clearTimeout(this.tracerTimeout)
+      // Something newer for this file started already, don't even spawn.
+      if (generation < (this.latestGenerations.get(fileName) ?? -Infinity)) {
+        reject(new TraceCancelledError(`Trace ${generation} of ${fileName} was superseded`));
+        return;
       }
+      this.latestGenerations.set(fileName, generation);
+      this.runs.get(fileName)?.cancel();
 
-      const python = this.getPythonRunner(pythonPath, rootDir, fileName);
-      this.tracerTimeout = setTimeout(function () { python.kill() }, 15 * 1000);
+      const startedAt = Date.now();
+      const args = [
+        ...(sampleInterval ? ["--sample", String(sampleInterval)] : []),
+        ...(source === undefined ? [fileName] : ["--stdin", "--filename", fileName]),
+      ];
+      const python = this.getPythonRunner(pythonPath, rootDir, args, tracerEnv(options));
+      // The tracer may be gone before reading it all (ie: a startup error),
+      // that is reported through stderr and the exit code instead.
+      python.stdin.on("error", () => undefined);
+      python.stdin.end(source ?? "", "utf8");
+      const tracerTimeout = setTimeout(() => this.killProcessTree(python), 15 * 1000);
 
       // Safety timeout: if no output after 13 seconds, assume tracer stalled
       // and return empty result to prevent hanging
       const safetyTimeout = setTimeout(() => {
         console.log(`[PyLiveView DEBUG] Safety timeout triggered - no output from tracer`);
-        try {
-          python.kill();
-        } catch (e) {
-          // ignore
-        }
+        this.killProcessTree(python);
         // Return empty parsed result to allow test to proceed
         const emptyResult: TracerParsedResultTuple = [[], ''];
         resolve(emptyResult);
       }, 13000);
 
+      const run: TraceRun = {
+        generation,
+        cancel: () => {
+          clearTimeout(tracerTimeout);
+          clearTimeout(safetyTimeout);
+          this.killProcessTree(python);
+          reject(new TraceCancelledError(`Trace ${generation} of ${fileName} was superseded`));
+        },
+      };
+      this.runs.set(fileName, run);
+
+      const reader = new TracerOutputReader();
+      const stderr: Buffer[] = [];
+
       python.stderr.on("data", (data: Buffer) => {
         console.log(`[PyLiveView DEBUG] stderr: ${data.toString()}`);
-        clearTimeout(safetyTimeout);
-        reject(data.toString());
+        stderr.push(data);
       });
 
       python.stdout.on("data", (data: Buffer): void => {
-        console.log(`[PyLiveView DEBUG] stdout received, length: ${data.length}`);
         clearTimeout(safetyTimeout);
-        resolve(this.tryParsePythonData(data));
+        reader.push(data);
+      });
+
+      python.on("error", (err: Error) => {
+        clearTimeout(safetyTimeout);
+        reject(err.message);
+      });
+
+      // Only decide once both pipes are drained and the exit code is known,
+      // stderr and the end of stdout can arrive in any order.
+      python.on("close", (code: number | null) => {
+        clearTimeout(tracerTimeout);
+        clearTimeout(safetyTimeout);
+        if (this.runs.get(fileName) === run) this.runs.delete(fileName);
+        reader.end();
+        const result = reader.result;
+        const errors = Buffer.concat(stderr).toString();
+        // Errors in the script are part of the results, stderr only fails
+        // the run when the tracer itself failed or never got to its results.
+        if (errors && (code !== 0 || result[0] === undefined)) {
+          reject(errors);
+          return;
+        }
+        if (result[0] === undefined && code !== 0) {
+          reject(`PyLiveView tracer exited with code ${code}`);
+          return;
+        }
+        if (result[2]) result[2].wall_seconds = (Date.now() - startedAt) / 1000;
+        resolve(result);
       });
     })
   }
 
-  public getPythonMajorVersion(pythonPath: string): Promise<string> {
-    const child = spawn(pythonPath, ['--version']);
-    return new Promise((resolve, reject) => {
-      child.stderr.on('data', err => {
-        reject(err)
-      })
-      child.stdout.on('data', (data: Buffer) => {
-        resolve(data.toString().split(' ')[1].split('.')[0])
-      })
-    })
+  /*
+   * Attach mode: runs `pyliveview.py --attach PID FILE`, which injects the
+   * tracer into a running process and prints a `PLV_LIVE:` record every
+   * time some lines of FILE got new values. Kill the returned process to
+   * detach.
+   */
+  public attachToProcess = (
+    options: PyLiveViewAttachInterface,
+    onUpdate: (lines: PyLiveViewLiveLineResult[]) => void,
+    onError: (message: string) => void,
+  ): ChildProcess => {
+    const { fileName, pythonPath, rootDir, pid } = options
+    const python = this.getPythonRunner(pythonPath, rootDir, ["--attach", String(pid), fileName]);
+    const lines = new LineReader((record: string) => {
+      if (!record.startsWith("PLV_LIVE: ")) return;
+      try {
+        onUpdate(JSON.parse(record.slice("PLV_LIVE: ".length)));
+      } catch (err) {
+        console.error("Error parsing PyLiveView live record.", err);
+      }
+    });
+
+    python.stderr?.on("data", (data: Buffer) => onError(data.toString()));
+    python.stdout?.on("data", lines.push);
+    return python;
+  }
+
+  /* Runs `source` in the file's cell mode worker, started on first use. */
+  public traceCells = (options: PyLiveViewTracerInterface): Promise<TracerParsedResultTuple> => {
+    const { fileName, pythonPath, rootDir, source } = options;
+    let worker = this.cellWorkers.get(fileName);
+    if (worker?.alive && worker.pythonPath !== pythonPath) worker.close();
+    if (!worker?.alive) {
+      const python = this.getPythonRunner(pythonPath, rootDir, ["--cells", fileName], tracerEnv(options));
+      worker = new PythonCellWorker(pythonPath, python, child => this.killProcessTree(child));
+      this.cellWorkers.set(fileName, worker);
+    }
+    return worker.run(source ?? "");
+  }
+
+  /* Stops the cell mode workers, their namespaces are gone. */
+  public closeCellWorkers = (): void => {
+    for (const worker of this.cellWorkers.values()) worker.close();
+    this.cellWorkers.clear();
+  }
+
+  /* Stops every run still in flight (their promises reject as cancelled). */
+  public cancelAll = (): void => {
+    for (const run of [...this.runs.values()]) run.cancel();
+    this.runs.clear();
   }
 
-  private tracerTimeout: null | NodeJS.Timeout = null;
+  /*
+   * The traced script may have started processes of its own, so the whole
+   * tree goes. On POSIX the tracer leads its own process group (see
+   * getPythonRunner), Windows has taskkill /T for that.
+   */
+  private killProcessTree(child: ChildProcess): void {
+    if (child.pid === undefined || child.exitCode !== null || child.signalCode !== null) return;
+    try {
+      if (process.platform === "win32") {
+        spawn("taskkill", ["/pid", String(child.pid), "/T", "/F"]);
+      } else {
+        process.kill(-child.pid, "SIGKILL");
+      }
+    } catch (err) {
+      child.kill("SIGKILL");
+    }
+  }
 
-  private getPythonRunner(pythonPath: string, rootDir: string, scriptName: string) {
+  private getPythonRunner(pythonPath: string, rootDir: string, args: string[], env: Record<string, string> = {}) {
     const pyLiveViewScriptPath: string = path.join(rootDir, "scripts/pyliveview.py");
-    const options = { env: { ...process.env } as Record<string, string> }
+    const options = {
+      env: { ...process.env, ...env } as Record<string, string>,
+      // Own process group, so killProcessTree can reach the script's children.
+      detached: process.platform !== "win32",
+    }
 
     /* Copied from https://github.com/Almenon/AREPL-backend/blob/209eb5b8ae8cda1677f925749a10cd263f6d9860/index.ts#L85-L93 */
     if (process.platform == "darwin") {
@@ -81,25 +399,6 @@ export class PythonTracer {
       options.env.PYTHONIOENCODING = 'utf8'
     }
 
-    return spawn(pythonPath, [pyLiveViewScriptPath, scriptName], options);
-  }
-
-  private tryParsePythonData = (buffer: Buffer): TracerParsedResultTuple => {
-    const asString: string = buffer.toString();
-    const index: number = indexOrLast(asString, "PLV:");
-    if (index !== -1) {
-      try {
-        // indexOrLast already returns position AFTER "PLV:", so just slice from index
-        return [
-          JSON.parse(asString.slice(index)), // Trace Results (JSON starts here)
-          asString.slice(0, index - "PLV:".length),  // Everything before PLV:
-        ];
-      } catch (err) {
-        console.error("Error parsing Python tracer output.");
-        console.error(asString);
-        console.error(err);
-      }
-    }
-    return [undefined, asString];
+    return spawn(pythonPath, [pyLiveViewScriptPath, ...args], options);
   }
 }
@@ -1,6 +1,5 @@
 import type {
   DecorationOptions,
-  Range,
   TextEditor,
   TextEditorDecorationType
 } from "vscode";
@@ -24,26 +23,22 @@ export interface PyLiveViewGutterDecorationOptions {
 
 export type PyLiveViewResponse = Record<string, string>
 
+/* Everything a line was annotated with, formatted only when it's rendered */
 export interface PyLiveViewLineDecoration {
-  data: string[];
   lineno: number;
+  results: PyLiveViewTraceLineResult[];
   error: boolean;
   loop?: boolean;
-  source?: string;
-  pretty: string[];
-  calls?: number;
+  /* The line was edited since these results came in */
+  stale?: boolean;
 }
 
-export interface PyLiveViewDecorationMapping {
-  [id: string]: PyLiveViewLineDecoration;
-}
+export type PyLiveViewDecorationMapping = Map<number, PyLiveViewLineDecoration>;
 
 export interface PyLiveViewDecorationOptions {
-  range: Range;
   text: string;
-  hoverText: string;
   color: PyLiveViewColorSelection;
-  language?: "python" | string;
+  stale?: boolean;
 }
 
 export interface PyLiveViewStandardDecorationTypes {
@@ -68,12 +63,75 @@ export interface PyLiveViewTraceLineResult {
 }
 
 export type PyLiveViewParsedTraceResults = PyLiveViewTraceLineResult[] | null | undefined;
-export type TracerParsedResultTuple = [PyLiveViewParsedTraceResults, string]
+export type TracerParsedResultTuple = [PyLiveViewParsedTraceResults, string, PyLiveViewTracerStats?]
+
+/* Mirrors the `PLV_STATS:` record printed by scripts/pyliveview.py */
+export interface PyLiveViewTracerStats {
+  events: number;
+  events_filtered: number;
+  /* Line events skipped because the line was hot (see HOT_LINE_LIMIT) */
+  events_backed_off: number;
+  entries: number;
+  output_bytes: number;
+  load_seconds: number;
+  run_seconds: number;
+  compile_seconds: number;
+  result_handler_seconds: number;
+  parse_eval_seconds: number;
+  deepcopy_seconds: number;
+  serialize_seconds: number;
+  /* lineno -> exact hits, for the lines that backed off */
+  hot_lines?: Record<string, number>;
+  /* Sampling mode only: samples taken, and lineno -> share of the samples */
+  samples?: number;
+  line_share?: Record<string, number>;
+  /* Cell mode only: cells kept from the last run, cells run, time spent on namespace snapshots */
+  cells_reused?: number;
+  cells_run?: number;
+  snapshot_seconds?: number;
+  /* Why tracing the same source again could give other results (empty: it can't) */
+  uncacheable?: string[];
+  /* Added by the extension: spawn to exit (a cell run: request to result), as seen from node */
+  wall_seconds?: number;
+}
+
+/* How a session traces: every line, by sampling, or cell by cell in a worker */
+export type PyLiveViewSessionMode = "trace" | "sampled" | "cells";
 
 export interface PyLiveViewTracerInterface {
   pythonPath: string;
   fileName: string;
   rootDir: string;
+  /* Sample every N ms instead of tracing every line */
+  sampleInterval?: number;
+  /* Hits after which a line is only recorded on hit 2N, 4N, .. and its last (0 records every hit) */
+  hotLineLimit?: number;
+  /* Text to trace as `fileName`, piped over stdin (the file isn't read) */
+  source?: string;
+  /* Increases with every request, a run supersedes the older ones of its file */
+  generation?: number;
+}
+
+export interface PyLiveViewAttachInterface extends PyLiveViewTracerInterface {
+  pid: number;
+}
+
+/* Mirrors the per-line aggregates of the `PLV_LIVE:` records (attach mode) */
+export interface PyLiveViewLiveLineResult {
+  lineno: number;
+  source: string;
+  value: string;
+  error: boolean;
+  hits: number;
 }
 
 export type ActiveTextEditorChangeEventResult = TextEditor | undefined;
+
+/* What a probe of the configured interpreter found, cached per interpreter */
+export interface PyLiveViewInterpreterInfo {
+  executable: string;
+  version: string;
+  /* sys.monitoring (PEP 669), 3.12+ */
+  monitoring: boolean;
+  numpy: boolean;
+}
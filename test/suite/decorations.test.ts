@@ -8,7 +8,14 @@ import { join } from "path";
 
 import * as vscode from "vscode";
 import { PyLiveViewAPI } from "../../src/api";
-import { openAndShowTextDocument } from "./helpers";
+import { PyLiveViewDecorationsController } from "../../src/decorations";
+import { PyLiveViewHoverProvider } from "../../src/hover";
+import type { PyLiveViewInterpreterController } from "../../src/interpreter";
+import type { PyLiveViewOutputController } from "../../src/output";
+import { pyLiveViewSessionStoreFactory } from "../../src/sessions";
+import type { PythonTracer } from "../../src/tracer";
+import type { PyLiveViewParsedTraceResults } from "../../src/types";
+import { createTextDocument, openAndShowTextDocument, sleep } from "./helpers";
 
 suite("Extension Tests", () => {
   test("Should generate decorations", async () => {
@@ -34,3 +41,148 @@ suite("Extension Tests", () => {
     })
   }).timeout(30000); // This can sometimes take awhile on CI servers.
 });
+
+suite("Viewport Decoration Tests", () => {
+  test("Only the lines around the viewport are rendered", async () => {
+    const lineCount = 5000;
+    const content = Array.from({ length: lineCount }, (_, i) => `x${i} = ${i}`).join("\n");
+    const editor = await vscode.window.showTextDocument(await createTextDocument(content, "python"));
+
+    const controller = new PyLiveViewDecorationsController({} as vscode.ExtensionContext);
+    controller.prepareParsedPythonData(Array.from({ length: lineCount }, (_, i) => ({
+      lineno: i + 1, source: `x${i}`, value: String(i), kind: "line", pretty: String(i), error: false, calls: 1,
+    })));
+    controller.setPreparedDecorationsForEditor(editor);
+
+    const rendered = controller.getPreparedDecorations().success;
+    assert.ok(rendered.length > 0 && rendered.length < lineCount / 2);
+    const firstVisible = editor.visibleRanges[0].start.line;
+    assert.ok(rendered.some(decoration => decoration.range.start.line === firstVisible));
+    assert.strictEqual(controller.needsRender(editor), false);
+
+    editor.revealRange(new vscode.Range(lineCount - 1, 0, lineCount - 1, 0));
+    await sleep(200);
+    assert.strictEqual(controller.needsRender(editor), true);
+    controller.setPreparedDecorationsForEditor(editor);
+    const lines = controller.getPreparedDecorations().success.map(decoration => decoration.range.start.line);
+    assert.ok(lines.includes(lineCount - 1));
+    assert.strictEqual(controller.needsRender(editor), false);
+  }).timeout(10000);
+});
+
+suite("Background Editor Tests", () => {
+  test("Scrolling an editor that isn't the active one renders its own file's results", async () => {
+    const lineCount = 2000;
+    const content = (name: string) => Array.from({ length: lineCount }, (_, i) => `${name}${i} = ${i}`).join("\n");
+    const results = (name: string) => Array.from({ length: lineCount }, (_, i) => ({
+      lineno: i + 1, source: `${name}${i}`, value: `${name}${i}`, kind: "line", pretty: `${name}${i}`, error: false, calls: 1,
+    }));
+    const background = await vscode.window.showTextDocument(await createTextDocument(content("a"), "python"), vscode.ViewColumn.One);
+    const active = await vscode.window.showTextDocument(await createTextDocument(content("b"), "python"), vscode.ViewColumn.Two);
+
+    const context = {} as vscode.ExtensionContext;
+    const controller = new PyLiveViewDecorationsController(context);
+    const sessions = pyLiveViewSessionStoreFactory();
+    const api = new PyLiveViewAPI(
+      context, {} as PyLiveViewOutputController, controller, sessions, {} as PythonTracer, {} as PyLiveViewInterpreterController,
+    );
+    const internals = api as unknown as {
+      applyResults(fileName: string, data: PyLiveViewParsedTraceResults): void;
+      backgroundDecorations(fileName: string): PyLiveViewDecorationsController;
+    };
+    sessions.createSessionFromEditor(background);
+    sessions.createSessionFromEditor(active);
+    internals.applyResults(background.document.fileName, results("a"));
+    internals.applyResults(active.document.fileName, results("b"));
+
+    background.revealRange(new vscode.Range(lineCount - 1, 0, lineCount - 1, 0));
+    await sleep(200);
+    api.refreshVisibleDecorations(background);
+
+    const painted = internals.backgroundDecorations(background.document.fileName).getPreparedDecorations().success;
+    assert.ok(painted.some(decoration => decoration.range.start.line === lineCount - 1));
+    assert.ok(painted.every(decoration => !String(decoration.renderOptions?.after?.contentText).includes("b")));
+    // The active editor's annotations stay where they are.
+    assert.strictEqual(controller.getLineDecoration(1)?.results[0].value, "b0");
+  }).timeout(10000);
+});
+
+suite("Edit Remapping Tests", () => {
+  const results = (...linenos: number[]) => linenos.map(lineno => ({
+    lineno, source: `x${lineno}`, value: String(lineno), kind: "line", pretty: String(lineno), error: false, calls: 1,
+  }));
+
+  async function annotate(content: string, ...linenos: number[]) {
+    const editor = await vscode.window.showTextDocument(await createTextDocument(content, "python"));
+    const controller = new PyLiveViewDecorationsController({} as vscode.ExtensionContext);
+    controller.prepareParsedPythonData(results(...linenos));
+    return { editor, controller };
+  }
+
+  function change(startLine: number, startChar: number, endLine: number, endChar: number, text: string) {
+    return { range: new vscode.Range(startLine, startChar, endLine, endChar), rangeOffset: 0, rangeLength: 0, text };
+  }
+
+  function rendered(controller: PyLiveViewDecorationsController, editor: vscode.TextEditor) {
+    controller.setPreparedDecorationsForEditor(editor);
+    return controller.getPreparedDecorations().success.map(decoration => [
+      decoration.range.start.line + 1,
+      decoration.renderOptions?.after?.contentText,
+      decoration.renderOptions?.after?.fontStyle === "italic",
+    ]);
+  }
+
+  test("Lines inserted above move the annotations down", async () => {
+    const { editor, controller } = await annotate("a\nb\nc\nd\ne\nf", 1, 2, 3);
+    assert.ok(controller.shiftForContentChanges(editor.document, [change(1, 0, 1, 0, "new\nnew\n")]));
+    assert.deepStrictEqual(rendered(controller, editor), [[1, "1", false], [4, "2", false], [5, "3", false]]);
+  });
+
+  test("Deleted lines lose their annotations", async () => {
+    const { editor, controller } = await annotate("a\nb\nc\nd", 1, 2, 3, 4);
+    controller.shiftForContentChanges(editor.document, [change(1, 0, 3, 0, "")]);
+    assert.deepStrictEqual(rendered(controller, editor), [[1, "1", false], [2, "4", false]]);
+  });
+
+  test("Edited lines are dimmed, pressing enter at the end of one isn't an edit", async () => {
+    // The document as it is after the enter (line 2 is the new one).
+    const { editor, controller } = await annotate("a = 1\n\nb = 2\nc = 3\nd = 4", 1, 2, 3);
+    controller.shiftForContentChanges(editor.document, [change(0, 5, 0, 5, "\n")]);
+    controller.shiftForContentChanges(editor.document, [change(2, 4, 2, 5, "9")]);
+    assert.deepStrictEqual(rendered(controller, editor), [[1, "1", false], [3, "2", true], [4, "3", false]]);
+    // Dimmed through a translucent color, attachments have no opacity.
+    const colors = controller.getPreparedDecorations().success.map(decoration => decoration.renderOptions?.after?.color);
+    assert.deepStrictEqual(colors, ["#6495ed", "#6495ed73", "#6495ed"]);
+  });
+});
+
+suite("Hover Tests", () => {
+  const makeProvider = async () => {
+    const document = await createTextDocument("x = [1, 2]\ny = x\n", "python");
+    const controller = new PyLiveViewDecorationsController({} as vscode.ExtensionContext);
+    controller.prepareParsedPythonData([
+      { lineno: 1, source: "x", value: "[1, 2]", kind: "line", pretty: "[1, 2]", error: false, calls: 1 },
+    ]);
+    const api = { decorationsForDocument: () => controller } as unknown as PyLiveViewAPI;
+    return { document, controller, provider: new PyLiveViewHoverProvider(api) };
+  };
+
+  test("Only hovered lines with results get a hover", async () => {
+    const { document, provider } = await makeProvider();
+    const hover = provider.provideHover(document, new vscode.Position(0, 0));
+    assert.ok(hover);
+    assert.strictEqual((hover.contents[0] as vscode.MarkdownString).value.includes("[1, 2]"), true);
+    assert.strictEqual(provider.provideHover(document, new vscode.Position(1, 0)), undefined);
+  });
+
+  test("Hovers are reused until the line gets new results", async () => {
+    const { document, controller, provider } = await makeProvider();
+    const first = provider.provideHover(document, new vscode.Position(0, 0));
+    assert.strictEqual(provider.provideHover(document, new vscode.Position(0, 0)), first);
+
+    controller.getLineDecoration(1)?.results.push(
+      { lineno: 1, source: "x", value: "[3]", kind: "line", pretty: "[3]", error: false, calls: 2 }
+    );
+    assert.notStrictEqual(provider.provideHover(document, new vscode.Position(0, 0)), first);
+  });
+});
@@ -0,0 +1,48 @@
+import * as assert from "assert";
+import { promises as fs } from "fs";
+
+import type { ExtensionContext } from "vscode";
+import { PyLiveViewInterpreterController, probeInterpreter } from "../../src/interpreter";
+
+/* Just enough of an ExtensionContext for the probe cache. */
+function fakeContext(): ExtensionContext {
+  const state = new Map<string, unknown>();
+  return {
+    subscriptions: [],
+    globalState: {
+      get: (key: string) => state.get(key),
+      update: async (key: string, value: unknown) => { state.set(key, value); },
+    },
+  } as unknown as ExtensionContext;
+}
+
+suite("Interpreter Probe Tests", () => {
+  test("Probes the version and capabilities", async () => {
+    const pythonPath = await new PyLiveViewInterpreterController(fakeContext()).getPythonPath();
+    const info = await probeInterpreter(pythonPath);
+
+    assert.match(info.version, /^3\.\d+\.\d+$/);
+    assert.strictEqual(info.monitoring, parseInt(info.version.split(".")[1], 10) >= 12);
+    await fs.access(info.executable);
+  }).timeout(10000);
+
+  test("Probes once, then reuses the persisted probe until the interpreter changes", async () => {
+    const context = fakeContext();
+    const controller = new PyLiveViewInterpreterController(context);
+    const pythonPath = await controller.getPythonPath();
+    const probed = await controller.getInterpreterInfo();
+    const [key] = Object.keys(context.globalState.get<Record<string, unknown>>("pyliveview.interpreterProbes") ?? {});
+    assert.strictEqual(key, pythonPath);
+
+    // Poison the persisted probe so we can tell it was reused, not probed again.
+    const { mtimeMs } = await fs.stat(probed.executable);
+    const poisoned = { ...probed, version: "3.99.0" };
+    await context.globalState.update("pyliveview.interpreterProbes", { [pythonPath]: { mtimeMs, info: poisoned } });
+    controller.invalidate();
+    assert.strictEqual((await controller.getInterpreterInfo()).version, "3.99.0");
+
+    await context.globalState.update("pyliveview.interpreterProbes", { [pythonPath]: { mtimeMs: mtimeMs - 1, info: poisoned } });
+    controller.invalidate();
+    assert.strictEqual((await controller.getInterpreterInfo()).version, probed.version);
+  }).timeout(10000);
+});
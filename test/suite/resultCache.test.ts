@@ -0,0 +1,55 @@
+import * as assert from "assert";
+
+import { PyLiveViewResultCache } from "../../src/resultCache";
+import { tracerEnv } from "../../src/tracer";
+import type { PyLiveViewTracerStats, TracerParsedResultTuple } from "../../src/types";
+
+/* A run whose serialized results took `bytes`, flagged with `uncacheable`. */
+function run(value: string, bytes: number, uncacheable: string[] = []): TracerParsedResultTuple {
+  const stats = { output_bytes: bytes, uncacheable } as unknown as PyLiveViewTracerStats;
+  return [[{ lineno: 1, source: "x", value, kind: "line", pretty: value, error: false, calls: 1 }], "", stats];
+}
+
+suite("Result Cache Tests", () => {
+  test("Keys tell the text, the file and the interpreter apart", () => {
+    const key = PyLiveViewResultCache.key("/a/main.py", "python3", "x = 1\n");
+    assert.strictEqual(PyLiveViewResultCache.key("/a/main.py", "python3", "x = 1\n"), key);
+    assert.notStrictEqual(PyLiveViewResultCache.key("/a/main.py", "python3", "x = 2\n"), key);
+    assert.notStrictEqual(PyLiveViewResultCache.key("/b/main.py", "python3", "x = 1\n"), key);
+    assert.notStrictEqual(PyLiveViewResultCache.key("/a/main.py", "python3.12", "x = 1\n"), key);
+  });
+
+  test("Keys tell the tracer's settings apart", () => {
+    const key = PyLiveViewResultCache.key("/a/main.py", "python3", "x = 1\n", tracerEnv({ hotLineLimit: 100 }));
+    assert.notStrictEqual(PyLiveViewResultCache.key("/a/main.py", "python3", "x = 1\n", tracerEnv({ hotLineLimit: 0 })), key);
+    assert.strictEqual(
+      PyLiveViewResultCache.key("/a/main.py", "python3", "x = 1\n", { B: "1", A: "2" }),
+      PyLiveViewResultCache.key("/a/main.py", "python3", "x = 1\n", { A: "2", B: "1" }),
+    );
+  });
+
+  test("Evicts the least recently used results past the byte budget", () => {
+    const cache = new PyLiveViewResultCache(100);
+    cache.set("a", run("a", 40));
+    cache.set("b", run("b", 40));
+    assert.ok(cache.get("a"));
+    cache.set("c", run("c", 40));
+
+    assert.ok(cache.get("a"));
+    assert.strictEqual(cache.get("b"), undefined);
+    assert.ok(cache.get("c"));
+    assert.strictEqual(cache.bytes, 80);
+  });
+
+  test("Only keeps runs the tracer found deterministic", () => {
+    const cache = new PyLiveViewResultCache(100);
+    cache.set("random", run("0.42", 10, ["uses random"]));
+    cache.set("old tracer", [[], "", { output_bytes: 10 } as PyLiveViewTracerStats]);
+    cache.set("too big", run("x", 1000));
+
+    assert.strictEqual(cache.get("random"), undefined);
+    assert.strictEqual(cache.get("old tracer"), undefined);
+    assert.strictEqual(cache.get("too big"), undefined);
+    assert.strictEqual(cache.bytes, 0);
+  });
+});
@@ -0,0 +1,89 @@
+import * as assert from "assert";
+
+import {
+  PRIORITY_ACTIVE,
+  PRIORITY_HIDDEN,
+  PRIORITY_VISIBLE,
+  PyLiveViewTraceScheduler,
+} from "../../src/scheduler";
+
+/* A job that only finishes when told to, and records when it started. */
+function manualJob(started: string[], name: string) {
+  let finish = () => { };
+  const job = () => {
+    started.push(name);
+    return new Promise<void>(resolve => { finish = resolve; });
+  };
+  return { job, finish: () => finish() };
+}
+
+const settle = () => new Promise(resolve => setTimeout(resolve, 0));
+
+suite("Trace Scheduler Tests", () => {
+  test("Never runs more than the limit, the active document first", async () => {
+    const priorities: Record<string, number> = { a: PRIORITY_VISIBLE, b: PRIORITY_VISIBLE, c: PRIORITY_ACTIVE };
+    const scheduler = new PyLiveViewTraceScheduler(() => 1, fileName => priorities[fileName]);
+    const started: string[] = [];
+    const a = manualJob(started, "a");
+    const b = manualJob(started, "b");
+    const c = manualJob(started, "c");
+
+    scheduler.schedule("a", a.job);
+    scheduler.schedule("b", b.job);
+    scheduler.schedule("c", c.job);
+    await settle();
+    assert.deepStrictEqual(started, ["a"]);
+    assert.strictEqual(scheduler.runningCount, 1);
+
+    a.finish();
+    await settle();
+    assert.deepStrictEqual(started, ["a", "c"]);
+    c.finish();
+    await settle();
+    assert.deepStrictEqual(started, ["a", "c", "b"]);
+  });
+
+  test("Requests for the same document coalesce", async () => {
+    const scheduler = new PyLiveViewTraceScheduler(() => 1, () => PRIORITY_VISIBLE);
+    const started: string[] = [];
+    const busy = manualJob(started, "busy");
+    scheduler.schedule("busy", busy.job);
+    for (let i = 0; i < 5; i++)
+      scheduler.schedule("edited", manualJob(started, `edit ${i}`).job);
+    assert.strictEqual(scheduler.pendingCount, 1);
+
+    await settle();
+    busy.finish();
+    await settle();
+    assert.deepStrictEqual(started, ["busy", "edit 4"]);
+  });
+
+  test("Hidden documents wait until they're visible", async () => {
+    let priority = PRIORITY_HIDDEN;
+    const scheduler = new PyLiveViewTraceScheduler(() => 4, () => priority);
+    const started: string[] = [];
+    scheduler.schedule("hidden", manualJob(started, "hidden").job);
+    await settle();
+    assert.deepStrictEqual(started, []);
+
+    priority = PRIORITY_VISIBLE;
+    scheduler.pump();
+    await settle();
+    assert.deepStrictEqual(started, ["hidden"]);
+  });
+
+  test("A newer run of a running document doesn't wait for a slot", async () => {
+    const scheduler = new PyLiveViewTraceScheduler(() => 1, () => PRIORITY_ACTIVE);
+    const started: string[] = [];
+    const first = manualJob(started, "first");
+    scheduler.schedule("doc", first.job);
+    scheduler.schedule("doc", manualJob(started, "second").job);
+    await settle();
+    assert.deepStrictEqual(started, ["first", "second"]);
+
+    // The replaced run finishing doesn't free the slot the newer one holds.
+    first.finish();
+    await settle();
+    assert.strictEqual(scheduler.runningCount, 1);
+  });
+});
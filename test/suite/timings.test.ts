@@ -0,0 +1,34 @@
+import * as assert from "assert";
+
+import { PyLiveViewTraceTimings } from "../../src/timings";
+
+suite("Trace Timings Tests", () => {
+  test("Files never timed use the minimum delay", () => {
+    const timings = new PyLiveViewTraceTimings();
+    assert.strictEqual(timings.delayFor("a.py", 100, 5000), 100);
+  });
+
+  test("The estimate follows recent runs", () => {
+    const timings = new PyLiveViewTraceTimings();
+    timings.record("a.py", 1);
+    assert.strictEqual(timings.estimate("a.py"), 1);
+    for (let i = 0; i < 20; i++) timings.record("a.py", 3);
+    assert.ok(Math.abs((timings.estimate("a.py") ?? 0) - 3) < 0.01);
+  });
+
+  test("Fast files update right away, slow ones wait for their last run", () => {
+    const timings = new PyLiveViewTraceTimings();
+    timings.record("fast.py", 0.02);
+    timings.started("fast.py", 1000);
+    assert.strictEqual(timings.delayFor("fast.py", 100, 5000, 1010), 100);
+
+    timings.record("slow.py", 3);
+    timings.started("slow.py", 1000);
+    // Half a run of quiet, but not before a whole run since the last start.
+    assert.strictEqual(timings.delayFor("slow.py", 100, 5000, 1500), 2500);
+    assert.strictEqual(timings.delayFor("slow.py", 100, 5000, 10000), 1500);
+
+    timings.record("slower.py", 60);
+    assert.strictEqual(timings.delayFor("slower.py", 100, 5000), 5000);
+  });
+});
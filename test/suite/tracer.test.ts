@@ -0,0 +1,180 @@
+import * as assert from "assert";
+import type { ChildProcess } from "child_process";
+import { EventEmitter } from "events";
+import { join } from "path";
+
+import { TraceCancelledError } from "../../src/errors";
+import { CELL_STDERR_BYTES, LineReader, PythonCellWorker, PythonTracer, TracerOutputReader } from "../../src/tracer";
+
+/* Feeds `stream` to a fresh reader, cut into `size` byte chunks. */
+function readInChunks(stream: Buffer, size: number, onBatch?: (batch: unknown[]) => void) {
+  const reader = new TracerOutputReader(onBatch);
+  for (let i = 0; i < stream.length; i += size) reader.push(stream.subarray(i, i + size));
+  reader.end();
+  return reader.result;
+}
+
+/* What `pyliveview.py` prints for a run with `entries` results. */
+function recordedStream(entries: unknown[], stdout = "", newline = "\n"): Buffer {
+  return Buffer.from([
+    stdout + "PYLIVEVIEW_PYTHON_EXECUTABLE: /usr/bin/python3",
+    'PLV_STATS: {"events": 10, "entries": ' + entries.length + "}",
+    "PLV: " + JSON.stringify(entries),
+  ].join(newline) + newline, "utf8");
+}
+
+suite("Tracer Output Reader Tests", () => {
+  const entries = [
+    { lineno: 1, source: "x = 'é✓'", value: "é✓" },
+    { lineno: 2, source: "x", value: "é✓" },
+  ];
+
+  test("Parses a stream cut at every possible point", () => {
+    const stream = recordedStream(entries, "hello\n");
+    for (let size = 1; size <= stream.length; size++) {
+      const [results, stdout, stats] = readInChunks(stream, size);
+      assert.deepStrictEqual(results, entries);
+      assert.strictEqual(stdout, "hello\nPYLIVEVIEW_PYTHON_EXECUTABLE: /usr/bin/python3\n");
+      assert.deepStrictEqual(stats, { events: 10, entries: 2 });
+    }
+  });
+
+  test("Parses outputs larger than a pipe chunk", () => {
+    const many = Array.from({ length: 20000 }, (_, i) => ({ lineno: i, source: "x", value: "✓".repeat(10) }));
+    const stream = recordedStream(many);
+    assert.ok(stream.length > 10 * 65536);
+    const [results] = readInChunks(stream, 65536);
+    assert.deepStrictEqual(results, many);
+  });
+
+  test("Handles CRLF and a missing final newline", () => {
+    const stream = recordedStream(entries, "", "\r\n");
+    const [results, stdout] = readInChunks(stream.subarray(0, stream.length - 2), 7);
+    assert.deepStrictEqual(results, entries);
+    assert.strictEqual(stdout, "PYLIVEVIEW_PYTHON_EXECUTABLE: /usr/bin/python3\n");
+  });
+
+  test("Collects every result batch as it arrives", () => {
+    const batches: unknown[][] = [];
+    const stream = Buffer.from(
+      "PLV: " + JSON.stringify(entries.slice(0, 1)) + "\nPLV: " + JSON.stringify(entries.slice(1)) + "\n"
+    );
+    const [results] = readInChunks(stream, 5, batch => batches.push(batch));
+    assert.deepStrictEqual(batches, [entries.slice(0, 1), entries.slice(1)]);
+    assert.deepStrictEqual(results, entries);
+  });
+
+  test("Leaves results undefined without a valid PLV record", () => {
+    assert.strictEqual(readInChunks(Buffer.from("just output\n"), 4)[0], undefined);
+    assert.strictEqual(readInChunks(Buffer.from("PLV: [{\"lineno\"\n"), 4)[0], undefined);
+  });
+
+  test("Splits lines without touching their content", () => {
+    const lines: string[] = [];
+    const reader = new LineReader(line => lines.push(line));
+    reader.push(Buffer.from("a\n\nb"));
+    reader.push(Buffer.from("c\n"));
+    reader.end();
+    assert.deepStrictEqual(lines, ["a", "", "bc"]);
+  });
+});
+
+suite("Tracer Cancellation Tests", () => {
+  const rootDir = join(__dirname, "..", "..", "..");
+  const pythonPath = process.env.PYTHON ?? (process.platform === "win32" ? "python" : "python3");
+  const fileName = join(rootDir, "scripts", "cancel_test_target.py");
+  const slow = "import time\nfor _ in range(100):\n    time.sleep(0.1)\n";
+
+  test("A newer run cancels the one in flight", async () => {
+    const tracer = new PythonTracer();
+    const first = tracer.tracePythonScript({ fileName, pythonPath, rootDir, source: slow });
+    const second = tracer.tracePythonScript({ fileName, pythonPath, rootDir, source: "x = 1\nx\n" });
+
+    await assert.rejects(first, TraceCancelledError);
+    const [results] = await second;
+    assert.deepStrictEqual(results, [{ lineno: 2, source: "x", value: "1" }]);
+  }).timeout(10000);
+
+  test("Runs older than the newest started one never start", async () => {
+    const tracer = new PythonTracer();
+    const newest = tracer.tracePythonScript({ fileName, pythonPath, rootDir, source: "x = 2\nx\n", generation: 5 });
+    const stale = tracer.tracePythonScript({ fileName, pythonPath, rootDir, source: "x = 1\nx\n", generation: 4 });
+
+    await assert.rejects(stale, TraceCancelledError);
+    const [results] = await newest;
+    assert.deepStrictEqual(results, [{ lineno: 2, source: "x", value: "2" }]);
+  }).timeout(10000);
+});
+
+/* A stand-in for the worker's process, fed by emitting on its streams. */
+function fakeWorkerProcess() {
+  return Object.assign(new EventEmitter(), {
+    stdin: Object.assign(new EventEmitter(), { write: () => true }),
+    stdout: new EventEmitter(),
+    stderr: new EventEmitter(),
+  });
+}
+
+suite("Cell Worker Tests", () => {
+  const rootDir = join(__dirname, "..", "..", "..");
+  const pythonPath = process.env.PYTHON ?? (process.platform === "win32" ? "python" : "python3");
+  const fileName = join(rootDir, "scripts", "cells_test_target.py");
+  const notebook = "# %%\nimport time\ntime.sleep(1)\ndata = [1, 2, 3]\n\n# %%\ntotal = sum(data)\ntotal\n";
+
+  test("Only the edited cells run again", async () => {
+    const tracer = new PythonTracer();
+    try {
+      const [first, , firstStats] = await tracer.traceCells({ fileName, pythonPath, rootDir, source: notebook });
+      assert.deepStrictEqual(first?.at(-1), { lineno: 8, source: "total", value: "6" });
+      assert.strictEqual(firstStats?.cells_run, 2);
+
+      const edited = notebook.replace("sum(data)", "sum(data) * 2");
+      const [second, , secondStats] = await tracer.traceCells({ fileName, pythonPath, rootDir, source: edited });
+      assert.deepStrictEqual(second?.at(-1), { lineno: 8, source: "total", value: "12" });
+      assert.deepStrictEqual([secondStats?.cells_reused, secondStats?.cells_run], [1, 1]);
+      assert.ok((secondStats?.wall_seconds ?? Infinity) < 1);
+    } finally {
+      tracer.closeCellWorkers();
+    }
+  }).timeout(10000);
+
+  test("A run waiting for the worker is replaced by a newer one", async () => {
+    const tracer = new PythonTracer();
+    try {
+      const running = tracer.traceCells({ fileName, pythonPath, rootDir, source: notebook });
+      const replaced = tracer.traceCells({ fileName, pythonPath, rootDir, source: notebook + "total\n" });
+      const newest = tracer.traceCells({ fileName, pythonPath, rootDir, source: notebook + "more = total + 1\nmore\n" });
+
+      await assert.rejects(replaced, TraceCancelledError);
+      assert.ok(await running);
+      const [results] = await newest;
+      assert.deepStrictEqual(results?.at(-1), { lineno: 10, source: "more", value: "7" });
+    } finally {
+      tracer.closeCellWorkers();
+    }
+  }).timeout(10000);
+
+  test("Only the tail of the current run's stderr is kept", async () => {
+    const python = fakeWorkerProcess();
+    const worker = new PythonCellWorker(pythonPath, python as unknown as ChildProcess, () => undefined);
+    python.stderr.emit("data", Buffer.from("warning of an earlier run\n"));
+    const run = worker.run(notebook);
+    for (let i = 0; i < 100; i++) python.stderr.emit("data", Buffer.alloc(1024, "w"));
+    python.stderr.emit("data", Buffer.from("Traceback: the end"));
+    python.emit("close", 1);
+
+    const reason = await run.then(() => "", (err: unknown) => String(err));
+    assert.strictEqual(reason.length, CELL_STDERR_BYTES);
+    assert.ok(reason.endsWith("Traceback: the end"));
+  });
+
+  test("A run's error leaves out what earlier runs wrote to stderr", async () => {
+    const python = fakeWorkerProcess();
+    const worker = new PythonCellWorker(pythonPath, python as unknown as ChildProcess, () => undefined);
+    python.stderr.emit("data", Buffer.from("warning of an earlier run\n"));
+    const run = worker.run(notebook);
+    python.emit("close", 1);
+
+    assert.strictEqual(await run.then(() => "", (err: unknown) => String(err)), "PyLiveView cell worker exited with code 1");
+  });
+});